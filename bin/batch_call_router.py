@@ -2,9 +2,19 @@
 """Process a batch of URLs by invoking call_router.py for each entry."""
 
 import argparse
+import os
+import queue
 import subprocess
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Optional
+
+CALL_ROUTER = Path(__file__).resolve().parent / "call_router.py"
+LIB_PATH = CALL_ROUTER.parent.parent / "lib"
+sys.path.append(str(LIB_PATH))
+sys.path.append(str(LIB_PATH / "python_utils"))
 
 
 def load_urls(path: Path) -> list[str]:
@@ -18,17 +28,59 @@ def load_urls(path: Path) -> list[str]:
     return urls
 
 
-def run_batch(urls: list[str], dry_run: bool, stop_on_error: bool) -> int:
+def router_command(
+    url: str,
+    dry_run: bool,
+    in_process: bool = False,
+    download_only: bool = False,
+    only_task: Optional[str] = None,
+) -> list[str]:
+    """Build the call_router.py command line for one URL."""
+    cmd = [sys.executable, str(CALL_ROUTER), url]
+    if dry_run:
+        cmd.append("--dry-run")
+    if in_process:
+        cmd.append("--in-process")
+    if download_only:
+        cmd.append("--download-only")
+    if only_task:
+        cmd.append(f"--only-task={only_task}")
+    return cmd
+
+
+def default_encode_jobs(jobs: int) -> int:
+    """
+    Default encode concurrency: encoders such as libx264 already use several
+    threads each, so allow roughly one encode per four cores.
+    """
+    return max(1, min(jobs, (os.cpu_count() or 1) // 4))
+
+
+def run_batch(
+    urls: list[str],
+    dry_run: bool,
+    stop_on_error: bool,
+    jobs: int = 1,
+    download_jobs: Optional[int] = None,
+    encode_jobs: Optional[int] = None,
+    in_process: bool = False,
+) -> int:
     """Run call_router.py for each URL and return final exit code."""
-    repo_root = Path(__file__).resolve().parent.parent
-    call_router = repo_root / "bin" / "call_router.py"
+    if jobs > 1:
+        return run_batch_parallel(
+            urls,
+            dry_run,
+            stop_on_error,
+            jobs,
+            download_jobs or jobs,
+            encode_jobs or default_encode_jobs(jobs),
+            in_process,
+        )
 
     failures = 0
 
     for index, url in enumerate(urls, start=1):
-        cmd = [sys.executable, str(call_router), url]
-        if dry_run:
-            cmd.append("--dry-run")
+        cmd = router_command(url, dry_run, in_process)
 
         print(f"[{index}/{len(urls)}] Running: {' '.join(cmd)}")
         result = subprocess.run(cmd)
@@ -49,6 +101,300 @@ def run_batch(urls: list[str], dry_run: bool, stop_on_error: bool) -> int:
     return 0
 
 
+def run_batch_parallel(
+    urls: list[str],
+    dry_run: bool,
+    stop_on_error: bool,
+    jobs: int,
+    download_jobs: int,
+    encode_jobs: int,
+    in_process: bool = False,
+) -> int:
+    """
+    Run URLs on a pool of ``jobs`` workers.
+
+    Each URL runs in two phases: ``call_router.py --download-only`` under a
+    network slot (at most ``download_jobs`` at once), then the full router
+    call, which finds the finished download and only runs the processing
+    tasks, under a CPU slot (at most ``encode_jobs`` at once). Router output
+    is captured and reported in input order. With ``stop_on_error``, the
+    first failure stops new phases from starting; phases already running
+    are allowed to finish.
+    """
+    download_slots = threading.BoundedSemaphore(download_jobs)
+    encode_slots = threading.BoundedSemaphore(encode_jobs)
+    stop = threading.Event()
+
+    print(
+        f"Running {len(urls)} URL(s) with {jobs} worker(s): "
+        f"{download_jobs} download slot(s), {encode_jobs} encode slot(s)."
+    )
+
+    def run_phase(slots, cmd, output: list[str]) -> Optional[int]:
+        with slots:
+            if stop.is_set():
+                return None
+            result = subprocess.run(
+                cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+            )
+        output.append(result.stdout)
+        return result.returncode
+
+    def process(url: str) -> dict:
+        output: list[str] = []
+        returncode = run_phase(
+            download_slots, router_command(url, dry_run, in_process, download_only=True), output
+        )
+        if returncode == 0:
+            returncode = run_phase(
+                encode_slots, router_command(url, dry_run, in_process), output
+            )
+        if returncode and stop_on_error:
+            stop.set()
+        return {"url": url, "returncode": returncode, "output": "".join(output)}
+
+    failures = 0
+    first_failure = 0
+    skipped = 0
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [pool.submit(process, url) for url in urls]
+
+        # Report strictly in input order, as soon as each result is available.
+        for index, future in enumerate(futures, start=1):
+            result = future.result()
+            url = result["url"]
+            print(f"[{index}/{len(urls)}] {url}")
+            if result["output"]:
+                print(result["output"], end="" if result["output"].endswith("\n") else "\n")
+
+            if result["returncode"] is None:
+                skipped += 1
+                print(f"  ⏹ Skipped after earlier failure: {url}")
+            elif result["returncode"] != 0:
+                failures += 1
+                first_failure = first_failure or result["returncode"]
+                print(f"  ❌ Failed for URL: {url} (exit {result['returncode']})")
+            else:
+                print(f"  ✅ Completed for URL: {url}")
+
+    if stop_on_error and first_failure:
+        print(f"Batch stopped on error ({skipped} URL(s) not run).")
+        return first_failure
+
+    if failures:
+        print(f"Batch finished with {failures} failure(s).")
+        return 1
+
+    print("Batch finished successfully.")
+    return 0
+
+
+def pipeline_stages() -> list[str]:
+    """Processing tasks in call_router's TASK_DISPATCH order, one stage each."""
+    from call_router import TASK_DISPATCH
+
+    return [task for task in TASK_DISPATCH if task != "perform_download"]
+
+
+def pending_tasks(url: str, metadata_dir: str) -> set[str]:
+    """
+    Return the tasks still flagged ``true`` for the URL, from the indexed
+    task_states table, falling back to its metadata file if not recorded.
+    """
+    from tasks_lib import get_task_states, query_task_states
+
+    rows = query_task_states(metadata_dir, urls=[url])
+    if rows:
+        return {row["task"] for row in rows if row["state"] == "pending"}
+
+    states = get_task_states(url, metadata_dir) or {}
+    return {task for task, state in states.items() if state is True}
+
+
+def run_batch_pipeline(
+    urls: list[str],
+    dry_run: bool,
+    stop_on_error: bool,
+    queue_size: int = 2,
+    in_process: bool = False,
+) -> int:
+    """
+    Run URLs through a staged pipeline so downloads overlap processing.
+
+    A download thread runs ``call_router.py --download-only`` for each URL
+    in turn, then hands it to one thread per processing task (TASK_DISPATCH
+    order), each running ``call_router.py --only-task=<task>``. A URL only
+    visits the stages whose ``default_tasks`` flag is ``true``. The queue
+    between the download stage and the first processing stage holds at most
+    ``queue_size`` URLs, which caps how many downloaded-but-unprocessed
+    files can pile up; later queues are bounded the same way. Results are
+    reported in input order.
+    """
+    from teton_utils import load_app_config
+
+    metadata_dir = load_app_config().get("metadata_dir", "./metadata")
+    stages = pipeline_stages()
+    stop = threading.Event()
+    done = object()
+
+    channels = [queue.Queue(maxsize=queue_size) for _ in stages]
+    results: queue.Queue = queue.Queue()
+    outlets = channels[1:] + [results]
+
+    print(
+        f"Pipelining {len(urls)} URL(s) through download -> {' -> '.join(stages)} "
+        f"(queue size {queue_size})."
+    )
+
+    def run(item: dict, cmd: list[str]) -> None:
+        result = subprocess.run(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+        )
+        item["output"].append(result.stdout)
+        item["returncode"] = result.returncode
+        if result.returncode and stop_on_error:
+            stop.set()
+
+    def fail(item: dict, stage: str, error: Exception) -> None:
+        # A stage error fails this URL; the stage thread keeps going so the
+        # item and the done sentinel still reach the results queue.
+        item["output"].append(f"{stage} stage error: {error!r}\n")
+        item["returncode"] = 1
+        if stop_on_error:
+            stop.set()
+
+    def download_stage() -> None:
+        try:
+            for url in urls:
+                item = {"url": url, "returncode": None, "output": [], "pending": set()}
+                try:
+                    if not stop.is_set():
+                        run(item, router_command(url, dry_run, in_process, download_only=True))
+                        if item["returncode"] == 0:
+                            item["pending"] = pending_tasks(url, metadata_dir)
+                except Exception as e:
+                    fail(item, "download", e)
+                channels[0].put(item)
+        finally:
+            channels[0].put(done)
+
+    def task_stage(task: str, inlet: queue.Queue, outlet: queue.Queue) -> None:
+        try:
+            while True:
+                item = inlet.get()
+                if item is done:
+                    return
+                try:
+                    if item["returncode"] == 0 and task in item["pending"]:
+                        if stop.is_set():
+                            item["returncode"] = None
+                        else:
+                            cmd = router_command(item["url"], dry_run, in_process, only_task=task)
+                            run(item, cmd)
+                except Exception as e:
+                    fail(item, task, e)
+                outlet.put(item)
+        finally:
+            outlet.put(done)
+
+    threads = [threading.Thread(target=download_stage, daemon=True)]
+    for task, inlet, outlet in zip(stages, channels, outlets):
+        threads.append(
+            threading.Thread(target=task_stage, args=(task, inlet, outlet), daemon=True)
+        )
+    for thread in threads:
+        thread.start()
+
+    failures = 0
+    first_failure = 0
+    skipped = 0
+    index = 0
+
+    # Every stage is a single FIFO worker, so results arrive in input order.
+    while True:
+        item = results.get()
+        if item is done:
+            break
+        index += 1
+        print(f"[{index}/{len(urls)}] {item['url']}")
+        output = "".join(item["output"])
+        if output:
+            print(output, end="" if output.endswith("\n") else "\n")
+
+        if item["returncode"] is None:
+            skipped += 1
+            print(f"  ⏹ Skipped after earlier failure: {item['url']}")
+        elif item["returncode"] != 0:
+            failures += 1
+            first_failure = first_failure or item["returncode"]
+            print(f"  ❌ Failed for URL: {item['url']} (exit {item['returncode']})")
+        else:
+            print(f"  ✅ Completed for URL: {item['url']}")
+
+    for thread in threads:
+        thread.join()
+
+    if stop_on_error and first_failure:
+        print(f"Batch stopped on error ({skipped} URL(s) not run).")
+        return first_failure
+
+    if failures:
+        print(f"Batch finished with {failures} failure(s).")
+        return 1
+
+    print("Batch finished successfully.")
+    return 0
+
+
+def drop_completed(urls: list[str]) -> list[str]:
+    """
+    Remove URLs whose download and every task are already done, using one
+    indexed task-state query instead of a router process per URL.
+    """
+    from teton_utils import load_app_config
+    from tasks_lib import filter_pending_urls
+
+    metadata_dir = load_app_config().get("metadata_dir", "./metadata")
+    pending = filter_pending_urls(urls, metadata_dir)
+    skipped = len(urls) - len(pending)
+    if skipped:
+        print(f"Skipping {skipped} completed URL(s); {len(pending)} with pending work.")
+    return pending
+
+
+def prefetch_batch(urls: list[str], jobs: int, order: str = "input") -> list[str]:
+    """
+    Extract and record metadata for every URL up front, then order the batch.
+
+    Metadata files, default task flags and index entries are written before
+    any router runs, so later phases find them; ``order`` ("input", "sjf"
+    or "ljf") sorts URLs by their expected size or duration.
+    """
+    from teton_utils import load_app_config, load_config
+    from metadata_prefetch import order_urls, prefetch_metadata
+
+    metadata_dir = load_app_config().get("metadata_dir", "./metadata")
+    print(f"Prefetching metadata for {len(urls)} URL(s) with {jobs} worker(s).")
+    metadata = prefetch_metadata(
+        urls,
+        cookie_path=load_config().get("cookie_path"),
+        jobs=jobs,
+        metadata_dir=metadata_dir,
+    )
+    missing = [url for url in urls if not metadata.get(url)]
+    if missing:
+        print(f"  ⚠️ No metadata for {len(missing)} URL(s); they run last.")
+    return order_urls(urls, metadata, order)
+
+
+def positive_int(value: str) -> int:
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("must be at least 1")
+    return number
+
+
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         description="Run call_router.py for each URL in a text file."
@@ -69,6 +415,65 @@ def parse_args() -> argparse.Namespace:
         action="store_true",
         help="Stop immediately if any URL processing fails.",
     )
+    parser.add_argument(
+        "--in-process",
+        action="store_true",
+        help="Pass --in-process to call_router.py for each URL.",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Run downloads and processing tasks as overlapping pipeline stages.",
+    )
+    mode.add_argument(
+        "--jobs",
+        type=positive_int,
+        default=1,
+        help="Number of URLs to process concurrently (default: 1, sequential).",
+    )
+    parser.add_argument(
+        "--download-jobs",
+        type=positive_int,
+        default=None,
+        help="Maximum concurrent downloads when --jobs > 1 (default: --jobs).",
+    )
+    parser.add_argument(
+        "--encode-jobs",
+        type=positive_int,
+        default=None,
+        help="Maximum concurrent watermark/clip/caption encodes when --jobs > 1 "
+        "(default: about one per four CPU cores, at most --jobs).",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=positive_int,
+        default=2,
+        help="With --pipeline, maximum URLs waiting between stages (default: 2).",
+    )
+    parser.add_argument(
+        "--pending-only",
+        action="store_true",
+        help="Skip URLs whose download and every task are already completed.",
+    )
+    parser.add_argument(
+        "--prefetch",
+        action="store_true",
+        help="Extract and record metadata for every URL before running the batch.",
+    )
+    parser.add_argument(
+        "--prefetch-jobs",
+        type=positive_int,
+        default=4,
+        help="Concurrent metadata extractions with --prefetch (default: 4).",
+    )
+    parser.add_argument(
+        "--order",
+        choices=("input", "sjf", "ljf"),
+        default="input",
+        help="With --prefetch, run URLs in file order (input), smallest first "
+        "(sjf) or largest first (ljf) by size or duration (default: input).",
+    )
     return parser.parse_args()
 
 
@@ -85,7 +490,36 @@ def main() -> int:
         print(f"No valid URLs found in: {url_file}", file=sys.stderr)
         return 1
 
-    return run_batch(urls, dry_run=args.dry_run, stop_on_error=args.stop_on_error)
+    if args.pending_only:
+        urls = drop_completed(urls)
+        if not urls:
+            print("Nothing to do: every URL is already completed.")
+            return 0
+
+    if args.prefetch:
+        urls = prefetch_batch(urls, args.prefetch_jobs, args.order)
+    elif args.order != "input":
+        print("--order requires --prefetch.", file=sys.stderr)
+        return 1
+
+    if args.pipeline:
+        return run_batch_pipeline(
+            urls,
+            dry_run=args.dry_run,
+            stop_on_error=args.stop_on_error,
+            queue_size=args.queue_size,
+            in_process=args.in_process,
+        )
+
+    return run_batch(
+        urls,
+        dry_run=args.dry_run,
+        stop_on_error=args.stop_on_error,
+        jobs=args.jobs,
+        download_jobs=args.download_jobs,
+        encode_jobs=args.encode_jobs,
+        in_process=args.in_process,
+    )
 
 
 if __name__ == "__main__":
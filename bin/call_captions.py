@@ -2,12 +2,13 @@
 import sys
 import logging
 import os
-from moviepy.editor import VideoFileClip, TextClip, CompositeVideoClip
 import tempfile
 import time
-import speech_recognition as sr
 from urllib.parse import urlparse
 
+# moviepy and speech_recognition take seconds to import; they are loaded
+# inside the functions that use them.
+
 
 # ==================================================
 # CLIPS CONFIGURATION 
@@ -22,6 +23,7 @@ moviepy_config = {
     "text_valign": "center",  # Vertical alignment for overlay text (centered)
     "output_format": "mp4",  # Output format
     "text_color": "white",  # Color of the text overlay
+    "single_pass": False,  # Decode the source once for all clips (ffmpeg split/trim)
 }
 
 clips = [
@@ -66,6 +68,8 @@ KNOWN_VENDORS = {
     "twitch.tv": "twitch"
 }
 
+logger = logging.getLogger(__name__)
+
 
 
 
@@ -102,6 +106,8 @@ def initialize_logging():
 # ==================================================
 def extract_audio_from_video(video_path, start_time, end_time, temp_audio_path):
     """Extracts audio from the video clip for the given time range."""
+    from moviepy.editor import VideoFileClip
+
     try:
         video = VideoFileClip(video_path)
         video = video.subclip(start_time, end_time)
@@ -115,6 +121,8 @@ def extract_audio_from_video(video_path, start_time, end_time, temp_audio_path):
 
 def transcribe_audio(audio_path):
     """Transcribe the audio using speech recognition."""
+    import speech_recognition as sr
+
     recognizer = sr.Recognizer()
     try:
         with sr.AudioFile(audio_path) as source:
@@ -139,6 +147,8 @@ def ensure_clips_directory(clips_directory):
 # ==================================================
 def process_video_for_clip_and_transcription(video_path, start_time, end_time, text_overlay):
     """Extract audio, transcribe it, replace original text, and prepare the clip."""
+    from moviepy.editor import VideoFileClip
+
     # Create a temporary file for audio extraction
     with tempfile.NamedTemporaryFile(delete=False) as temp_audio_file:
         audio_path = temp_audio_file.name + ".wav"
@@ -191,7 +201,35 @@ def get_user_confirmation(text):
     else:
         return text  # Default to original text if no input or invalid input
 
+# drawtext x/y expressions for the moviepy alignment names
+DRAWTEXT_ALIGN_X = {"left": "10", "center": "(w-text_w)/2", "right": "w-text_w-10"}
+DRAWTEXT_ALIGN_Y = {"top": "10", "center": "(h-text_h)/2", "bottom": "h-text_h-10"}
+
+
+def process_clips_single_pass(moviepy_config, clips, logger):
+    """Extract all clips with one ffmpeg decode, keeping names and overlay text."""
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../lib/python_utils"))
+    from make_clips import process_clips_ffmpeg_single_pass
+
+    params = {
+        "input_video_path": sys.argv[1],
+        "download_path": moviepy_config["clips_directory"],
+        "font": moviepy_config["font"],
+        "font_size": moviepy_config["font_size"],
+        "text_color": moviepy_config["text_color"],
+        "text_x": DRAWTEXT_ALIGN_X.get(moviepy_config["text_halign"], "10"),
+        "text_y": DRAWTEXT_ALIGN_Y.get(moviepy_config["text_valign"], "10"),
+    }
+    result = process_clips_ffmpeg_single_pass(
+        params, [(c["start"], c["end"], c["text"], c["name"]) for c in clips]
+    )
+    for path in result["output_video_paths"]:
+        logger.info(f"Clip written: {path}")
+
+
 def process_clips_moviepy(moviepy_config, clips, logger):
+    from moviepy.editor import VideoFileClip, TextClip, CompositeVideoClip
+
     input_video = sys.argv[1]  # Get input video path from command line argument
     clips_directory = moviepy_config["clips_directory"]
     
@@ -201,6 +239,10 @@ def process_clips_moviepy(moviepy_config, clips, logger):
     
     # Ensure the clips directory exists
     ensure_clips_directory(clips_directory)
+
+    if moviepy_config.get("single_pass"):
+        process_clips_single_pass(moviepy_config, clips, logger)
+        return
     
     # Load the input video using moviepy
     video_clip = VideoFileClip(input_video)
@@ -249,41 +291,44 @@ def get_vendor(video_url):
 # MAIN EXECUTION
 # ==================================================
 
-# Ensure the input file is provided as an argument
-if len(sys.argv) < 2:
-    print("Error: No input video file provided.")
-    sys.exit(1)
+def main():
+    # Ensure the input file is provided as an argument
+    if len(sys.argv) < 2:
+        print("Error: No input video file provided.")
+        sys.exit(1)
 
-# Initialize logger
-logger = initialize_logging()
+    # Initialize logger
+    initialize_logging()
 
-video_url = sys.argv[1]
-vendor = get_vendor(video_url)
+    video_url = sys.argv[1]
+    vendor = get_vendor(video_url)
 
-print(f"Vendor: {vendor}")
+    print(f"Vendor: {vendor}")
 
-# Ensure clips directory exists
-ensure_clips_directory(moviepy_config["clips_directory"])
+    # Ensure clips directory exists
+    ensure_clips_directory(moviepy_config["clips_directory"])
 
-# Iterate through clips
-processed_clips = []
-for clip in clips:
-    start_time = clip["start"]
-    end_time = clip["end"]
-    text = clip["text"]
-    
-    # Process each clip
-    processed_clip, updated_text = process_video_for_clip_and_transcription(
-        sys.argv[1], start_time, end_time, text
-    )
-    
-    # If transcribed text exists, confirm with the user
-    if updated_text:
-        updated_text = get_user_confirmation(updated_text)
-        clip["text"] = updated_text
-    processed_clips.append(clip)
+    # Iterate through clips
+    processed_clips = []
+    for clip in clips:
+        start_time = clip["start"]
+        end_time = clip["end"]
+        text = clip["text"]
+
+        # Process each clip
+        processed_clip, updated_text = process_video_for_clip_and_transcription(
+            sys.argv[1], start_time, end_time, text
+        )
+
+        # If transcribed text exists, confirm with the user
+        if updated_text:
+            updated_text = get_user_confirmation(updated_text)
+            clip["text"] = updated_text
+        processed_clips.append(clip)
 
-# Process clips using moviepy
-process_clips_moviepy(moviepy_config, processed_clips, logger)
+    # Process clips using moviepy
+    process_clips_moviepy(moviepy_config, processed_clips, logger)
 
 
+if __name__ == "__main__":
+    main()
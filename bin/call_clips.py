@@ -165,9 +165,9 @@ def process_clips_gstreamer(gstreamer_config, clips, logger):
 
 
 #main
+if __name__ == "__main__":
+    # Initialize logger
+    logger = initialize_logging()
 
-# Initialize logger
-logger = initialize_logging()
-
-# Run the GStreamer processing routine
-process_clips_gstreamer(gstreamer_config, clips, logger)
+    # Run the GStreamer processing routine
+    process_clips_gstreamer(gstreamer_config, clips, logger)
@@ -3,7 +3,6 @@ import os
 import json
 import logging
 import traceback
-import platform
 from datetime import datetime
 
 # Ensure we can import shared utilities
@@ -12,26 +11,10 @@ root_dir = os.path.dirname(current_dir)
 lib_path = os.path.join(root_dir, "lib")
 if lib_path not in sys.path:
     sys.path.append(lib_path)
+# Task modules import config_store top-level; share its cache.
+sys.path.append(os.path.join(lib_path, "python_utils"))
 
-from teton_utils import load_app_config
-
-# Load Platform-Specific Configuration
-def load_config():
-    """Load configuration based on the operating system."""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    config_path = os.path.join(current_dir, "../conf/config.json")
-
-    if not os.path.exists(config_path):
-        raise FileNotFoundError(f"Configuration file not found at {config_path}")
-
-    with open(config_path, "r") as file:
-        config = json.load(file)
-
-    os_name = platform.system()
-    if os_name not in config:
-        raise ValueError(f"Unsupported platform: {os_name}")
-
-    return config[os_name]
+from config_store import load_app_config, load_config
 
 # Initialize Logging
 def init_logging(logging_config):
@@ -83,10 +66,6 @@ def main():
         app_config = load_app_config()
         logger = init_logging(app_config.get("logging", {}))
 
-        # Add the `lib/python_utils` directory to sys.path
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        lib_path = os.path.join(current_dir, "../lib/python_utils")
-        sys.path.append(lib_path)
         logger.debug(f"Current sys.path: {sys.path}")
 
         # Attempt to import downloader5 and utilities1
@@ -94,6 +73,7 @@ def main():
             import downloader5
             import utilities1
             import tasks_lib
+            import task_runners
         except ImportError as e:
             logger.error(f"Failed to import modules: {e}")
             sys.exit(1)
@@ -131,6 +111,7 @@ def main():
             "download_path": download_path,
             "cookie_path": platform_config.get("cookie_path"),
             "url": None,
+            "video_download": app_config.get("video_download", {}),
             **platform_config.get("watermark_config", {}),
         }
 
@@ -141,24 +122,8 @@ def main():
 
         params["url"] = sys.argv[1].strip()
 
-        # Execute function calls in sequence
-        function_calls = [
-            downloader5.mask_metadata,
-            downloader5.create_original_filename,
-            downloader5.download_video,
-            utilities1.store_params_as_json,
-            tasks_lib.write_masked_metadata_with_tasks,
-        ]
-
-        for func in function_calls:
-            logger.info(f"Entering function: {func.__name__}")
-            try:
-                result = func(params)
-                if result:
-                    params.update(result)
-            except Exception as e:
-                logger.error(f"Error executing {func.__name__}: {e}")
-                logger.debug(traceback.format_exc())
+        # Execute the download chain (shared with call_router --in-process)
+        task_runners.run_download_chain(params, logger)
 
         # Output the original filename
         original_filename = params.get("original_filename", "")
@@ -176,4 +141,5 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
+    # A nonzero exit tells call_router the download failed.
+    sys.exit(0 if main() else 1)
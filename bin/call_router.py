@@ -2,6 +2,7 @@
 import sys
 import os
 import json
+import importlib
 import logging
 import traceback
 import subprocess
@@ -13,54 +14,199 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 root_dir = os.path.dirname(current_dir)
 lib_path = os.path.join(root_dir, "lib")
 sys.path.append(lib_path)
+# Task modules import tasks_lib as a top-level module; importing it the same
+# way here keeps a single metadata cache per process.
+sys.path.append(os.path.join(lib_path, "python_utils"))
 
 # Import utilities
 from teton_utils import initialize_logging, load_config, load_app_config
-from python_utils.tasks_lib import find_url_json
+from tasks_lib import filter_pending_urls, find_url_json, record_task_states
 
-# Map tasks to their respective scripts
+# Map tasks to their script (subprocess mode) and, where one exists, the
+# "module:function" runner used in in-process mode. A runner must do the same
+# work as its script (call_download.py and call_watermark.py share their code
+# with task_runners), so the two modes leave the same outputs. Order is execution order.
 TASK_DISPATCH = {
-    "perform_download": "bin/call_download.py",
-    "apply_watermark": "bin/call_watermark.py",
-    "make_clips": "bin/call_clips.py",
-    "extract_audio": "bin/call_extract_audio.py",
-    "generate_captions": "bin/call_captions.py",
+    "perform_download": {
+        "script": "bin/call_download.py",
+        "callable": "task_runners:run_perform_download",
+    },
+    "apply_watermark": {
+        "script": "bin/call_watermark.py",
+        "callable": "task_runners:run_apply_watermark",
+    },
+    "make_clips": {"script": "bin/call_clips.py"},
+    "extract_audio": {"script": "bin/call_extract_audio.py"},
+    "generate_captions": {"script": "bin/call_captions.py"},
     # Convert screenshot timestamps after all other tasks
-    "post_process": "bin/convert_screenshots.py"
+    "post_process": {"script": "bin/convert_screenshots.py"},
 }
 
-def execute_tasks(task_config, url, to_process, dry_run=False):
-    """Run appropriate script for each task based on its config."""
-    for task, status in task_config.items():
-        script = TASK_DISPATCH.get(task)
 
-        if not script:
+def resolve_task_callable(spec):
+    """Import and return the in-process runner for a task spec, or None."""
+    target = spec.get("callable")
+    if not target:
+        return None
+    module_name, func_name = target.split(":")
+    module = importlib.import_module(module_name)
+    return getattr(module, func_name)
+
+
+def run_task(task, spec, task_input, dry_run=False, in_process=False, context=None):
+    """
+    Run one task, in-process when requested and a runner is available,
+    otherwise as a Python subprocess.
+
+    Returns (mode, ok, output): the mode actually used, whether the task
+    succeeded (a zero exit status, or a runner that returned an output
+    without raising) and the task's output -- the runner's return value, or
+    the file a script printed as its last line of stdout (None for dry runs,
+    failures and scripts that report no file).
+    """
+    script_path = os.path.join(root_dir, spec["script"])
+
+    if in_process and spec.get("callable"):
+        try:
+            runner = resolve_task_callable(spec)
+        except ImportError as e:
+            logging.warning(f"⚠️ In-process runner unavailable for {task} ({e}); using subprocess.")
+            runner = None
+
+        if runner is not None:
+            if dry_run:
+                logging.info(f"[Dry Run] Would call: {spec['callable']}({task_input})")
+                return "in-process", True, None
+            try:
+                output = runner(task_input, context or {})
+            except Exception as e:
+                logging.error(f"❌ Task {task} failed: {e}")
+                logging.debug(traceback.format_exc())
+                return "in-process", False, None
+            if output is None:
+                # Runners return None when the task failed.
+                logging.error(f"❌ Task {task} produced no output.")
+                return "in-process", False, None
+            logging.info(f"📤 {task} output: {output}")
+            return "in-process", True, output
+
+    if dry_run:
+        logging.info(f"[Dry Run] Would run: python {script_path} {task_input}")
+        return "subprocess", True, None
+    result = subprocess.run([sys.executable, script_path, task_input], stdout=subprocess.PIPE, text=True)
+    if result.stdout:
+        sys.stdout.write(result.stdout)
+    if result.returncode != 0:
+        logging.error(f"❌ Task {task} failed: {spec['script']} exited with {result.returncode}")
+        return "subprocess", False, None
+    return "subprocess", True, reported_output(result.stdout)
+
+
+def reported_output(stdout):
+    """
+    Returns the output file a task script reported, i.e. its last non-empty
+    line of stdout when that names an existing file, else None.
+    """
+    lines = [line.strip() for line in (stdout or "").splitlines() if line.strip()]
+    if lines and os.path.isfile(lines[-1]):
+        return lines[-1]
+    return None
+
+
+def log_task_timings(timings):
+    """
+    Log per-task wall time so subprocess and in-process runs can be compared.
+    Subprocess times include interpreter start-up, module imports and config
+    loading; in-process times include imports only for the first task that
+    needs a given module.
+    """
+    if not timings:
+        return
+    total = sum(elapsed for _, _, elapsed in timings)
+    for task, mode, elapsed in timings:
+        logging.info(f"⏱ {task} [{mode}]: {elapsed:.2f}s")
+    logging.info(f"⏱ Total task time: {total:.2f}s")
+
+
+def execute_tasks(
+    task_config, url, to_process, dry_run=False, in_process=False, context=None, metadata_path=None
+):
+    """
+    Run appropriate script or runner for each task based on its config, in
+    TASK_DISPATCH order.
+
+    Task outputs, from in-process runners and task scripts alike, are
+    recorded as the tasks' states in metadata_path with one journal append
+    (see tasks_lib.record_task_states).
+
+    Returns:
+        tuple: (timings, failures) -- (task, mode, seconds) for each task run,
+        and the names of the tasks that failed.
+    """
+    timings = []
+    outputs = {}
+    failures = []
+    for task in task_config:
+        if task not in TASK_DISPATCH:
             logging.warning(f"No script defined for task: {task}")
+
+    # Run in TASK_DISPATCH order, whatever order the metadata lists tasks in.
+    for task, spec in TASK_DISPATCH.items():
+        if task not in task_config:
             continue
+        status = task_config[task]
 
         # Use URL for download; use file path for all others
         task_input = url if task == "perform_download" else to_process
 
         if status is True:
-            logging.info(f"🚀 Running task: {task} -> {script}")
-            script_path = os.path.join(root_dir, script)
-            if dry_run:
-                logging.info(f"[Dry Run] Would run: python {script_path} {task_input}")
-            else:
-                subprocess.run(["python", script_path, task_input])
+            target = spec.get("callable") if in_process else None
+            logging.info(f"🚀 Running task: {task} -> {target or spec['script']}")
+            start = time.perf_counter()
+            mode, ok, output = run_task(
+                task, spec, task_input, dry_run=dry_run, in_process=in_process, context=context
+            )
+            timings.append((task, mode, time.perf_counter() - start))
+            if not ok:
+                failures.append(task)
+            elif output:
+                outputs[task] = output
         elif isinstance(status, str):
             logging.info(f"✅ Task already completed: {task} @ {status}")
         else:
             logging.info(f"⏭️  Skipping task: {task}")
 
+    log_task_timings(timings)
+    if metadata_path and outputs:
+        record_task_states(metadata_path, outputs)
+    if failures:
+        logging.error(f"❌ Failed tasks: {', '.join(failures)}")
+    return timings, failures
 
-def run_my_existing_downloader(url, logger):
-    """Calls the known-good downloader script for the given URL."""
+
+def run_my_existing_downloader(url, logger, in_process=False, context=None):
+    """
+    Calls the known-good downloader (script or in-process chain) for the
+    given URL. Returns True if the download succeeded.
+    """
     logger.info(f"📥 Initiating download for: {url}")
+    start = time.perf_counter()
+
+    if in_process:
+        from task_runners import run_perform_download
+
+        try:
+            output = run_perform_download(url, dict(context or {}, logger=logger))
+        except Exception as e:
+            logger.error(f"Download failed: {e}")
+            logger.debug(traceback.format_exc())
+            output = None
+        logger.info(f"⏱ Download [in-process] took {time.perf_counter() - start:.2f}s: {output}")
+        return isinstance(output, str)
 
-    script_path = os.path.join(root_dir, "bin/call_download.py")
+    script_path = os.path.join(root_dir, TASK_DISPATCH["perform_download"]["script"])
     result = subprocess.run(
-        ["python", script_path, url],
+        [sys.executable, script_path, url],
         capture_output=True,
         text=True
     )
@@ -69,51 +215,70 @@ def run_my_existing_downloader(url, logger):
         logger.error(f"Download script failed:\n{result.stderr}")
     else:
         logger.info(f"Download stdout:\n{result.stdout}")
+    logger.info(f"⏱ Download [subprocess] took {time.perf_counter() - start:.2f}s")
+    return result.returncode == 0
 
 
-def wait_for_download_file(to_process, logger, timeout_seconds=90, poll_interval=3):
-    """Wait briefly for downloader finalization when a temporary .part file exists."""
-    if os.path.exists(to_process):
-        return True
+def wait_for_download_file(to_process, logger, timeout_seconds=90):
+    """
+    Wait for a download another process is still finishing.
 
-    directory = os.path.dirname(to_process) or "."
-    base_name = os.path.splitext(os.path.basename(to_process))[0]
-    candidates = [
-        name
-        for name in os.listdir(directory)
-        if name.startswith(base_name) and name.endswith(".part")
-    ] if os.path.isdir(directory) else []
+    Wakes on the download's status file and final file (inotify where
+    available) and returns early once the download has failed or its
+    owner has exited; a rerun then resumes it from the recorded progress.
+    """
+    from download_progress import wait_for_download
 
-    if not candidates:
-        return False
+    return wait_for_download(to_process, timeout=timeout_seconds, log=logger)
 
-    logger.info(
-        f"⏳ Found partial download(s) for {base_name}; waiting up to {timeout_seconds}s for final file..."
-    )
-    deadline = time.time() + timeout_seconds
-    while time.time() < deadline:
-        if os.path.exists(to_process):
-            logger.info(f"✅ Finalized download detected: {to_process}")
-            return True
-        time.sleep(poll_interval)
-
-    logger.warning(
-        "⚠️ Download is still incomplete (.part file present). "
-        "Wait for download to finish, then rerun call_router."
-    )
-    return False
+
+def wait_for_running_download(found_data, logger, timeout_seconds=3600):
+    """
+    If another process is downloading this URL (see "download_progress" in
+    its metadata), wait for it instead of starting a second download.
+
+    Returns the finished download path, or None if nothing was waited for
+    or the other download did not finish.
+    """
+    from download_progress import download_in_progress
+
+    progress = (found_data or {}).get("download_progress")
+    if not download_in_progress(progress):
+        return None
+    logger.info(f"📡 Download already running (pid {progress.get('pid')}); waiting for it.")
+    if wait_for_download_file(progress["path"], logger, timeout_seconds):
+        return progress["path"]
+    return None
 
 def main():
     try:
         dry_run = "--dry-run" in sys.argv
+        in_process = "--in-process" in sys.argv
+        download_only = "--download-only" in sys.argv
+        pending_only = "--pending-only" in sys.argv
+        only_task = next(
+            (arg.split("=", 1)[1] for arg in sys.argv if arg.startswith("--only-task=")),
+            None,
+        )
         url_args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
 
         if len(url_args) < 1:
-            print("Usage: python call_router.py <url> [--dry-run]")
+            print(
+                "Usage: python call_router.py <url> [--dry-run] [--in-process] "
+                "[--download-only] [--only-task=<task>] [--pending-only]"
+            )
             sys.exit(1)
 
         url = url_args[0].strip()
 
+        if pending_only:
+            # Checked against the task index before config, logging or any
+            # metadata file is loaded, so finished URLs cost one query.
+            metadata_dir = load_app_config().get("metadata_dir", "./metadata")
+            if not filter_pending_urls([url], metadata_dir):
+                print(f"✅ All tasks already completed: {url}")
+                return 0
+
         config = load_config()
         logger = initialize_logging()
         app_config = load_app_config()
@@ -121,6 +286,7 @@ def main():
         # Ensure metadata directory exists before searching index/files.
         os.makedirs(metadata_dir, exist_ok=True)
         logger.info("🔁 Task Router Started")
+        context = {"app_config": app_config, "config": config, "logger": logger}
 
         found_file, found_data = find_url_json(url, metadata_dir=metadata_dir)
 
@@ -130,19 +296,28 @@ def main():
             else None
         )
 
-        if not found_file or not perform_download_done:
-            logger.info("📥 No completed download or metadata found — running downloader...")
-            run_my_existing_downloader(url, logger)
+        # perform_download holds the output path once done; true (still
+        # pending, e.g. after an interrupted or prefetched download) is not.
+        if not found_file or not isinstance(perform_download_done, str):
+            waited_for = wait_for_running_download(found_data, logger)
+            if not waited_for:
+                logger.info("📥 No completed download or metadata found — running downloader...")
+                if not run_my_existing_downloader(url, logger, in_process, context):
+                    logger.error("❌ Download failed.")
+                    return 1
             found_file, found_data = find_url_json(url, metadata_dir=metadata_dir)
             perform_download_done = (
                 found_data.get("default_tasks", {}).get("perform_download")
                 if found_data
                 else None
             )
+            if waited_for and not isinstance(perform_download_done, str):
+                # The other process may not have recorded its output yet.
+                perform_download_done = waited_for
 
         if not found_data:
             logger.error("❌ No metadata found after attempted download.")
-            return
+            return 1
 
         print(f"Found in: {found_file}")
         visible_fields = {
@@ -158,24 +333,39 @@ def main():
             to_process = perform_download_done
         else:
             logger.error("Download task not completed and no output path recorded.")
-            return
+            return 1
 
         if not wait_for_download_file(to_process, logger):
             logger.error(f"Input file does not exist: {to_process}")
-            return
+            return 1
+
+        if download_only:
+            logger.info(f"📦 Download phase complete: {to_process}")
+            return 0
 
         default_tasks = found_data.get("default_tasks", {})
         if not default_tasks:
             logger.warning("No 'default_tasks' section found in metadata.")
-            return
+            return 0
+
+        if only_task:
+            # Pipeline stages run one task per router call.
+            default_tasks = {only_task: default_tasks.get(only_task)}
 
         logger.info(f"🛠 Tasks to evaluate: {list(default_tasks.keys())}")
-        execute_tasks(default_tasks, url, to_process, dry_run)
+        _, failures = execute_tasks(
+            default_tasks, url, to_process, dry_run, in_process, context, metadata_path=found_file
+        )
+        if failures:
+            return 1
 
     except Exception as e:
         logging.error(f"Unexpected error in main(): {e}")
         traceback.print_exc()
+        return 1
+
+    return 0
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
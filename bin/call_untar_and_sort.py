@@ -7,8 +7,6 @@ import subprocess
 import tempfile
 import logging
 
-import requests
-
 # Add lib directory to Python path for shared utilities
 current_dir = os.path.dirname(os.path.abspath(__file__))
 root_dir = os.path.dirname(current_dir)
@@ -20,6 +18,8 @@ from teton_utils import initialize_logging
 
 def download_file(url: str, dest: str) -> str:
     """Download file from URL to destination path."""
+    import requests
+
     response = requests.get(url, stream=True)
     response.raise_for_status()
     with open(dest, "wb") as f:
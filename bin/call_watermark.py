@@ -1,34 +1,13 @@
 import os
 import sys
-import json
 import logging
 import traceback
-import platform
-from datetime import datetime
-
-
-## this routine needs to be locked in
-# Load Application Configuration
-def load_app_config():
-    """Load the application configuration from a JSON file."""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    base_dir = os.path.join(current_dir, "../")
-    
-    if not os.path.exists(base_dir):
-        # Squeaky error message if the base directory doesn't exist
-        raise FileNotFoundError(f"Base directory not found at {base_dir}")
-    
-    config_path = os.path.join(base_dir, "conf/app_config.json")
-
-    if not os.path.exists(config_path):
-        raise FileNotFoundError(f"Configuration file not found at {config_path}")
-    
-    try:
-        with open(config_path, "r") as file:
-            app_config = json.load(file)
-        return app_config
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Failed to parse JSON configuration at {config_path}: {e}")
+
+# Add the `lib/python_utils` directory to sys.path
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(current_dir, "../lib/python_utils"))
+
+from config_store import load_app_config
 
 # Initialize Logging
 def init_logging(logging_config):
@@ -60,34 +39,19 @@ def init_logging(logging_config):
     return logger
 
 
-def looks_like_filename(value):
-    if not value:
-        return False
-    text = str(value)
-    return (
-        "/" in text
-        or "\\" in text
-        or text.lower().endswith((".mp4", ".mov", ".mkv", ".webm", ".avi"))
-    )
-
 if __name__ == "__main__":
     try:
         # Load app configuration
         app_config = load_app_config()
-        watermark_config = app_config.get("watermark_config", {})
         logger = init_logging(app_config.get("logging", {}))
 
-        # Add the `lib/python_utils` directory to sys.path
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        lib_path = os.path.join(current_dir, "../lib/python_utils")
-        sys.path.append(lib_path)
         logger.debug(f"Current sys.path: {sys.path}")
 
-        # Attempt to import the watermarking function
+        # The same runner call_router uses with --in-process
         try:
-            from watermarker2 import add_watermark
+            from task_runners import run_apply_watermark
         except ImportError as e:
-            logger.error(f"Failed to import add_watermark: {e}")
+            logger.error(f"Failed to import run_apply_watermark: {e}")
             sys.exit(1)
 
         # Validate input arguments
@@ -101,52 +65,16 @@ if __name__ == "__main__":
             sys.exit(1)
 
         logger.info(f"Processing video file: {input_video_path}")
-
-        # Locate and read metadata JSON
-        base_name = os.path.splitext(input_video_path)[0]
-        json_path = f"{base_name}.json"
-        logger.info(f"Looking for metadata file: {json_path}")
-
-        if not os.path.isfile(json_path):
-            logger.error(f"Metadata file not found: {json_path}")
-            sys.exit(1)
-
-        try:
-            with open(json_path, "r") as file:
-                data = json.load(file)
-            logger.info(f"Loaded metadata from: {json_path}")
-            username = data.get("uploader", "")
-            if looks_like_filename(username):
-                logger.warning("Metadata uploader looks like a filename; skipping username watermark.")
-                username = ""
-            # this field changes insta uses upload_date ; yt uses upload_date
-            video_date = data.get("video_date", datetime.now().strftime("%Y-%m-%d"))
-            #video_date = data.get("upload_date", datetime.now().strftime("%Y-%m-%d"))
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON metadata from {json_path}: {e}")
-            sys.exit(1)
-
-        # Prepare parameters for watermarking.
-        # Use a copied config and apply explicit overrides once to avoid duplicate keys.
-        merged_watermark_config = dict(watermark_config)
-        params = {
-            **merged_watermark_config,
-            "input_video_path": input_video_path,
-            "download_path": os.path.dirname(input_video_path),
-            "username": username,
-            "video_date": video_date,
-        }
-
-        # Debugging appconfig
-        logger.debug(f"Watermark configuration: {watermark_config}")
+        logger.debug(f"Watermark configuration: {app_config.get('watermark_config', {})}")
 
         # Start watermarking
         logger.info("Starting watermarking process...")
-        result = add_watermark(params)
+        output = run_apply_watermark(input_video_path, {"app_config": app_config, "logger": logger})
 
-        if result and "to_process" in result:
-            logger.info(f"Watermarked video created successfully: {result['to_process']}")
-            print(result["to_process"])
+        if output:
+            logger.info(f"Watermarked video created successfully: {output}")
+            # call_router records the last stdout line as the task output.
+            print(output)
         else:
             logger.error("Watermarking process failed or did not return valid output.")
             sys.exit(1)
@@ -8,10 +8,11 @@ current_dir = os.path.dirname(os.path.abspath(__file__))
 lib_path = os.path.join(current_dir, "../lib/python_utils")
 sys.path.append(lib_path)
 
-from timeline_compositor import compose_timeline_with_images
-
 
 def main():
+    # Pillow is only needed once the arguments check out.
+    from timeline_compositor import compose_timeline_with_images
+
     if len(sys.argv) < 4:
         print(
             "Usage: python composite_timeline.py <timeline_json> <mapping_json> <output_image>"
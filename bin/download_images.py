@@ -5,8 +5,6 @@ import os
 import sys
 from typing import List
 
-import requests
-
 GOOGLE_DRIVE_DOWNLOAD_URL = "https://drive.google.com/uc?export=download"
 
 
@@ -17,14 +15,14 @@ def extract_drive_id(url: str) -> str:
     raise ValueError(f"Cannot extract file id from URL: {url}")
 
 
-def get_confirm_token(response: requests.Response) -> str:
+def get_confirm_token(response: "requests.Response") -> str:
     for key, value in response.cookies.items():
         if key.startswith("download_warning"):
             return value
     return ""
 
 
-def save_response_content(response: requests.Response, destination: str) -> None:
+def save_response_content(response: "requests.Response", destination: str) -> None:
     chunk_size = 32768
     with open(destination, "wb") as f:
         for chunk in response.iter_content(chunk_size):
@@ -33,6 +31,8 @@ def save_response_content(response: requests.Response, destination: str) -> None
 
 
 def download_file(file_id: str, dest_path: str) -> None:
+    import requests
+
     session = requests.Session()
     response = session.get(
         GOOGLE_DRIVE_DOWNLOAD_URL, params={"id": file_id}, stream=True
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""Maintain and query the SQLite metadata index (metadata/index.sqlite)."""
+
+import argparse
+import json
+import os
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.append(os.path.join(root_dir, "lib"))
+sys.path.append(os.path.join(root_dir, "lib", "python_utils"))
+
+from teton_utils import load_app_config
+from metadata_index import TASK_STATES, compact_index, open_metadata_index, migrate_jsonl_index
+from tasks_lib import query_task_states, sync_task_states
+
+
+def cmd_migrate(args: argparse.Namespace) -> int:
+    """Import index.jsonl into index.sqlite."""
+    imported = migrate_jsonl_index(args.metadata_dir)
+    count = open_metadata_index(args.metadata_dir).count()
+    print(f"Imported {imported} record(s); {count} URL(s) indexed.")
+    return 0
+
+
+def cmd_compact(args: argparse.Namespace) -> int:
+    """Drop superseded records from index.jsonl."""
+    kept = compact_index(args.metadata_dir)
+    print(f"Compacted index.jsonl to {kept} record(s).")
+    return 0
+
+
+def cmd_lookup(args: argparse.Namespace) -> int:
+    """Print the index record for a URL, id or shortcode."""
+    index = open_metadata_index(args.metadata_dir)
+    if args.id:
+        record = index.lookup_id(args.key)
+    elif args.shortcode:
+        record = index.lookup_shortcode(args.key)
+    else:
+        record = index.lookup_url(args.key)
+
+    if not record:
+        print(f"Not indexed: {args.key}", file=sys.stderr)
+        return 1
+
+    print(json.dumps(record, indent=2, ensure_ascii=False))
+    return 0
+
+
+def cmd_sync_tasks(args: argparse.Namespace) -> int:
+    """Load default_tasks from every indexed metadata file into task_states."""
+    synced = sync_task_states(args.metadata_dir)
+    print(f"Synced task states for {synced} metadata file(s).")
+    return 0
+
+
+def cmd_tasks(args: argparse.Namespace) -> int:
+    """List task states, or count them per task and state."""
+    if args.count:
+        counts = open_metadata_index(args.metadata_dir).task_counts()
+        for task in sorted(counts):
+            summary = ", ".join(f"{state}={counts[task].get(state, 0)}" for state in TASK_STATES)
+            print(f"{task}: {summary}")
+        return 0
+
+    rows = query_task_states(
+        args.metadata_dir,
+        task=args.task,
+        state=args.state,
+        urls=[args.url] if args.url else None,
+    )
+    if args.json:
+        print(json.dumps(rows, indent=2, ensure_ascii=False))
+    elif args.urls_only:
+        for url in dict.fromkeys(row["url"] for row in rows):
+            print(url)
+    else:
+        for row in rows:
+            print("\t".join([row["url"], row["task"], row["state"], row["output_path"] or ""]))
+    return 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--metadata-dir",
+        default=None,
+        help="Metadata directory (default: metadata_dir from conf/app_config.json)",
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate = subparsers.add_parser(
+        "migrate", help="One-shot import of index.jsonl into index.sqlite."
+    )
+    migrate.set_defaults(func=cmd_migrate)
+
+    compact = subparsers.add_parser(
+        "compact", help="Rewrite index.jsonl keeping the latest record per URL."
+    )
+    compact.set_defaults(func=cmd_compact)
+
+    lookup = subparsers.add_parser("lookup", help="Look up a URL, id or shortcode.")
+    lookup.add_argument("key", help="URL (default), extractor id or shortcode")
+    group = lookup.add_mutually_exclusive_group()
+    group.add_argument("--id", action="store_true", help="Treat key as an extractor id.")
+    group.add_argument("--shortcode", action="store_true", help="Treat key as a shortcode.")
+    lookup.set_defaults(func=cmd_lookup)
+
+    sync_tasks = subparsers.add_parser(
+        "sync-tasks", help="Backfill task states from existing metadata files."
+    )
+    sync_tasks.set_defaults(func=cmd_sync_tasks)
+
+    tasks = subparsers.add_parser(
+        "tasks", help="Query task states, e.g. URLs still pending apply_watermark."
+    )
+    tasks.add_argument("--task", help="Only this task (e.g. apply_watermark).")
+    tasks.add_argument("--state", choices=TASK_STATES, help="Only this state.")
+    tasks.add_argument("--url", help="Only this URL.")
+    output = tasks.add_mutually_exclusive_group()
+    output.add_argument("--count", action="store_true", help="Count states per task.")
+    output.add_argument("--urls-only", action="store_true", help="Print matching URLs only.")
+    output.add_argument("--json", action="store_true", help="Print rows as JSON.")
+    tasks.set_defaults(func=cmd_tasks)
+
+    return parser.parse_args()
+
+
+def main() -> int:
+    args = parse_args()
+    if not args.metadata_dir:
+        args.metadata_dir = load_app_config().get("metadata_dir", "./metadata")
+
+    if not os.path.isdir(args.metadata_dir):
+        print(f"Metadata directory not found: {args.metadata_dir}", file=sys.stderr)
+        return 1
+
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
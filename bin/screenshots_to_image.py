@@ -11,10 +11,11 @@ lib_path = os.path.join(root_dir, "lib")
 sys.path.append(lib_path)
 
 from python_utils import screenshot_utils as su
-from python_utils.timeline_compositor import compose_timeline_with_images
 
 
 def main(mst_json: str, image_dir: str, output_dir: str = "metadata") -> None:
+    from python_utils.timeline_compositor import compose_timeline_with_images
+
     screens = su.load_screenshots(mst_json)
     screens = su.convert_screenshots_to_utc(screens)
     os.makedirs(output_dir, exist_ok=True)
@@ -1,7 +1,15 @@
 import os
 import re
 import json
-from moviepy.editor import VideoFileClip, TextClip, CompositeVideoClip
+import numpy as np
+from moviepy.editor import VideoFileClip, TextClip, ImageClip, CompositeVideoClip
+
+try:
+    from .text_raster_cache import raster_key, shared_text_raster_cache
+    from .render_cache import cached_render
+except ImportError:
+    from text_raster_cache import raster_key, shared_text_raster_cache
+    from render_cache import cached_render
 
 
 # Helper Function: Get codecs based on file extension
@@ -27,8 +35,41 @@ def add_transparent_margin(clip, pad=6):
         return clip.margin(top=pad, bottom=pad, left=pad, right=pad, opacity=0)
     return clip.with_margin(top=pad, bottom=pad, left=pad, right=pad, opacity=0)
 
-# Captioning Function
+
+# Helper Function: Padded caption text clip, rendered once per text/style
+def cached_text_clip(line, params, color, pad):
+    def render():
+        clip = add_transparent_margin(
+            TextClip(line, fontsize=params["font_size"], color=color, font=params["font"]),
+            pad=pad,
+        )
+        rgb = np.asarray(clip.get_frame(0), dtype=np.uint8)
+        alpha = np.asarray(clip.mask.get_frame(0), dtype=np.float32)
+        return rgb, alpha
+
+    cache = shared_text_raster_cache(params.get("raster_cache_dir"))
+    key = raster_key(line, params["font"], params["font_size"], color, pad)
+    rgb, alpha = cache.get_or_render(key, render)
+    return ImageClip(rgb).set_mask(ImageClip(alpha, ismask=True))
+
+# Captioning Function (reuses a cached render when params["render_cache"] is enabled)
 def add_captions(params, logger=None):
+    input_name = params["input_video_path"]
+    filename, ext = os.path.splitext(os.path.basename(input_name))
+    output_video_path = os.path.join(params["download_path"], f"{filename}_captioned{ext}")
+
+    result = cached_render(
+        "add_captions", input_name, params, output_video_path,
+        lambda: _add_captions(params, logger),
+    )
+    if result is True:
+        if logger:
+            logger.info(f"Reused cached captioned video: {output_video_path}")
+        return {"to_process": output_video_path}
+    return result
+
+
+def _add_captions(params, logger=None):
     try:
         if logger:
             logger.info("Initializing captioning process...")
@@ -76,14 +117,11 @@ def add_captions(params, logger=None):
             if end_time > video_clip.duration:
                 end_time = video_clip.duration
 
-            shadow_clip = add_transparent_margin(
-                TextClip(
-                    line,
-                    fontsize=params["font_size"],
-                    color=params.get("shadow", {}).get("color", "black"),
-                    font=params["font"],
-                ),
-                pad=int(params.get("text_pad", 6)),
+            shadow_clip = cached_text_clip(
+                line,
+                params,
+                params.get("shadow", {}).get("color", "black"),
+                int(params.get("text_pad", 6)),
             )
             shadow_clip = (
                 shadow_clip
@@ -97,14 +135,11 @@ def add_captions(params, logger=None):
             )
             caption_clips.append(shadow_clip)
 
-            caption_clip = add_transparent_margin(
-                TextClip(
-                    line,
-                    fontsize=params["font_size"],
-                    color=params["username_color"],
-                    font=params["font"],
-                ),
-                pad=int(params.get("text_pad", 6)),
+            caption_clip = cached_text_clip(
+                line,
+                params,
+                params["username_color"],
+                int(params.get("text_pad", 6)),
             )
             caption_clip = (
                 caption_clip
@@ -117,6 +152,9 @@ def add_captions(params, logger=None):
             overall_start += next_line_pause
             current_top_position += line_height
 
+        if logger:
+            logger.debug(f"Text raster cache: {shared_text_raster_cache().stats()}")
+
         final_video = CompositeVideoClip([video_clip] + caption_clips)
         filename, ext = os.path.splitext(os.path.basename(input_name))
         output_video_path = os.path.join(download_path, f"{filename}_captioned{ext}")
@@ -0,0 +1,243 @@
+###############################################################################
+#                                                                             #
+#                             config_store.py                                 #
+#                                                                             #
+#   Description:                                                              #
+#   ------------------------------------------------------------------------  #
+#   One place to read the JSON files in conf/. Each file is parsed and        #
+#   validated once per process and memoized; every access stats the file      #
+#   and reloads it when its mtime or size changed, so long-running workers    #
+#   (batch routers, in-process task runners) pick up edits without a          #
+#   restart. Used by teton_utils, fb_utils, downloader5, tasks_lib and the    #
+#   bin/ entry points instead of their own loaders.                           #
+#                                                                             #
+#   Functions Included:                                                       #
+#   ------------------------------------------------------------------------  #
+#   - load_app_config() -> dict                                               #
+#     --> conf/app_config.json                                                #
+#                                                                             #
+#   - load_config(required=True) -> dict                                      #
+#     --> This platform's section of conf/config.json                         #
+#                                                                             #
+#   - load_default_task_flags(config_path=None) -> dict                       #
+#     --> The "default_tasks" flags of conf/default_tasks.json                #
+#                                                                             #
+#   - load_json_config(name_or_path: str) -> dict                             #
+#     --> Any other config file, e.g. "untar_config.json"                     #
+#                                                                             #
+#   - default_store() -> ConfigStore                                          #
+#     --> The per-process store behind the functions above                    #
+#                                                                             #
+#   Callers get their own deep copy and may modify it. A file that is         #
+#   missing raises FileNotFoundError; one that is not valid JSON or fails     #
+#   validation raises ValueError, like the loaders this replaces.             #
+#                                                                             #
+###############################################################################
+
+
+import os
+import copy
+import json
+import logging
+import platform
+import threading
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+CONF_DIR = os.path.normpath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "conf")
+)
+APP_CONFIG_NAME = "app_config.json"
+PLATFORM_CONFIG_NAME = "config.json"
+DEFAULT_TASKS_NAME = "default_tasks.json"
+
+# Expected types of the app_config keys other modules read
+APP_CONFIG_TYPES = {
+    "metadata_dir": str,
+    "raw_metadata_mode": str,
+    "video_download": dict,
+    "watermark_config": dict,
+    "render_cache": dict,
+    "make_clips": dict,
+    "captions": dict,
+    "logging": dict,
+}
+
+# Expected types of the keys read from a platform section of config.json
+PLATFORM_CONFIG_TYPES = {
+    "output_dir": str,
+    "target_usb": str,
+    "cookie_path": str,
+    "logging": dict,
+    "watermark_config": dict,
+}
+
+
+def _check_types(path: str, section: dict, types: dict, prefix: str = "") -> None:
+    for key, expected in types.items():
+        value = section.get(key)
+        if value is not None and not isinstance(value, expected):
+            raise ValueError(
+                f"Invalid configuration in {path}: '{prefix}{key}' must be a "
+                f"{expected.__name__}, got {type(value).__name__}"
+            )
+
+
+def _validate_app_config(path: str, data: dict) -> None:
+    _check_types(path, data, APP_CONFIG_TYPES)
+
+
+def _validate_platform_config(path: str, data: dict) -> None:
+    for name, section in data.items():
+        if name.startswith("_"):
+            continue
+        if not isinstance(section, dict):
+            raise ValueError(f"Invalid configuration in {path}: platform '{name}' must be an object")
+        _check_types(path, section, PLATFORM_CONFIG_TYPES, prefix=f"{name}.")
+
+
+def _validate_default_tasks(path: str, data: dict) -> None:
+    flags = data.get("default_tasks")
+    if not isinstance(flags, dict):
+        raise ValueError(f"Invalid configuration in {path}: 'default_tasks' must be an object")
+    for task, value in flags.items():
+        if not isinstance(value, (bool, str, list)):
+            raise ValueError(
+                f"Invalid configuration in {path}: default_tasks.{task} must be "
+                f"true, false or an output path"
+            )
+
+
+VALIDATORS = {
+    APP_CONFIG_NAME: _validate_app_config,
+    PLATFORM_CONFIG_NAME: _validate_platform_config,
+    DEFAULT_TASKS_NAME: _validate_default_tasks,
+}
+
+
+def _file_signature(path: str) -> tuple:
+    st = os.stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+
+class ConfigStore:
+    """Memoized, validated conf/*.json files, reloaded when they change."""
+
+    def __init__(self, conf_dir: str = CONF_DIR):
+        self.conf_dir = conf_dir
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.hits = 0
+
+    def resolve(self, name_or_path: str) -> str:
+        """A bare file name lives in conf_dir; other paths are used as given."""
+        if os.path.dirname(name_or_path):
+            return os.path.abspath(name_or_path)
+        return os.path.join(self.conf_dir, name_or_path)
+
+    def load(self, name_or_path: str) -> dict:
+        """
+        Returns a config file's contents, parsing it only if it changed.
+
+        Args:
+            name_or_path (str): A file name in conf_dir, or a path.
+
+        Returns:
+            dict: A deep copy of the parsed file.
+
+        Raises:
+            FileNotFoundError: If the file does not exist.
+            ValueError: If it is not a valid JSON object or fails validation.
+        """
+        path = self.resolve(name_or_path)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Configuration file not found at {path}")
+        signature = _file_signature(path)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None and entry[0] == signature:
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+
+        data = self._parse(path)
+        with self._lock:
+            if entry is not None:
+                logger.info(f"🔄 Reloaded changed configuration: {path}")
+            self._entries[path] = (signature, data)
+            self.loads += 1
+        return copy.deepcopy(data)
+
+    def _parse(self, path: str) -> dict:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Failed to parse JSON configuration at {path}: {e}")
+        if not isinstance(data, dict):
+            raise ValueError(f"Invalid configuration in {path}: expected a JSON object")
+        validator = VALIDATORS.get(os.path.basename(path))
+        if validator:
+            validator(path, data)
+        return data
+
+    def app_config(self) -> dict:
+        return self.load(APP_CONFIG_NAME)
+
+    def platform_config(self, required: bool = True) -> dict:
+        """
+        Returns this operating system's section of config.json.
+
+        Args:
+            required (bool): Raise ValueError if there is no section for
+                this platform; otherwise return {}.
+        """
+        config = self.load(PLATFORM_CONFIG_NAME)
+        os_name = platform.system()
+        if os_name not in config:
+            if required:
+                raise ValueError(f"Unsupported platform: {os_name}")
+            return {}
+        return config[os_name]
+
+    def default_task_flags(self, config_path: Optional[str] = None) -> dict:
+        return self.load(config_path or DEFAULT_TASKS_NAME).get("default_tasks", {})
+
+    def clear(self) -> None:
+        """Forgets every loaded file (the next access re-reads it)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"loads": self.loads, "hits": self.hits, "files": len(self._entries)}
+
+
+_default_store = ConfigStore()
+
+
+def default_store() -> ConfigStore:
+    """Returns the per-process config store."""
+    return _default_store
+
+
+def load_app_config() -> dict:
+    """Loads conf/app_config.json."""
+    return _default_store.app_config()
+
+
+def load_config(required: bool = True) -> dict:
+    """Loads this platform's section of conf/config.json."""
+    return _default_store.platform_config(required)
+
+
+def load_default_task_flags(config_path: Optional[str] = None) -> dict:
+    """Loads the "default_tasks" flags (conf/default_tasks.json by default)."""
+    return _default_store.default_task_flags(config_path)
+
+
+def load_json_config(name_or_path: str) -> dict:
+    """Loads any config file by name (in conf/) or path."""
+    return _default_store.load(name_or_path)
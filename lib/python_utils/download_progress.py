@@ -0,0 +1,330 @@
+###############################################################################
+#                                                                             #
+#                           download_progress.py                              #
+#                                                                             #
+#   Description:                                                              #
+#   ------------------------------------------------------------------------  #
+#   Progress tracking for yt-dlp downloads so an interrupted download can be  #
+#   resumed and other processes can wait for it to finish. A yt-dlp progress  #
+#   hook records bytes and fragment index in a small "<output>.status.json"   #
+#   status file next to the download; the metadata JSON only gets the         #
+#   "download_progress" record at start and at finish or failure. Waiters     #
+#   block on inotify events for that directory instead of polling for .part   #
+#   files.                                                                    #
+#                                                                             #
+#   Functions Included:                                                       #
+#   ------------------------------------------------------------------------  #
+#   - DownloadProgress(output_path, metadata_path=None)                       #
+#     --> yt-dlp progress hook that records progress and the final status     #
+#                                                                             #
+#   - read_status(output_path: str) -> dict | None                            #
+#     --> The status file for a download, if any                              #
+#                                                                             #
+#   - resume_path(progress: dict) -> str | None                               #
+#     --> Output path of an unfinished download to resume                     #
+#                                                                             #
+#   - latest_progress(progress: dict) -> dict | None                          #
+#     --> The download's status file, falling back to the metadata record     #
+#                                                                             #
+#   - download_in_progress(progress: dict) -> bool                            #
+#     --> True while the recorded owner process is still downloading          #
+#                                                                             #
+#   - wait_for_download(output_path: str, timeout=90) -> bool                 #
+#     --> Block until the download finishes, fails or its owner dies          #
+#                                                                             #
+#   yt-dlp resumes .part files (and fragment downloads via its .ytdl file)    #
+#   when it is given the same output template, so resuming only requires      #
+#   downloading to the recorded path again.                                   #
+#                                                                             #
+###############################################################################
+
+
+import os
+import json
+import time
+import errno
+import socket
+import select
+import logging
+import tempfile
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+STATUS_SUFFIX = ".status.json"
+# Minimum seconds between progress writes for one download
+PROGRESS_INTERVAL = 2.0
+# A "downloading" status not updated for this long is treated as abandoned
+STALE_SECONDS = 120.0
+# Fallback wait between checks where inotify is unavailable
+POLL_INTERVAL = 3.0
+
+IN_MODIFY = 0x002
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_NONBLOCK = os.O_NONBLOCK
+
+
+def status_path(output_path: str) -> str:
+    return f"{output_path}{STATUS_SUFFIX}"
+
+
+def read_status(output_path: str) -> Optional[dict]:
+    """Returns the status file for a download, or None if there is none."""
+    try:
+        with open(status_path(output_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def _write_json_atomic(path: str, data: dict) -> None:
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _owner_alive(progress: dict) -> bool:
+    """True if the process that recorded progress may still be running."""
+    if progress.get("host") != socket.gethostname():
+        # Can't signal a process on another machine; trust the timestamp.
+        return True
+    try:
+        os.kill(int(progress.get("pid")), 0)
+    except (TypeError, ValueError):
+        return False
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+def latest_progress(progress: Optional[dict]) -> Optional[dict]:
+    """
+    Returns the status file for the download progress describes, if there is
+    one. The metadata record is only written at start and end, so the status
+    file has the current bytes and "updated" time.
+    """
+    if not progress or not progress.get("path"):
+        return progress
+    return read_status(progress["path"]) or progress
+
+
+def download_in_progress(progress: Optional[dict]) -> bool:
+    """
+    True if progress describes a download that is still running elsewhere:
+    status "downloading", recently updated, and its owner process alive.
+    """
+    progress = latest_progress(progress)
+    if not progress or progress.get("status") != "downloading":
+        return False
+    if progress.get("pid") == os.getpid() and progress.get("host") == socket.gethostname():
+        return False
+    if time.time() - float(progress.get("updated") or 0) > STALE_SECONDS:
+        return False
+    return _owner_alive(progress)
+
+
+def resume_path(progress: Optional[dict]) -> Optional[str]:
+    """
+    Returns the output path of an unfinished download, so a rerun downloads
+    to the same file and yt-dlp continues its .part/fragment files.
+    """
+    if not progress or progress.get("status") == "finished":
+        return None
+    path = progress.get("path")
+    if not path or not os.path.isdir(os.path.dirname(path) or "."):
+        return None
+    return path
+
+
+class DownloadProgress:
+    """
+    yt-dlp progress hook recording one download's progress.
+
+    Pass an instance in ``progress_hooks`` and call finish() once yt-dlp
+    returns (the hook's own "finished" fires per format, before merging).
+    """
+
+    def __init__(self, output_path: str, metadata_path: Optional[str] = None,
+                 interval: float = PROGRESS_INTERVAL):
+        self.output_path = output_path
+        self.metadata_path = metadata_path
+        self.interval = interval
+        self._last_write = 0.0
+        self.progress = {
+            "path": output_path,
+            "status": "downloading",
+            "downloaded_bytes": 0,
+            "total_bytes": None,
+            "fragment_index": None,
+            "fragment_count": None,
+            "pid": os.getpid(),
+            "host": socket.gethostname(),
+            "started": round(time.time(), 3),
+            "updated": round(time.time(), 3),
+        }
+
+    def start(self) -> None:
+        """Records that the download has started."""
+        self._record(force=True, metadata=True)
+
+    def __call__(self, d: dict) -> None:
+        status = d.get("status")
+        if status == "downloading":
+            self.progress.update(
+                {
+                    "downloaded_bytes": d.get("downloaded_bytes") or 0,
+                    "total_bytes": d.get("total_bytes") or d.get("total_bytes_estimate"),
+                    "fragment_index": d.get("fragment_index"),
+                    "fragment_count": d.get("fragment_count"),
+                }
+            )
+            self._record()
+        elif status == "finished":
+            # One format is done; merging may still follow.
+            self.progress["downloaded_bytes"] = d.get("total_bytes") or self.progress["downloaded_bytes"]
+            self._record(force=True)
+        elif status == "error":
+            self.finish("error")
+
+    def finish(self, status: str = "finished") -> dict:
+        """Records the final status ("finished" or "error") and returns it."""
+        self.progress["status"] = status
+        self._record(force=True, metadata=True)
+        if status == "finished":
+            # The output file itself now signals completion.
+            try:
+                os.remove(status_path(self.output_path))
+            except OSError:
+                pass
+        return dict(self.progress)
+
+    def _record(self, force: bool = False, metadata: bool = False) -> None:
+        """
+        Writes the status file (at most once per interval unless forced) and,
+        when metadata is True, the "download_progress" record in the
+        metadata JSON, which can be large and is rewritten whole.
+        """
+        now = time.time()
+        if not force and now - self._last_write < self.interval:
+            return
+        self._last_write = now
+        self.progress["updated"] = round(now, 3)
+
+        try:
+            _write_json_atomic(status_path(self.output_path), self.progress)
+        except OSError as e:
+            logger.debug(f"Could not write download status for {self.output_path}: {e}")
+
+        if metadata and self.metadata_path and os.path.isfile(self.metadata_path):
+            try:
+                try:
+                    from .tasks_lib import load_metadata_json, save_metadata_json
+                except ImportError:
+                    from tasks_lib import load_metadata_json, save_metadata_json
+
+                metadata = load_metadata_json(self.metadata_path)
+                metadata["download_progress"] = dict(self.progress)
+                save_metadata_json(self.metadata_path, metadata)
+            except (OSError, ValueError) as e:
+                logger.debug(f"Could not record download progress in {self.metadata_path}: {e}")
+
+
+def _inotify_watch(directory: str) -> Optional[int]:
+    """Returns an inotify fd watching directory, or None where unsupported."""
+    try:
+        import ctypes
+        import ctypes.util
+
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return None
+        mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+            os.close(fd)
+            return None
+        return fd
+    except (OSError, AttributeError):
+        return None
+
+
+def wait_for_download(output_path: str, timeout: float = 90, log=None) -> bool:
+    """
+    Waits for a download owned by another process to produce output_path.
+
+    Returns as soon as the file appears, and gives up early when the status
+    file reports an error, the owner process has died or the status has gone
+    stale, or when there is neither a status file nor a .part file to wait
+    for. Wakes on inotify events in the output directory where available.
+
+    Args:
+        output_path (str): The final download path.
+        timeout (float): Maximum seconds to wait.
+        log (logging.Logger): Logger to report progress to.
+
+    Returns:
+        bool: True if output_path exists.
+    """
+    log = log or logger
+    directory = os.path.dirname(output_path) or "."
+    base_name = os.path.splitext(os.path.basename(output_path))[0]
+
+    def has_partial() -> bool:
+        if not os.path.isdir(directory):
+            return False
+        return any(
+            name.startswith(base_name) and name.endswith(".part")
+            for name in os.listdir(directory)
+        )
+
+    def should_wait() -> bool:
+        status = read_status(output_path)
+        if status is not None:
+            return download_in_progress(status)
+        # Downloads started without a status file: wait on the .part file.
+        return has_partial()
+
+    if os.path.exists(output_path):
+        return True
+    if not should_wait():
+        return False
+
+    log.info(f"⏳ Waiting up to {timeout}s for download of {base_name} to finish...")
+    fd = _inotify_watch(directory)
+    deadline = time.time() + timeout
+    try:
+        while True:
+            if os.path.exists(output_path):
+                log.info(f"✅ Finalized download detected: {output_path}")
+                return True
+            remaining = deadline - time.time()
+            if remaining <= 0 or not should_wait():
+                break
+            if fd is None:
+                time.sleep(min(POLL_INTERVAL, remaining))
+                continue
+            # Progress writes keep events coming; STALE_SECONDS bounds a silent owner.
+            ready, _, _ = select.select([fd], [], [], min(remaining, STALE_SECONDS))
+            if ready:
+                try:
+                    while os.read(fd, 65536):
+                        pass
+                except BlockingIOError:
+                    pass
+    finally:
+        if fd is not None:
+            os.close(fd)
+
+    log.warning(
+        "⚠️ Download did not finish. Rerun call_router to resume it from the recorded progress."
+    )
+    return False
@@ -3,15 +3,30 @@
 # works with 10.caller.py
 # adding logging
 
-import yt_dlp
-import requests
 import os
+import glob
 import json
+import shutil
 import traceback
 import time
 import logging
 import gzip
 
+try:
+    from .config_store import load_app_config
+    from .download_progress import DownloadProgress, download_in_progress, resume_path
+    from .metadata_index import append_index_record, open_metadata_index
+    from .output_paths import unique_output_path
+    from .tasks_lib import load_metadata_json, save_metadata_json
+    from .ytdlp_sessions import ytdl_session
+except ImportError:
+    from config_store import load_app_config
+    from download_progress import DownloadProgress, download_in_progress, resume_path
+    from metadata_index import append_index_record, open_metadata_index
+    from output_paths import unique_output_path
+    from tasks_lib import load_metadata_json, save_metadata_json
+    from ytdlp_sessions import ytdl_session
+
 ####################
 # Logger setup
 # Set up logging
@@ -31,24 +46,69 @@ logger.addHandler(console_handler)
 
 
 
-def unique_output_path(path, filename):
+
+# A saved extraction older than this (seconds) is extracted again, since the
+# format URLs in it expire; app_config video_download.info_dict_max_age.
+INFO_DICT_MAX_AGE = 3600
+
+
+def save_info_dict(info_dict, metadata_dir, video_identifier, mode="gzip"):
     """
-    Generates a unique output file path by appending a counter to the filename if it already exists.
+    Writes a raw extract_info result to <metadata_dir>/raw.
 
     Args:
-        path (str): Directory path.
-        filename (str): Original filename.
+        info_dict (dict): The extract_info result.
+        metadata_dir (str): The metadata directory.
+        video_identifier (str): File name stem, usually the video id.
+        mode (str): "gzip" (<id>.json.gz), "json" (<id>.json), or anything
+            else to not save it.
 
     Returns:
-        str: A unique file path.
+        str: The written path, or None if nothing was saved.
     """
-    base, ext = os.path.splitext(filename)
-    counter = 1
-    unique_filename = filename
-    while os.path.exists(os.path.join(path, unique_filename)):
-        unique_filename = f"{base}_{counter}{ext}"
-        counter += 1
-    return os.path.join(path, unique_filename)
+    if mode not in {"gzip", "json"}:
+        return None
+    raw_dir = os.path.join(metadata_dir, "raw")
+    os.makedirs(raw_dir, exist_ok=True)
+    if mode == "gzip":
+        raw_path = os.path.join(raw_dir, f"{video_identifier}.json.gz")
+        with gzip.open(raw_path, "wt", encoding="utf-8") as raw_file:
+            json.dump(info_dict, raw_file, indent=2, ensure_ascii=False)
+    else:
+        raw_path = os.path.join(raw_dir, f"{video_identifier}.json")
+        with open(raw_path, "w", encoding="utf-8") as raw_file:
+            json.dump(info_dict, raw_file, indent=2, ensure_ascii=False)
+    return raw_path
+
+
+def load_saved_info_dict(url, metadata_dir, max_age=INFO_DICT_MAX_AGE):
+    """
+    Returns the extract_info result saved for url (see save_info_dict) when
+    it is at most max_age seconds old, so the download chain can skip
+    extract_info after a metadata prefetch.
+
+    Returns:
+        tuple: (info_dict, raw_path), or None if there is no usable one.
+    """
+    indexed = open_metadata_index(metadata_dir).lookup_url(url)
+    if not indexed or not indexed.get("metadata_file"):
+        return None
+    try:
+        metadata = load_metadata_json(os.path.join(metadata_dir, indexed["metadata_file"]), shared=True)
+    except (OSError, ValueError):
+        return None
+    raw_path = metadata.get("raw_metadata_path")
+    if not raw_path or not os.path.isfile(raw_path):
+        return None
+    if time.time() - os.path.getmtime(raw_path) > max_age:
+        return None
+    opener = gzip.open if raw_path.endswith(".gz") else open
+    try:
+        with opener(raw_path, "rt", encoding="utf-8") as raw_file:
+            info_dict = json.load(raw_file)
+    except (OSError, ValueError):
+        return None
+    return (info_dict, raw_path) if isinstance(info_dict, dict) else None
 
 
 def extract_metadata(params):
@@ -73,12 +133,8 @@ def extract_metadata(params):
     metadata_path = params.get("metadata_path")
 
     try:
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        base_dir = os.path.join(current_dir, "../../")
-        config_path = os.path.join(base_dir, "conf/app_config.json")
-        with open(config_path, "r", encoding="utf-8") as f:
-            app_config = json.load(f)
-    except Exception as e:
+        app_config = load_app_config()
+    except (OSError, ValueError) as e:
         logger.warning(f"Could not read app_config.json: {e}")
         app_config = {}
 
@@ -95,56 +151,76 @@ def extract_metadata(params):
             "skip_download": True,  # Skip actual video download
         }
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info_dict = ydl.extract_info(
-                url, download=False
-            )  # Extract metadata without downloading
+        max_age = app_config.get("video_download", {}).get("info_dict_max_age", INFO_DICT_MAX_AGE)
+        saved_info = load_saved_info_dict(url, metadata_dir, max_age) if max_age else None
+        if saved_info:
+            info_dict, raw_path = saved_info
+            # Left as is, so the file's age still dates the extraction.
+            params["raw_metadata_path"] = raw_path
+            params["extract_seconds"] = 0.0
+            logger.info(f"Reusing the extraction saved in {raw_path}")
+        else:
+            with ytdl_session(ydl_opts) as ydl:
+                extract_start = time.time()
+                info_dict = ydl.extract_info(
+                    url, download=False
+                )  # Extract metadata without downloading
+            params["extract_seconds"] = round(time.time() - extract_start, 3)
+            logger.info(f"Metadata extracted in {params['extract_seconds']:.2f} seconds")
+        # Carried to download_video so the page is only extracted once.
+        params["info_dict"] = info_dict
+
+        video_identifier = (
+            info_dict.get("id")
+            or info_dict.get("display_id")
+            or info_dict.get("webpage_url_basename")
+            or str(int(time.time()))
+        )
+
+        if not metadata_path:
+            # Reuse the file already indexed for this URL (e.g. written by
+            # a metadata prefetch) rather than creating <id>_1.json.
+            indexed = open_metadata_index(metadata_dir).lookup_url(url)
+            if indexed and indexed.get("metadata_file"):
+                metadata_path = os.path.join(metadata_dir, indexed["metadata_file"])
+                params["metadata_path"] = metadata_path
 
-            video_identifier = (
-                info_dict.get("id")
-                or info_dict.get("display_id")
-                or info_dict.get("webpage_url_basename")
-                or str(int(time.time()))
-            )
+        if not metadata_path:
+            # Use video ID/shortcode naming instead of timestamp-based filenames.
+            filename = f"{video_identifier}.json"
+            metadata_path = unique_output_path(metadata_dir, filename)
+            params["metadata_path"] = metadata_path
+
+        index_record = {
+            "url": url,
+            "metadata_file": os.path.basename(metadata_path),
+            "id": info_dict.get("id"),
+            "shortcode": info_dict.get("display_id") or info_dict.get("webpage_url_basename"),
+        }
 
-            if not metadata_path:
-                # Use video ID/shortcode naming instead of timestamp-based filenames.
-                filename = f"{video_identifier}.json"
-                metadata_path = unique_output_path(metadata_dir, filename)
-                params["metadata_path"] = metadata_path
+        # Appends to the index log only when the record actually changes.
+        append_index_record(metadata_dir, index_record)
 
-            index_record = {
-                "url": url,
-                "metadata_file": os.path.basename(metadata_path),
-                "id": info_dict.get("id"),
-                "shortcode": info_dict.get("display_id") or info_dict.get("webpage_url_basename"),
-            }
-
-            index_path = os.path.join(metadata_dir, "index.jsonl")
-            with open(index_path, "a", encoding="utf-8") as index_file:
-                index_file.write(json.dumps(index_record, ensure_ascii=False) + "\n")
-
-            raw_mode = app_config.get("raw_metadata_mode", "gzip")
-            if raw_mode in {"gzip", "json"}:
-                raw_dir = os.path.join(metadata_dir, "raw")
-                os.makedirs(raw_dir, exist_ok=True)
-                if raw_mode == "gzip":
-                    raw_path = os.path.join(raw_dir, f"{video_identifier}.json.gz")
-                    with gzip.open(raw_path, "wt", encoding="utf-8") as raw_file:
-                        json.dump(info_dict, raw_file, indent=2, ensure_ascii=False)
-                else:
-                    raw_path = os.path.join(raw_dir, f"{video_identifier}.json")
-                    with open(raw_path, "w", encoding="utf-8") as raw_file:
-                        json.dump(info_dict, raw_file, indent=2, ensure_ascii=False)
+        if not saved_info:
+            raw_path = save_info_dict(
+                info_dict, metadata_dir, video_identifier, app_config.get("raw_metadata_mode", "gzip")
+            )
+            if raw_path:
                 params["raw_metadata_path"] = raw_path
 
-            # Save metadata to file
-            if metadata_path:
-                with open(metadata_path, "w", encoding="utf-8") as f:
-                    json.dump(info_dict, f, indent=4, ensure_ascii=False)
-                logger.info(f"Metadata saved to {metadata_path}")
-
-            return info_dict
+        # Save metadata to file
+        if metadata_path:
+            saved = info_dict
+            progress = _recorded_progress(metadata_path)
+            if progress:
+                # Keep an interrupted download's progress for the resume.
+                saved = {**info_dict, "download_progress": progress}
+            # Atomic and under the file's lock, so concurrent workers
+            # never read a half-written file or lose a journaled state.
+            save_metadata_json(metadata_path, saved)
+            logger.info(f"Metadata saved to {metadata_path}")
+
+        return info_dict
     except Exception as e:
         logger.error(f"Failed to extract metadata: {e}")
         logger.debug(traceback.format_exc())
@@ -246,6 +322,29 @@ def get_codecs_by_extension(extension):
     return codecs.get(extension, {"video_codec": "libx264", "audio_codec": "aac"})
 
 
+def _recorded_progress(metadata_path):
+    """Returns the "download_progress" record from a metadata file, if any."""
+    if not metadata_path or not os.path.isfile(metadata_path):
+        return None
+    try:
+        with open(metadata_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("download_progress")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def recorded_download_path(metadata_path):
+    """
+    Returns the output path of an unfinished download recorded in the
+    metadata file, or None if there is nothing to resume.
+    """
+    progress = _recorded_progress(metadata_path)
+    if download_in_progress(progress):
+        # Another process is still writing that file.
+        return None
+    return resume_path(progress)
+
+
 def create_original_filename(params):
     """
     Generates an original filename for the video based on parameters and returns it as a dictionary.
@@ -266,9 +365,14 @@ def create_original_filename(params):
     video_uploader_filename = video_uploader.replace(" ", "_").replace("/", "_")
     ext = params.get("ext", "mp4")  # Default to mp4 if not specified
     output_filename = f"{video_uploader_filename}_{video_date}.{ext}"
-    
-    # Generate a unique filename to avoid overwrites
-    unique_filename = unique_output_path(download_path, output_filename)
+
+    # An interrupted download of this URL resumes into the same file.
+    unique_filename = recorded_download_path(params.get("metadata_path"))
+    if unique_filename:
+        logger.info(f"Resuming interrupted download into: {unique_filename}")
+    else:
+        # Generate a unique filename to avoid overwrites
+        unique_filename = unique_output_path(download_path, output_filename)
 
     # Update params with the generated filename
     params["original_filename"] = unique_filename
@@ -278,18 +382,85 @@ def create_original_filename(params):
 
 
 
+def throughput_options(video_download_config, extractor=None):
+    """
+    Builds yt-dlp options for the video_download["throughput"] section.
+
+    Args:
+        video_download_config (dict): The video_download config. Its
+            "throughput" section may hold enabled, concurrent_fragments,
+            http_chunk_size, external_downloader, external_downloader_args
+            and per-extractor overrides under "vendors" (e.g. "youtube").
+        extractor (str): yt-dlp extractor key of the URL, if known.
+
+    Returns:
+        dict: Extra yt-dlp options; empty when throughput mode is off.
+    """
+    throughput = dict(video_download_config.get("throughput") or {})
+    vendors = throughput.pop("vendors", None) or {}
+    if extractor:
+        throughput.update(vendors.get(extractor.lower(), {}))
+    if not throughput.get("enabled"):
+        return {}
+
+    opts = {}
+    if throughput.get("concurrent_fragments"):
+        opts["concurrent_fragment_downloads"] = int(throughput["concurrent_fragments"])
+    if throughput.get("http_chunk_size"):
+        opts["http_chunk_size"] = int(throughput["http_chunk_size"])
+
+    downloader = throughput.get("external_downloader")
+    if downloader:
+        if shutil.which(downloader):
+            opts["external_downloader"] = {"default": downloader}
+            if throughput.get("external_downloader_args"):
+                opts["external_downloader_args"] = {
+                    "default": list(throughput["external_downloader_args"])
+                }
+        else:
+            logger.warning(f"External downloader {downloader!r} not found; using yt-dlp's own.")
+    return opts
+
+
+def downloaded_size(path):
+    """Size of the downloaded file, or of the largest <base>.* file yt-dlp produced."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    base = os.path.splitext(path)[0]
+    sizes = [
+        os.path.getsize(candidate)
+        for candidate in glob.glob(glob.escape(base) + ".*")
+        if not candidate.endswith((".json", ".part", ".ytdl"))
+    ]
+    return max(sizes, default=0)
+
+
 def download_video(params):
     """
     Downloads a video from a given URL using yt-dlp.
 
+    When extract_metadata already ran for this URL, its info_dict (carried in
+    params) is downloaded directly with process_ie_result, so the page is not
+    extracted a second time.
+
     Args:
         params (dict): Parameters for the download including:
             - url (str): Video URL.
-            - video_download (dict): Video download configuration.
+            - video_download (dict): Video download configuration, including
+              the optional "throughput" section (see throughput_options).
+            - info_dict (dict): Optional extract_info result to download from.
 
     Returns:
-        str: The path to the downloaded video, or None if download fails.
+        dict: {'to_process': <path>, 'extraction_saved_seconds': <float>,
+               'download_stats': {bytes, seconds, bytes_per_sec, mode, extractor},
+               'download_progress': <final progress record>},
+              or None if download fails. Progress is recorded in the metadata
+              file (params["metadata_path"]) while downloading, so a rerun
+              resumes into the same file.
     """
+    # The info dict is large and only needed here; keep it out of params
+    info_dict = params.pop("info_dict", None)
+
     # Log incoming parameters for diagnostics
     logger.info("Received parameters: download_video:")
     for key, value in params.items():
@@ -307,27 +478,78 @@ def download_video(params):
         logger.info(f"Starting download for URL: {url}")
 
         # Set up yt-dlp options for actual download based on video_download_config
+        cookie_path = video_download_config.get("cookie_path")
         ydl_opts = {
             "outtmpl": params["original_filename"],
-            "cookiefile": video_download_config.get("cookie_path"),
+            "cookiefile": cookie_path if cookie_path and os.path.isfile(cookie_path) else None,
             "format": video_download_config.get("format", "bestvideo+bestaudio/best"),
             "noplaylist": video_download_config.get("noplaylist", True),
             "verbose": True,
         }
+        extractor = (info_dict or {}).get("extractor_key")
+        extra_opts = throughput_options(video_download_config, extractor)
+        ydl_opts.update(extra_opts)
+
+        # Records bytes/fragments so an interrupted download can be resumed.
+        progress = DownloadProgress(params["original_filename"], params.get("metadata_path"))
+        ydl_opts["progress_hooks"] = [progress]
+        ydl_opts["continuedl"] = True
+        progress.start()
 
         logger.debug(f"yt-dlp options: {ydl_opts}")
 
         # Perform the video download
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            logger.info("About to download video.")
-            ydl.download([url])
-            logger.info("Video download completed.")
+        saved_seconds = 0.0
+        transfer_start = time.time()
+        try:
+            with ytdl_session(ydl_opts) as ydl:
+                logger.info("About to download video.")
+                if info_dict:
+                    try:
+                        # Same path as yt-dlp --load-info-json: format selection
+                        # runs with this download's options, no re-extraction.
+                        ydl.process_ie_result(info_dict, download=True)
+                        saved_seconds = float(params.get("extract_seconds") or 0.0)
+                        logger.info(
+                            f"Downloaded from the existing extraction; saved ~{saved_seconds:.2f}s of re-extraction"
+                        )
+                    except Exception as e:
+                        logger.warning(f"Download from extracted info failed ({e}); re-extracting.")
+                        ydl.download([url])
+                else:
+                    ydl.download([url])
+                logger.info("Video download completed.")
+        except BaseException:
+            # Keeps the .part files and recorded progress for a resume.
+            progress.finish("error")
+            raise
+        download_progress = progress.finish("finished")
 
         end_time = time.time()
         logger.info(f"Download completed in {end_time - start_time:.2f} seconds")
+
+        # Achieved throughput, kept in the metadata for per-vendor tuning
+        transfer_seconds = max(end_time - transfer_start, 1e-6)
+        downloaded_bytes = downloaded_size(params["original_filename"])
+        download_stats = {
+            "bytes": downloaded_bytes,
+            "seconds": round(transfer_seconds, 3),
+            "bytes_per_sec": int(downloaded_bytes / transfer_seconds),
+            "mode": "throughput" if extra_opts else "default",
+            "extractor": extractor,
+        }
+        logger.info(
+            f"Downloaded {downloaded_bytes} bytes at {download_stats['bytes_per_sec'] / 1e6:.2f} MB/s "
+            f"({download_stats['mode']} mode)"
+        )
         #save params
         #save_params_to_json(params)
-        return {"to_process": params["original_filename"]}
+        return {
+            "to_process": params["original_filename"],
+            "extraction_saved_seconds": saved_seconds,
+            "download_stats": download_stats,
+            "download_progress": download_progress,
+        }
     except Exception as e:
         logger.error(f"Failed to download video: {e}")
         logger.debug(traceback.format_exc())
@@ -359,5 +581,3 @@ def save_params_to_json(params):
     except Exception as e:
         logger.error(f"Failed to save parameters to JSON: {e}")
         logger.debug(traceback.format_exc())
-
-
@@ -47,10 +47,10 @@
 #    Initializes logging for the script.
 #
 # - load_app_config() -> dict
-#    Load the application configuration from a JSON file.
+#    Load conf/app_config.json (shared, cached and validated, from config_store).
 #
 # - load_config() -> dict
-#    Load configuration based on the operating system.
+#    Load this platform's section of conf/config.json (shared, from config_store).
 #
 # - mask_metadata(params: dict) -> dict
 #    Masks certain metadata for privacy and returns the masked data.
@@ -65,7 +65,7 @@
 #    Stores the params dictionary as a JSON file in the output directory. The filename should match the video file, but with a .json extension.
 #
 # - unique_output_path(path: str, filename: str) -> str
-#    Generates a unique output file path by appending a counter to the filename if it already exists.
+#    Reserves a unique output file path, appending a counter if the name is taken (shared, from output_paths).
 #
 
 
@@ -74,17 +74,19 @@ import os
 import time
 import logging
 import json
-import yt_dlp
 from datetime import datetime
 import sys
-import platform
 import traceback
 import re
-from bs4 import BeautifulSoup
-import requests
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
+
+try:
+    from .config_store import load_app_config, load_config
+    from .output_paths import unique_output_path
+    from .ytdlp_sessions import ytdl_session
+except ImportError:
+    from config_store import load_app_config, load_config
+    from output_paths import unique_output_path
+    from ytdlp_sessions import ytdl_session
 
 
 logger = logging.getLogger(__name__)
@@ -239,7 +241,7 @@ def download_video(params: dict) -> dict:
 
         logger.debug(f"yt-dlp options: {ydl_opts}")
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with ytdl_session(ydl_opts) as ydl:
             logger.info("About to download video.")
             ydl.download([url])
             logger.info("Video download completed.")
@@ -268,6 +270,11 @@ def extract_fb_comments_selenium(url: str, cookies_path: str, wait_time: int = 5
     Returns:
         list: Extracted comment strings.
     """
+    # Selenium is only needed here; importing it at module load slows every CLI.
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.common.by import By
+
     logger = logging.getLogger(__name__)
     logger.info(f"🚀 Launching Selenium to extract comments from: {url}")
     logger.info(f"🔑 Using cookie file: {cookies_path}")
@@ -374,7 +381,7 @@ def extract_metadata(params: dict) -> dict:
         else:
             logger.info("⚠️ No valid cookie file used for metadata extraction.")
 
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with ytdl_session(ydl_opts) as ydl:
             info_dict = ydl.extract_info(url, download=False)
 
             if metadata_path:
@@ -416,48 +423,6 @@ def initialize_logging():
 
 
 
-def load_app_config():
-    """Load the application configuration from a JSON file."""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    base_dir = os.path.join(current_dir, "../")
-
-    if not os.path.exists(base_dir):
-        raise FileNotFoundError(f"Base directory not found at {base_dir}")
-
-    config_path = os.path.join(base_dir, "conf/app_config.json")
-
-    if not os.path.exists(config_path):
-        raise FileNotFoundError(f"Configuration file not found at {config_path}")
-
-    try:
-        with open(config_path, "r") as file:
-            app_config = json.load(file)
-        return app_config
-    except json.JSONDecodeError as e:
-        raise ValueError(f"Failed to parse JSON configuration at {config_path}: {e}")
-
-
-
-
-# Load Platform-Specific Configuration
-def load_config():
-    """Load configuration based on the operating system."""
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    config_path = os.path.join(current_dir, "../conf/config.json")
-
-    if not os.path.exists(config_path):
-        raise FileNotFoundError(f"Configuration file not found at {config_path}")
-
-    with open(config_path, "r") as file:
-        config = json.load(file)
-
-    os_name = platform.system()
-    if os_name not in config:
-        raise ValueError(f"Unsupported platform: {os_name}")
-
-    return config[os_name]
-
-
 # New function to mask metadata
 def mask_metadata(params):
     """
@@ -576,23 +541,3 @@ def store_params_as_json(params):
         logger.error(f"Failed to save params to JSON: {e}")
         logger.debug(traceback.format_exc())
         return {"config_json": None}
-
-
-def unique_output_path(path, filename):
-    """
-    Generates a unique output file path by appending a counter to the filename if it already exists.
-
-    Args:
-        path (str): Directory path.
-        filename (str): Original filename.
-
-    Returns:
-        str: A unique file path.
-    """
-    base, ext = os.path.splitext(filename)
-    counter = 1
-    unique_filename = filename
-    while os.path.exists(os.path.join(path, unique_filename)):
-        unique_filename = f"{base}_{counter}{ext}"
-        counter += 1
-    return os.path.join(path, unique_filename)
@@ -0,0 +1,48 @@
+###############################################################################
+#                                                                             #
+#                             ffmpeg_filters.py                               #
+#                                                                             #
+#   Description:                                                              #
+#   ------------------------------------------------------------------------  #
+#   Quoting for ffmpeg filtergraph strings, shared by make_clips and          #
+#   watermarker2 so their drawtext filters escape user text the same way.     #
+#                                                                             #
+#   Functions Included:                                                       #
+#   ------------------------------------------------------------------------  #
+#   - quote_option(value) -> str                                              #
+#     --> One option value, quoted so ':' and '\' reach the filter literally  #
+#                                                                             #
+#   - escape_filter_args(args: str) -> str                                    #
+#     --> A filter's argument string, escaped for the filtergraph parser      #
+#                                                                             #
+#   - build_filter(name: str, options: list) -> str                           #
+#     --> "name=key=value:..." with every value quoted and escaped            #
+#                                                                             #
+###############################################################################
+
+
+def quote_option(value) -> str:
+    """Quote a filter option value so ':' and '\\' reach the filter literally."""
+    return "'" + str(value).replace("'", "'\\''") + "'"
+
+
+def escape_filter_args(args: str) -> str:
+    """Escape a filter's argument string for the filtergraph parser."""
+    for char in ("\\", "'", "[", "]", ",", ";"):
+        args = args.replace(char, "\\" + char)
+    return args
+
+
+def build_filter(name: str, options: list) -> str:
+    """
+    Build one filter of a filtergraph.
+
+    Args:
+        name (str): The filter name, e.g. "drawtext".
+        options (list): (key, value) pairs, in order.
+
+    Returns:
+        str: The filter, safe to join into a -vf or -filter_complex graph.
+    """
+    args = ":".join(f"{key}={quote_option(value)}" for key, value in options)
+    return f"{name}=" + escape_filter_args(args)
@@ -1,7 +1,17 @@
 import os
+import json
 import logging
+import tempfile
 import traceback
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from .ffmpeg_filters import build_filter
+    from .render_cache import cached_render, open_render_cache, render_key
+except ImportError:
+    from ffmpeg_filters import build_filter
+    from render_cache import cached_render, open_render_cache, render_key
 
 
 
@@ -17,7 +27,496 @@ def get_codecs_by_extension(extension):
     }
     return codecs.get(extension, {"video_codec": "libx264", "audio_codec": "aac"})
 
+# ffprobe H.264 profile -> libx264 -profile:v, for re-encoding a partial GOP
+# that can be joined to stream-copied frames of the same source
+X264_PROFILES = {
+    "Baseline": "baseline",
+    "Constrained Baseline": "baseline",
+    "Main": "main",
+    "High": "high",
+    "High 10": "high10",
+    "High 4:2:2": "high422",
+    "High 4:4:4 Predictive": "high444",
+}
+
+# SPS/PPS id of a re-encoded head. Encoders number their parameter sets 0;
+# a different id keeps the head's set from replacing the source's when both
+# are carried in-band in the joined stream.
+HEAD_SPS_ID = 7
+
+# Keyframes closer than this to the clip start are treated as the start
+KEYFRAME_TOLERANCE = 0.05
+
+
+def to_seconds(value):
+    """Convert a clip time (seconds, or "HH:MM:SS[.ms]") to float seconds."""
+    if isinstance(value, str) and ":" in value:
+        seconds = 0.0
+        for part in value.split(":"):
+            seconds = seconds * 60 + float(part)
+        return seconds
+    return float(value)
+
+
+def clip_fields(idx, clip):
+    """Unpack a (start, end, text[, name]) clip; the name defaults to clip_<idx>."""
+    start, end, text = clip[:3]
+    name = clip[3] if len(clip) > 3 and clip[3] else f"clip_{idx}"
+    return to_seconds(start), to_seconds(end), text, name
+
+
+def load_clips_yaml(yaml_path: str) -> list:
+    """
+    Reads a clips YAML file (see clips/1.yaml) into (start, end, text, name) tuples.
+
+    Args:
+        yaml_path (str): Path to a mapping of clip name -> list of
+            {start, end, text} entries.
+
+    Returns:
+        list: Clip tuples in file order. A name with several entries yields
+        <name>_1, <name>_2, ...
+    """
+    import yaml
+
+    with open(yaml_path, "r", encoding="utf-8") as f:
+        spec = yaml.safe_load(f) or {}
+
+    clips = []
+    for name, entries in spec.items():
+        entries = entries or []
+        for n, entry in enumerate(entries, start=1):
+            clip_name = str(name) if len(entries) == 1 else f"{name}_{n}"
+            clips.append((entry["start"], entry["end"], entry.get("text") or "", clip_name))
+    return clips
+
+
+def drawtext_filter(text, params=None):
+    """
+    Build the overlay-text drawtext filter for a clip.
+
+    Style comes from params (font, font_size, text_color, text_x, text_y),
+    defaulting to 24pt yellow text at (10, 10). The text is drawn literally.
+    """
+    params = params or {}
+    options = []
+    font = params.get("font")
+    if font:
+        options.append(("fontfile" if os.path.isfile(font) else "font", font))
+    options.extend(
+        [
+            ("text", text),
+            ("expansion", "none"),
+            ("x", params.get("text_x", 10)),
+            ("y", params.get("text_y", 10)),
+            ("fontsize", params.get("font_size", 24)),
+            ("fontcolor", params.get("text_color", "yellow")),
+        ]
+    )
+    return build_filter("drawtext", options)
+
+
+def has_audio_stream(input_video_path):
+    """True if the input has an audio stream (assumed True if ffprobe fails)."""
+    command = [
+        "ffprobe", "-v", "error", "-select_streams", "a",
+        "-show_entries", "stream=index", "-of", "csv=p=0", input_video_path,
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return True
+    return bool(result.stdout.strip())
+
+
+def probe_video_stream(input_video_path):
+    """
+    Return codec_name/profile/level/pix_fmt of the first video stream, or {}
+    if ffprobe fails.
+    """
+    command = [
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "stream=codec_name,profile,level,pix_fmt", "-of", "json", input_video_path,
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, check=True)
+        return json.loads(result.stdout)["streams"][0]
+    except (OSError, subprocess.CalledProcessError, ValueError, KeyError, IndexError):
+        return {}
+
+
+def keyframe_times(input_video_path, start, end):
+    """
+    Return video keyframe times in [start, end] from packet flags (no decode).
+
+    Returns None if ffprobe is unavailable or fails.
+    """
+    command = [
+        "ffprobe", "-v", "error", "-select_streams", "v:0",
+        "-read_intervals", f"{start}%{end}",
+        "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", input_video_path,
+    ]
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, check=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+    times = []
+    for line in result.stdout.splitlines():
+        fields = line.strip().split(",")
+        if len(fields) < 2 or "K" not in fields[1]:
+            continue
+        try:
+            pts = float(fields[0])
+        except ValueError:
+            continue
+        if start <= pts <= end:
+            times.append(pts)
+    return sorted(times)
+
+
+def plan_stream_copy(start, end, keyframes):
+    """
+    Split a clip into segments around the first keyframe at/after start.
+
+    Returns a list of ("encode" | "copy", seg_start, seg_end) tuples: the
+    partial GOP before the keyframe is re-encoded, the rest is stream-copied.
+    With no usable keyframe the whole clip is a single "encode" segment.
+    """
+    following = [t for t in keyframes or [] if t >= start - KEYFRAME_TOLERANCE]
+    if not following or following[0] >= end - KEYFRAME_TOLERANCE:
+        return [("encode", start, end)]
+
+    keyframe = following[0]
+    if keyframe - start <= KEYFRAME_TOLERANCE:
+        return [("copy", keyframe, end)]
+    return [("encode", start, keyframe), ("copy", keyframe, end)]
+
+
+def head_encode_options(stream):
+    """
+    Return libx264 options for re-encoding part of an H.264 stream so it can
+    be joined to the stream-copied rest: the same profile, level and pixel
+    format, and its own SPS/PPS id (HEAD_SPS_ID).
+
+    Returns None for other codecs and unknown profiles.
+    """
+    profile = X264_PROFILES.get(stream.get("profile"))
+    if stream.get("codec_name") != "h264" or not profile:
+        return None
+    options = ["-c:v", "libx264", "-profile:v", profile, "-x264-params", f"sps-id={HEAD_SPS_ID}"]
+    level = stream.get("level")
+    if isinstance(level, int) and level > 0:
+        options += ["-level:v", f"{level / 10:.1f}"]
+    if stream.get("pix_fmt"):
+        options += ["-pix_fmt", stream["pix_fmt"]]
+    return options
+
+
+def _segment_command(input_video_path, mode, seg_start, seg_end, output_path, encode_options,
+                     threads=None):
+    command = [
+        "ffmpeg", "-y", "-v", "error",
+        "-ss", f"{seg_start:.6f}", "-i", input_video_path,
+        "-t", f"{seg_end - seg_start:.6f}",
+        "-map", "0:v:0", "-map", "0:a:0?",
+    ]
+    if mode == "copy":
+        command += ["-c:v", "copy", "-avoid_negative_ts", "make_zero"]
+    else:
+        command += encode_options
+        if threads:
+            command += ["-threads", str(threads)]
+    command += ["-c:a", "aac"]
+    if output_path.endswith(".ts"):
+        # Annex B keeps each part's SPS/PPS in-band, in front of its keyframes.
+        command += ["-bsf:v", "h264_mp4toannexb", "-f", "mpegts"]
+    command.append(output_path)
+    return command
+
+
+def cut_clip_stream_copy(input_video_path, start, end, output_video_path, threads=None):
+    """
+    Cut [start, end) without re-encoding the whole clip.
+
+    Seeks on the input side, stream-copies from the first keyframe at or
+    after start, and re-encodes only the partial GOP before it with the
+    source's profile, level and pixel format (see head_encode_options).
+    Both pieces are written as MPEG-TS, which carries each piece's SPS/PPS
+    in-band, and joined with the concat demuxer; a plain MP4 concat would
+    keep only the first piece's parameter sets and corrupt the copied
+    frames. Audio is re-encoded to AAC so both pieces match.
+
+    Returns:
+        bool: False when the source can't be smart-cut (not H.264, unknown
+        profile or no ffprobe); the caller should fall back to a full
+        re-encode.
+    """
+    stream = probe_video_stream(input_video_path)
+    encode_options = head_encode_options(stream)
+    if not encode_options:
+        logger.info(
+            f"Stream copy not supported for {stream.get('codec_name')!r} "
+            f"({stream.get('profile')!r}); re-encoding."
+        )
+        return False
+
+    keyframes = keyframe_times(input_video_path, start, end)
+    if keyframes is None:
+        return False
+    segments = plan_stream_copy(start, end, keyframes)
+    logger.debug(f"Stream copy plan for {output_video_path}: {segments}")
+
+    if len(segments) == 1:
+        mode, seg_start, seg_end = segments[0]
+        subprocess.run(
+            _segment_command(input_video_path, mode, seg_start, seg_end,
+                             output_video_path, encode_options, threads),
+            check=True,
+        )
+        return True
+
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(output_video_path) or None) as tmp:
+        parts = []
+        for n, (mode, seg_start, seg_end) in enumerate(segments):
+            part = os.path.join(tmp, f"part_{n}.ts")
+            subprocess.run(
+                _segment_command(input_video_path, mode, seg_start, seg_end,
+                                 part, encode_options, threads),
+                check=True,
+            )
+            parts.append(part)
+
+        list_path = os.path.join(tmp, "parts.txt")
+        with open(list_path, "w") as f:
+            for part in parts:
+                f.write(f"file '{part}'\n")
+        subprocess.run(
+            [
+                "ffmpeg", "-y", "-v", "error", "-f", "concat", "-safe", "0",
+                "-i", list_path, "-map", "0", "-c", "copy",
+                "-bsf:a", "aac_adtstoasc", output_video_path,
+            ],
+            check=True,
+        )
+    return True
+
+
+def build_single_pass_command(input_video_path, clips, output_paths, params, codecs, audio=True):
+    """
+    Build one ffmpeg command that decodes the source once for all clips.
+
+    The input is seeked to the earliest clip start and read only up to the
+    latest clip end (-ss/-t as input options, so the demuxer stops there
+    instead of decoding the rest of the file); split/asplit fan the decoded
+    stream out to one trim/atrim branch (plus optional drawtext) per clip,
+    each mapped to its own output file.
+
+    Args:
+        clips (list): (start, end, text) tuples in seconds.
+        output_paths (list): One output path per clip.
+        audio (bool): Whether the source has an audio stream to carry over.
+    """
+    origin = min(start for start, _, _ in clips)
+    span = max(end for _, end, _ in clips) - origin
+    count = len(clips)
+
+    graph = ["[0:v]split=%d%s" % (count, "".join(f"[v{i}]" for i in range(count)))]
+    if audio:
+        graph.append("[0:a]asplit=%d%s" % (count, "".join(f"[a{i}]" for i in range(count))))
+
+    for i, (start, end, text) in enumerate(clips):
+        trim = f"start={start - origin:.6f}:end={end - origin:.6f}"
+        chain = f"[v{i}]trim={trim},setpts=PTS-STARTPTS"
+        if text:
+            chain += "," + drawtext_filter(text, params)
+        graph.append(f"{chain}[vo{i}]")
+        if audio:
+            graph.append(f"[a{i}]atrim={trim},asetpts=PTS-STARTPTS[ao{i}]")
+
+    command = [
+        "ffmpeg", "-y",
+        "-ss", f"{origin:.6f}", "-t", f"{span:.6f}", "-i", input_video_path,
+        "-filter_complex", ";".join(graph),
+    ]
+    for i, output_path in enumerate(output_paths):
+        command += ["-map", f"[vo{i}]"]
+        if audio:
+            command += ["-map", f"[ao{i}]", "-c:a", codecs["audio_codec"]]
+        command += ["-c:v", codecs["video_codec"], output_path]
+    return command
+
+
+def clip_cache_params(params, start, end, text):
+    """The render cache parameters of one clip (see render_cache.render_key)."""
+    return {**params, "clip": [start, end, text]}
+
+
+def process_clips_ffmpeg_single_pass(params, clips):
+    """
+    Extract all clips with a single decode of the source.
+
+    Clips already in the render cache are copied from it and left out of
+    the combined run. If the combined ffmpeg run fails, the remaining clips
+    are cut one by one (process_clips_ffmpeg), so one bad clip only fails
+    itself.
+
+    Args:
+        params (dict): input_video_path, download_path and optional
+            drawtext style keys (see drawtext_filter).
+        clips (list): (start, end, text[, name]) tuples.
+
+    Returns:
+        dict: {"output_video_paths": [...], "failed_clips": [...]} in clip
+        order (see run_clip_jobs).
+    """
+    input_video_path = params.get("input_video_path")
+    download_path = params.get("download_path", os.getcwd())
+    if not os.path.exists(input_video_path):
+        raise FileNotFoundError(f"Input video file not found: {input_video_path}")
+
+    codecs = get_codecs_by_extension(os.path.splitext(input_video_path)[1])
+    fields = [clip_fields(idx, clip) for idx, clip in enumerate(clips, start=1)]
+    output_video_paths = [os.path.join(download_path, f"{name}.mp4") for *_, name in fields]
+
+    cache = open_render_cache(params.get("render_cache"))
+    keys = {}
+    pending = []
+    for i, (start, end, text, _) in enumerate(fields):
+        if cache is not None:
+            keys[i] = render_key(
+                "make_clips", input_video_path, clip_cache_params(params, start, end, text)
+            )
+            if cache.fetch(keys[i], output_video_paths[i]):
+                logger.info(f"♻️ Reused cached make_clips output: {output_video_paths[i]}")
+                continue
+        pending.append(i)
+
+    if not pending:
+        return {"output_video_paths": output_video_paths, "failed_clips": []}
+
+    command = build_single_pass_command(
+        input_video_path,
+        [fields[i][:3] for i in pending],
+        [output_video_paths[i] for i in pending],
+        params,
+        codecs,
+        audio=has_audio_stream(input_video_path),
+    )
+    logger.info(f"Extracting {len(pending)} clips in a single pass from {input_video_path}")
+    logger.debug(f"ffmpeg command: {command}")
+    try:
+        subprocess.run(command, check=True)
+    except (OSError, subprocess.CalledProcessError) as e:
+        logger.warning(f"Single-pass clip extraction failed ({e}); cutting clips one by one.")
+        logger.debug(traceback.format_exc())
+        return _single_pass_fallback(params, fields, pending, output_video_paths)
+
+    for i in pending:
+        logger.info(f"Clip created: {output_video_paths[i]}")
+        if cache is not None and os.path.isfile(output_video_paths[i]):
+            cache.store(keys[i], output_video_paths[i])
+    return {"output_video_paths": output_video_paths, "failed_clips": []}
+
+
+def _single_pass_fallback(params, fields, pending, output_video_paths):
+    """Cuts the pending clips one by one after a failed single-pass run."""
+    result = process_clips_ffmpeg(
+        {**params, "single_pass": False}, [fields[i] for i in pending]
+    )
+    failed = {fields[pending[f["index"] - 1]][3]: f for f in result["failed_clips"]}
+    failed_clips = [
+        {**failed[name], "index": idx}
+        for idx, (*_, name) in enumerate(fields, start=1)
+        if name in failed
+    ]
+    return {
+        "output_video_paths": [
+            path for (*_, name), path in zip(fields, output_video_paths) if name not in failed
+        ],
+        "failed_clips": failed_clips,
+    }
+
+
+# Encoder threads per clip when params["encoder_threads"] is not set
+DEFAULT_ENCODER_THREADS = 2
+
+
+def clip_schedule(params, clip_count):
+    """
+    Decide how many clips to encode at once and how many threads each gets.
+
+    Concurrency is bounded so jobs x encoder threads stays within the CPU
+    count: params["clip_jobs"] caps the number of concurrent clips and
+    params["encoder_threads"] sets the per-encoder thread count.
+
+    Returns:
+        tuple: (jobs, encoder_threads).
+    """
+    cpus = os.cpu_count() or 1
+    threads = max(1, min(int(params.get("encoder_threads") or DEFAULT_ENCODER_THREADS), cpus))
+    jobs = max(1, cpus // threads)
+    if params.get("clip_jobs"):
+        jobs = min(jobs, int(params["clip_jobs"]))
+    return max(1, min(jobs, clip_count)), threads
+
+
+def run_clip_jobs(worker, clips, params, label):
+    """
+    Run worker(idx, clip, threads) for every clip on a bounded thread pool.
+
+    A failing clip is logged and recorded without stopping the others.
+
+    Returns:
+        dict: {"output_video_paths": [...], "failed_clips": [...]}, both in
+        clip order; failures are {"index", "name", "error"} dicts.
+    """
+    jobs, threads = clip_schedule(params, len(clips))
+    logger.info(f"Encoding {len(clips)} clips with {label}: {jobs} at a time, {threads} threads each")
+
+    def attempt(idx, clip):
+        try:
+            return worker(idx, clip, threads), None
+        except Exception as e:
+            logger.error(f"Error extracting clip {idx}: {e}")
+            logger.info(traceback.format_exc())
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        futures = [
+            pool.submit(attempt, idx, clip) for idx, clip in enumerate(clips, start=1)
+        ]
+        outcomes = [future.result() for future in futures]
+
+    output_video_paths = []
+    failed_clips = []
+    for idx, (clip, (path, error)) in enumerate(zip(clips, outcomes), start=1):
+        if error is None:
+            output_video_paths.append(path)
+        else:
+            failed_clips.append(
+                {"index": idx, "name": clip_fields(idx, clip)[3], "error": str(error)}
+            )
+    if failed_clips:
+        logger.warning(f"{len(failed_clips)} of {len(clips)} clips failed: {failed_clips}")
+    return {"output_video_paths": output_video_paths, "failed_clips": failed_clips}
+
+
 def process_clips_ffmpeg(params, clips):
+    """
+    Extract clips with ffmpeg.
+
+    Args:
+        params (dict): input_video_path, download_path, plus optional
+            stream_copy (default True), single_pass (default False),
+            clip_jobs / encoder_threads (see clip_schedule) and drawtext
+            style keys.
+        clips (list): (start, end, text[, name]) tuples; outputs are
+            <name>.mp4, or clip_<n>.mp4 when unnamed.
+
+    Returns:
+        dict: {"output_video_paths": [...], "failed_clips": [...]}.
+    """
     try:
         input_video_path = params.get("input_video_path")
         download_path = params.get("download_path", os.getcwd())
@@ -34,42 +533,60 @@ def process_clips_ffmpeg(params, clips):
         video_codec = codecs["video_codec"]
         audio_codec = codecs["audio_codec"]
         
-        output_video_paths = []
-        
-        # Process each clip
-        for idx, (start, end, text) in enumerate(clips, start=1):
-            output_video_path = os.path.join(download_path, f"clip_{idx}.mp4")
+        if params.get("single_pass") and len(clips) > 1:
+            return process_clips_ffmpeg_single_pass(params, clips)
+
+        stream_copy = params.get("stream_copy", True)
+
+        def extract(idx, clip, threads):
+            start, end, text, name = clip_fields(idx, clip)
+            output_video_path = os.path.join(download_path, f"{name}.mp4")
+            clip_params = clip_cache_params(params, start, end, text)
+            cached = cached_render(
+                "make_clips", input_video_path, clip_params, output_video_path,
+                lambda: encode(idx, start, end, text, output_video_path, threads),
+            )
+            if not cached:
+                raise RuntimeError(f"Clip {idx} produced no output")
+            return output_video_path
+
+        def encode(idx, start, end, text, output_video_path, threads):
             logger.info(f"Processing clip {idx} from {start}s to {end}s...")
-            
-            # FFmpeg command to extract clips
+
+            if not text and stream_copy:
+                try:
+                    if cut_clip_stream_copy(
+                        input_video_path, start, end, output_video_path, threads
+                    ):
+                        logger.info(f"Clip {idx} created (stream copy): {output_video_path}")
+                        return output_video_path
+                except subprocess.CalledProcessError as e:
+                    logger.warning(f"Stream copy failed for clip {idx} ({e}); re-encoding.")
+
+            # FFmpeg command to extract clips (input-side seek)
             ffmpeg_command = [
-                "ffmpeg", 
-                "-i", input_video_path, 
+                "ffmpeg", "-y",
                 "-ss", str(start), 
-                "-to", str(end), 
+                "-i", input_video_path, 
+                "-t", str(end - start), 
                 "-c:v", video_codec, 
                 "-c:a", audio_codec, 
+                "-threads", str(threads),
                 "-strict", "experimental"
             ]
             
             if text:
                 # Adding overlay text if present
-                ffmpeg_command.extend([
-                    "-vf", f"drawtext=text='{text}':x=10:y=10:fontsize=24:fontcolor=yellow"
-                ])
+                ffmpeg_command.extend(["-vf", drawtext_filter(text, params)])
             
             ffmpeg_command.append(output_video_path)
 
-            try:
-                subprocess.run(ffmpeg_command, check=True)
-                logger.info(f"Clip {idx} created: {output_video_path}")
-                output_video_paths.append(output_video_path)
-            except subprocess.CalledProcessError as e:
-                logger.error(f"Error extracting clip {idx}: {e}")
-                logger.info(traceback.format_exc())
-                raise
-        
-        return {"output_video_paths": output_video_paths}
+            subprocess.run(ffmpeg_command, check=True)
+            logger.info(f"Clip {idx} created: {output_video_path}")
+            return output_video_path
+
+        # Encode clips concurrently; one failed clip doesn't discard the rest
+        return run_clip_jobs(extract, clips, params, "ffmpeg")
     
     except Exception as e:
         logger.error(f"Error in process_clips_ffmpeg: {e}")
@@ -89,11 +606,9 @@ def process_clips_gstreamer(params, clips):
         if not os.path.exists(input_video_path):
             raise FileNotFoundError(f"Input video file not found: {input_video_path}")
         
-        output_video_paths = []
-        
-        # Process each clip
-        for idx, (start, end, text) in enumerate(clips, start=1):
-            output_video_path = os.path.join(download_path, f"clip_{idx}.mp4")
+        def extract(idx, clip, threads):
+            start, end, text, name = clip_fields(idx, clip)
+            output_video_path = os.path.join(download_path, f"{name}.mp4")
             logger.info(f"Processing clip {idx} from {start}s to {end}s...")
 
             # GStreamer command to extract clips
@@ -102,7 +617,7 @@ def process_clips_gstreamer(params, clips):
                 "filesrc", f"location={input_video_path}", 
                 "decodebin", 
                 "videoconvert", 
-                "x264enc", 
+                "x264enc", f"threads={threads}",
                 "mp4mux", 
                 f"filesink location={output_video_path}"
             ]
@@ -113,16 +628,12 @@ def process_clips_gstreamer(params, clips):
                     "textoverlay", f"text={text}:font-desc='Arial, 24':halign=left:valign=top"
                 ])
             
-            try:
-                subprocess.run(gstreamer_command, check=True)
-                logger.info(f"Clip {idx} created: {output_video_path}")
-                output_video_paths.append(output_video_path)
-            except subprocess.CalledProcessError as e:
-                logger.error(f"Error extracting clip {idx}: {e}")
-                logger.info(traceback.format_exc())
-                raise
-
-        return {"output_video_paths": output_video_paths}
+            subprocess.run(gstreamer_command, check=True)
+            logger.info(f"Clip {idx} created: {output_video_path}")
+            return output_video_path
+
+        # Encode clips concurrently; one failed clip doesn't discard the rest
+        return run_clip_jobs(extract, clips, params, "gstreamer")
 
     except Exception as e:
         logger.error(f"Error in process_clips_gstreamer: {e}")
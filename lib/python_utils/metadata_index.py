@@ -0,0 +1,597 @@
+###############################################################################
+#                                                                             #
+#                            metadata_index.py                                #
+#                                                                             #
+#   Description:                                                              #
+#   ------------------------------------------------------------------------  #
+#   SQLite-backed lookup index for the metadata directory. Maps normalized    #
+#   URLs, video ids and shortcodes to the metadata JSON file that describes   #
+#   them, so lookups no longer scan index.jsonl line by line.                 #
+#                                                                             #
+#   Functions Included:                                                       #
+#   ------------------------------------------------------------------------  #
+#   - normalize_url(url: str) -> str                                          #
+#     --> Canonical form of a URL used as the index key                       #
+#                                                                             #
+#   - open_metadata_index(metadata_dir: str) -> MetadataIndex                 #
+#     --> Return the (per-process cached) index for a metadata directory      #
+#                                                                             #
+#   - migrate_jsonl_index(metadata_dir: str) -> int                           #
+#     --> One-shot import of an existing index.jsonl into the SQLite index    #
+#                                                                             #
+#   - append_index_record(metadata_dir: str, record: dict) -> bool            #
+#     --> Append a record to the index.jsonl log and update the SQLite index  #
+#                                                                             #
+#   - compact_index(metadata_dir: str) -> int                                 #
+#     --> Rewrite index.jsonl with one (latest) record per URL                #
+#                                                                             #
+#   The same database holds task_states: one row per (URL, task) with the     #
+#   task's state (pending/done/off) and output path, indexed by task and      #
+#   state, so pending work across the catalogue is one query.                 #
+#                                                                             #
+#   index.jsonl is an append-only log: writers only append, readers take the #
+#   last record for a URL, and compaction drops superseded records once the  #
+#   log holds more than COMPACT_RATIO times the number of live URLs.          #
+#                                                                             #
+###############################################################################
+
+
+import os
+import json
+import logging
+import sqlite3
+import tempfile
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+INDEX_DB_NAME = "index.sqlite"
+INDEX_JSONL_NAME = "index.jsonl"
+INDEX_LOCK_NAME = "index.jsonl.lock"
+
+# Compact the JSONL log once it holds more than COMPACT_RATIO lines per live
+# URL (and at least COMPACT_MIN_LINES lines), keeping appends amortized O(1).
+COMPACT_RATIO = 2
+COMPACT_MIN_LINES = 1000
+
+# Query parameters that only carry share/tracking context and never change
+# which video a URL points at.
+TRACKING_PARAMS = {"si", "feature", "igsh", "igshid", "mibextid", "fbclid"}
+TRACKING_PREFIXES = ("utm_", "__cft__", "__tn__")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    url_key TEXT PRIMARY KEY,
+    url TEXT NOT NULL,
+    metadata_file TEXT NOT NULL,
+    video_id TEXT,
+    shortcode TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_records_video_id ON records(video_id);
+CREATE INDEX IF NOT EXISTS idx_records_shortcode ON records(shortcode);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS task_states (
+    url_key TEXT NOT NULL,
+    url TEXT NOT NULL,
+    task TEXT NOT NULL,
+    state TEXT NOT NULL,
+    output_path TEXT,
+    updated REAL NOT NULL,
+    PRIMARY KEY (url_key, task)
+);
+CREATE INDEX IF NOT EXISTS idx_task_states_task_state ON task_states(task, state);
+CREATE INDEX IF NOT EXISTS idx_task_states_state ON task_states(state);
+"""
+
+# default_tasks values map to task_states.state as: true -> "pending",
+# false/null -> "off", an output path (or list of paths) -> "done".
+TASK_STATES = ("pending", "done", "off")
+
+# Bound on SQL parameters per query (SQLite's default limit is 999 on older builds)
+QUERY_CHUNK = 900
+
+
+def normalize_url(url: str) -> str:
+    """
+    Returns the canonical form of a URL used as the index key.
+
+    Lowercases scheme and host, drops a leading "www.", the fragment, a
+    trailing slash and known share/tracking query parameters, and sorts the
+    remaining parameters so equivalent links map to the same key.
+    """
+    if not url:
+        return ""
+
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    if netloc.startswith("www."):
+        netloc = netloc[4:]
+    path = parts.path.rstrip("/") if parts.path != "/" else ""
+
+    query = [
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in TRACKING_PARAMS and not key.startswith(TRACKING_PREFIXES)
+    ]
+    query.sort()
+
+    return urlunsplit((scheme, netloc, path, urlencode(query), ""))
+
+
+def encode_task_state(value) -> tuple:
+    """Maps a default_tasks value to a (state, output_path) row pair."""
+    if value is True:
+        return "pending", None
+    if value is None or value is False:
+        return "off", None
+    if isinstance(value, str):
+        return "done", value
+    return "done", json.dumps(value, ensure_ascii=False)
+
+
+def decode_task_state(state: str, output_path: Optional[str]):
+    """Inverse of encode_task_state()."""
+    if state == "pending":
+        return True
+    if state == "done":
+        if output_path and output_path.startswith("["):
+            try:
+                return json.loads(output_path)
+            except json.JSONDecodeError:
+                pass
+        return output_path
+    return False
+
+
+class MetadataIndex:
+    """
+    Lookup index stored as ``index.sqlite`` inside a metadata directory.
+
+    Each record maps a URL to its metadata file name plus the extractor id
+    and shortcode. All lookups are primary-key or indexed-column queries.
+    """
+
+    def __init__(self, metadata_dir: str):
+        self.metadata_dir = metadata_dir
+        self.db_path = os.path.join(metadata_dir, INDEX_DB_NAME)
+        self.jsonl_path = os.path.join(metadata_dir, INDEX_JSONL_NAME)
+        self._lock = threading.RLock()
+        self._conn = None
+
+    def connect(self) -> sqlite3.Connection:
+        """Open the database, creating the schema on first use."""
+        if self._conn is None:
+            os.makedirs(self.metadata_dir, exist_ok=True)
+            created = not os.path.exists(self.db_path)
+            self._conn = sqlite3.connect(
+                self.db_path, timeout=30, check_same_thread=False
+            )
+            self._conn.executescript(SCHEMA)
+            if created and os.path.exists(self.jsonl_path):
+                logger.info(f"🗂 Building {INDEX_DB_NAME} from {self.jsonl_path}")
+                self.import_jsonl(self.jsonl_path)
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    @staticmethod
+    def _row_to_record(row) -> Optional[dict]:
+        if row is None:
+            return None
+        url, metadata_file, video_id, shortcode = row
+        return {
+            "url": url,
+            "metadata_file": metadata_file,
+            "id": video_id,
+            "shortcode": shortcode,
+        }
+
+    def _fetch_one(self, where: str, value: str) -> Optional[dict]:
+        query = (
+            "SELECT url, metadata_file, video_id, shortcode FROM records "
+            f"WHERE {where} = ? ORDER BY rowid DESC LIMIT 1"
+        )
+        with self._lock:
+            row = self.connect().execute(query, (value,)).fetchone()
+        return self._row_to_record(row)
+
+    def lookup_url(self, url: str) -> Optional[dict]:
+        """Return the index record for a URL, or None."""
+        return self._fetch_one("url_key", normalize_url(url))
+
+    def lookup_id(self, video_id: str) -> Optional[dict]:
+        """Return the most recent index record for an extractor id, or None."""
+        return self._fetch_one("video_id", video_id)
+
+    def lookup_shortcode(self, shortcode: str) -> Optional[dict]:
+        """Return the most recent index record for a shortcode, or None."""
+        return self._fetch_one("shortcode", shortcode)
+
+    @staticmethod
+    def _record_row(record: dict) -> Optional[tuple]:
+        if not isinstance(record, dict):
+            return None
+        url = record.get("url")
+        metadata_file = record.get("metadata_file")
+        if not url or not metadata_file:
+            return None
+        return (
+            normalize_url(url),
+            url,
+            metadata_file,
+            record.get("id"),
+            record.get("shortcode"),
+        )
+
+    def upsert_many(self, records) -> int:
+        """
+        Inserts or replaces records in a single transaction.
+
+        Records are applied in order, so a later record for the same URL
+        replaces an earlier one.
+
+        Returns:
+            int: Number of records written.
+        """
+        rows = [row for row in map(self._record_row, records) if row]
+        if not rows:
+            return 0
+
+        with self._lock:
+            conn = self.connect()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO records "
+                    "(url_key, url, metadata_file, video_id, shortcode) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+        return len(rows)
+
+    def upsert(self, record: dict) -> None:
+        """Insert or replace the record for ``record["url"]``."""
+        self.upsert_many([record])
+
+    def set_task_states(self, url: str, states: dict, only_missing: bool = False) -> int:
+        """
+        Records default_tasks values for a URL.
+
+        Args:
+            url (str): The URL the tasks belong to.
+            states (dict): task -> default_tasks value.
+            only_missing (bool): Keep tasks that already have a state.
+
+        Returns:
+            int: Number of tasks written.
+        """
+        if not url or not states:
+            return 0
+        url_key = normalize_url(url)
+        now = time.time()
+        rows = [(url_key, url, task, *encode_task_state(value), now) for task, value in states.items()]
+        verb = "INSERT OR IGNORE" if only_missing else "INSERT OR REPLACE"
+        with self._lock:
+            conn = self.connect()
+            with conn:
+                conn.executemany(
+                    f"{verb} INTO task_states (url_key, url, task, state, output_path, updated) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+        return len(rows)
+
+    def get_task_states(self, url: str) -> dict:
+        """Returns task -> default_tasks value for a URL ({} if none are recorded)."""
+        with self._lock:
+            rows = self.connect().execute(
+                "SELECT task, state, output_path FROM task_states WHERE url_key = ?",
+                (normalize_url(url),),
+            ).fetchall()
+        return {task: decode_task_state(state, output_path) for task, state, output_path in rows}
+
+    def query_tasks(
+        self,
+        task: Optional[str] = None,
+        state: Optional[str] = None,
+        urls: Optional[list] = None,
+    ) -> list:
+        """
+        Selects task states by task name, state and/or URL.
+
+        Returns:
+            list: {"url", "task", "state", "output_path", "updated"} dicts,
+            ordered by URL and task.
+        """
+        clauses, values = [], []
+        if task:
+            clauses.append("task = ?")
+            values.append(task)
+        if state:
+            clauses.append("state = ?")
+            values.append(state)
+        if urls is not None:
+            keys = [normalize_url(url) for url in urls]
+            if not keys:
+                return []
+            clauses.append(f"url_key IN ({', '.join('?' for _ in keys)})")
+            values.extend(keys)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self.connect().execute(
+                "SELECT url, task, state, output_path, updated FROM task_states "
+                f"{where} ORDER BY url_key, task",
+                values,
+            ).fetchall()
+        return [
+            {"url": url, "task": task, "state": state, "output_path": output_path, "updated": updated}
+            for url, task, state, output_path, updated in rows
+        ]
+
+    def completed_urls(self, urls: list) -> set:
+        """
+        Returns the URLs whose download is done and which have no pending
+        task, using the (url_key, task) primary key; URLs without recorded
+        task states are never reported as completed.
+        """
+        by_key = {}
+        for url in urls:
+            by_key.setdefault(normalize_url(url), []).append(url)
+
+        keys = list(by_key)
+        done_keys = set()
+        with self._lock:
+            conn = self.connect()
+            for start in range(0, len(keys), QUERY_CHUNK):
+                chunk = keys[start:start + QUERY_CHUNK]
+                rows = conn.execute(
+                    "SELECT url_key FROM task_states "
+                    f"WHERE url_key IN ({', '.join('?' for _ in chunk)}) "
+                    "GROUP BY url_key "
+                    "HAVING SUM(state = 'pending') = 0 "
+                    "AND SUM(task = 'perform_download' AND state = 'done') = 1",
+                    chunk,
+                ).fetchall()
+                done_keys.update(row[0] for row in rows)
+        return {url for key in done_keys for url in by_key[key]}
+
+    def task_counts(self) -> dict:
+        """Returns {task: {state: count}} over the whole catalogue."""
+        with self._lock:
+            rows = self.connect().execute(
+                "SELECT task, state, COUNT(*) FROM task_states GROUP BY task, state"
+            ).fetchall()
+        counts = {}
+        for task, state, count in rows:
+            counts.setdefault(task, {})[state] = count
+        return counts
+
+    def iter_records(self) -> list:
+        """Returns every index record."""
+        with self._lock:
+            rows = self.connect().execute(
+                "SELECT url, metadata_file, video_id, shortcode FROM records ORDER BY rowid"
+            ).fetchall()
+        return [self._row_to_record(row) for row in rows]
+
+    def get_log_lines(self) -> int:
+        """Return the number of records appended to index.jsonl since the last compaction."""
+        with self._lock:
+            row = self.connect().execute(
+                "SELECT value FROM meta WHERE key = 'log_lines'"
+            ).fetchone()
+        return row[0] if row else 0
+
+    def set_log_lines(self, value: int) -> None:
+        with self._lock:
+            conn = self.connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('log_lines', ?)",
+                    (value,),
+                )
+
+    def count(self) -> int:
+        """Return the number of indexed URLs."""
+        with self._lock:
+            return self.connect().execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def import_jsonl(self, jsonl_path: str) -> int:
+        """
+        Loads every record of a JSONL index into the database.
+
+        Later lines win over earlier ones for the same URL, matching the
+        behaviour of the old linear scan.
+
+        Returns:
+            int: Number of records imported.
+        """
+        records = read_jsonl_log(jsonl_path)
+        imported = self.upsert_many(records)
+        self.set_log_lines(len(records))
+        return imported
+
+
+def read_jsonl_log(jsonl_path: str) -> list:
+    """
+    Reads every well-formed record from a JSONL index, in file order.
+
+    Args:
+        jsonl_path (str): Path to index.jsonl.
+
+    Returns:
+        list: Records as dicts; malformed lines are skipped.
+    """
+    records = []
+    with open(jsonl_path, "r", encoding="utf-8") as index_file:
+        for line in index_file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning("Skipping malformed index record.")
+                continue
+            if isinstance(record, dict):
+                records.append(record)
+    return records
+
+
+class _IndexLock:
+    """Exclusive advisory lock serialising appends and compaction across processes."""
+
+    def __init__(self, metadata_dir: str):
+        self.path = os.path.join(metadata_dir, INDEX_LOCK_NAME)
+        self._fh = None
+
+    def __enter__(self):
+        self._fh = open(self.path, "a")
+        if fcntl is not None:
+            fcntl.flock(self._fh, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._fh, fcntl.LOCK_UN)
+        self._fh.close()
+        self._fh = None
+
+
+_open_indexes = {}
+_open_indexes_lock = threading.Lock()
+
+
+def open_metadata_index(metadata_dir: str) -> MetadataIndex:
+    """
+    Returns the MetadataIndex for a directory, reusing one connection per
+    directory for the lifetime of the process.
+    """
+    key = os.path.abspath(metadata_dir)
+    with _open_indexes_lock:
+        index = _open_indexes.get(key)
+        if index is None:
+            index = MetadataIndex(metadata_dir)
+            _open_indexes[key] = index
+        return index
+
+
+def migrate_jsonl_index(metadata_dir: str) -> int:
+    """
+    Imports ``index.jsonl`` into ``index.sqlite`` for a metadata directory.
+
+    Args:
+        metadata_dir (str): Directory holding index.jsonl.
+
+    Returns:
+        int: Number of JSONL records imported.
+    """
+    index = open_metadata_index(metadata_dir)
+    if not os.path.exists(index.jsonl_path):
+        logger.warning(f"Metadata index not found: {index.jsonl_path}")
+        return 0
+
+    imported = index.import_jsonl(index.jsonl_path)
+    logger.info(f"✅ Imported {imported} record(s); {index.count()} URL(s) indexed.")
+    return imported
+
+
+def append_index_record(metadata_dir: str, record: dict) -> bool:
+    """
+    Appends a record to the index.jsonl log and updates the SQLite index.
+
+    Fields that are missing or None in ``record`` keep their indexed value,
+    and nothing is written when the merged record equals the indexed one, so
+    repeated writers for the same URL do not grow the log.
+
+    Args:
+        metadata_dir (str): Metadata directory holding the index.
+        record (dict): Record with at least "url" and "metadata_file".
+
+    Returns:
+        bool: True if a line was appended to the log.
+    """
+    if not record.get("url") or not record.get("metadata_file"):
+        return False
+
+    os.makedirs(metadata_dir, exist_ok=True)
+    index = open_metadata_index(metadata_dir)
+
+    with _IndexLock(metadata_dir):
+        existing = index.lookup_url(record["url"]) or {}
+        merged = dict(existing)
+        merged.update({key: value for key, value in record.items() if value is not None})
+        if merged == existing:
+            return False
+
+        with open(index.jsonl_path, "a", encoding="utf-8") as index_file:
+            index_file.write(json.dumps(merged, ensure_ascii=False) + "\n")
+        index.upsert(merged)
+
+        log_lines = index.get_log_lines() + 1
+        index.set_log_lines(log_lines)
+
+        if log_lines >= COMPACT_MIN_LINES and log_lines > COMPACT_RATIO * index.count():
+            _compact_locked(index)
+
+    return True
+
+
+def _compact_locked(index: MetadataIndex) -> int:
+    if not os.path.exists(index.jsonl_path):
+        index.set_log_lines(0)
+        return 0
+
+    latest = {}
+    for record in read_jsonl_log(index.jsonl_path):
+        url = record.get("url")
+        if not url:
+            continue
+        key = normalize_url(url)
+        # Re-insert so the surviving record keeps its most recent position.
+        latest.pop(key, None)
+        latest[key] = record
+
+    fd, tmp_path = tempfile.mkstemp(prefix=".index.", suffix=".jsonl", dir=index.metadata_dir)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as tmp_file:
+            for record in latest.values():
+                tmp_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, index.jsonl_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    index.set_log_lines(len(latest))
+    logger.info(f"🧹 Compacted {index.jsonl_path} to {len(latest)} record(s).")
+    return len(latest)
+
+
+def compact_index(metadata_dir: str) -> int:
+    """
+    Rewrites index.jsonl keeping only the latest record for each URL.
+
+    Args:
+        metadata_dir (str): Metadata directory holding the index.
+
+    Returns:
+        int: Number of records left in the log.
+    """
+    index = open_metadata_index(metadata_dir)
+    with _IndexLock(metadata_dir):
+        return _compact_locked(index)
@@ -0,0 +1,183 @@
+###############################################################################
+#                                                                             #
+#                           metadata_prefetch.py                              #
+#                                                                             #
+#   Description:                                                              #
+#   ------------------------------------------------------------------------  #
+#   Metadata-only prefetch for a whole batch of URLs. Runs the first step of  #
+#   the download chain (downloader5.mask_metadata) for every URL on a thread  #
+#   pool, writes the masked metadata, default task flags and index records    #
+#   up front, and returns the per-URL metadata so the batch can be ordered    #
+#   by expected job size before any download starts.                          #
+#                                                                             #
+#   Functions Included:                                                       #
+#   ------------------------------------------------------------------------  #
+#   - prefetch_url(url: str, cookie_path=None, metadata_dir="./metadata")     #
+#     --> Masked metadata for one URL, extracting only if not yet indexed     #
+#                                                                             #
+#   - prefetch_metadata(urls: list, cookie_path=None, jobs=4, ...) -> dict    #
+#     --> Masked metadata for every URL, extracted concurrently               #
+#                                                                             #
+#   - job_size(metadata: dict) -> float | None                                #
+#     --> Expected job size: bytes, estimated bytes, or duration              #
+#                                                                             #
+#   - order_urls(urls: list, metadata: dict, order: str) -> list              #
+#     --> URLs in input, shortest-first (sjf) or largest-first (ljf) order    #
+#                                                                             #
+#   Extraction is network-bound, so threads are enough; each worker checks    #
+#   out its own pooled YoutubeDL instance (see ytdlp_sessions).               #
+#                                                                             #
+###############################################################################
+
+
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+PREFETCH_JOBS = 4
+ORDERS = ("input", "sjf", "ljf")
+
+
+def prefetch_url(
+    url: str,
+    cookie_path: Optional[str] = None,
+    metadata_dir: str = "./metadata",
+    config_path: str = "conf/default_tasks.json",
+) -> dict:
+    """
+    Extracts, masks and records the metadata for one URL without downloading.
+
+    A URL that already has indexed metadata is not extracted again. The
+    extract_info result is saved next to the metadata (raw_metadata_path),
+    so the download chain can reuse it instead of extracting again (see
+    downloader5.load_saved_info_dict).
+
+    Args:
+        url (str): Video URL.
+        cookie_path (str): Cookie file passed to yt-dlp (optional).
+        metadata_dir (str): Directory holding the metadata index.
+        config_path (str): Path to the default_tasks JSON file.
+
+    Returns:
+        dict: The masked metadata (the caller's own copy), or {} if
+        extraction failed.
+    """
+    import downloader5
+    import tasks_lib
+
+    _, existing = tasks_lib.find_url_json(url, metadata_dir=metadata_dir)
+    if existing:
+        return existing
+
+    params = {"url": url, "cookie_path": cookie_path}
+    masked = downloader5.mask_metadata(params)
+    info_dict = params.pop("info_dict", None)
+    if not masked or not params.get("metadata_path"):
+        return {}
+
+    if info_dict and not params.get("raw_metadata_path"):
+        # raw_metadata_mode is off; save it anyway for the download.
+        video_identifier = info_dict.get("id") or info_dict.get("display_id")
+        if video_identifier:
+            params["raw_metadata_path"] = downloader5.save_info_dict(
+                info_dict, metadata_dir, video_identifier
+            )
+
+    params.update(masked)
+    tasks_lib.write_masked_metadata_with_tasks(params, config_path)
+    return dict(masked)
+
+
+def prefetch_metadata(
+    urls: list,
+    cookie_path: Optional[str] = None,
+    jobs: int = PREFETCH_JOBS,
+    metadata_dir: str = "./metadata",
+    config_path: str = "conf/default_tasks.json",
+) -> dict:
+    """
+    Prefetches metadata for every URL on a pool of `jobs` threads.
+
+    Args:
+        urls (list): Video URLs.
+        cookie_path (str): Cookie file passed to yt-dlp (optional).
+        jobs (int): Number of concurrent extractions.
+        metadata_dir (str): Directory holding the metadata index.
+        config_path (str): Path to the default_tasks JSON file.
+
+    Returns:
+        dict: url -> masked metadata ({} for URLs that failed).
+    """
+
+    def fetch(url):
+        try:
+            return prefetch_url(url, cookie_path, metadata_dir, config_path)
+        except Exception as e:
+            logger.error(f"❌ Metadata prefetch failed for {url}: {e}")
+            logger.debug(traceback.format_exc())
+            return {}
+
+    unique_urls = list(dict.fromkeys(urls))
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        results = dict(zip(unique_urls, pool.map(fetch, unique_urls)))
+
+    fetched = sum(1 for metadata in results.values() if metadata)
+    logger.info(f"📋 Prefetched metadata for {fetched}/{len(unique_urls)} URL(s)")
+    return results
+
+
+def job_size(metadata: dict) -> Optional[float]:
+    """
+    Returns the expected size of a URL's job, or None if unknown.
+
+    Uses the reported filesize, then an estimate from duration and total
+    bitrate (tbr, kbit/s), then the bare duration.
+    """
+    if not metadata:
+        return None
+    filesize = metadata.get("filesize")
+    if filesize:
+        return float(filesize)
+    duration = metadata.get("duration")
+    tbr = metadata.get("tbr")
+    if duration and tbr:
+        return float(duration) * float(tbr) * 1000 / 8
+    if duration:
+        return float(duration)
+    return None
+
+
+def order_urls(urls: list, metadata: dict, order: str = "input") -> list:
+    """
+    Orders URLs for scheduling.
+
+    Args:
+        urls (list): URLs in input order.
+        metadata (dict): url -> masked metadata from prefetch_metadata().
+        order (str): "input" keeps the file order, "sjf" runs the smallest
+            jobs first, "ljf" the largest first (better packing on several
+            workers). URLs of unknown size keep their input order, last.
+
+    Returns:
+        list: The reordered URLs.
+    """
+    if order not in ORDERS:
+        raise ValueError(f"Unknown order '{order}', expected one of {ORDERS}")
+    if order == "input":
+        return list(urls)
+
+    sized = []
+    unknown = []
+    for url in urls:
+        size = job_size(metadata.get(url))
+        if size is None:
+            unknown.append(url)
+        else:
+            sized.append((size, url))
+
+    # sorted() is stable, so equal sizes keep their input order.
+    sized.sort(key=lambda item: item[0], reverse=(order == "ljf"))
+    return [url for _, url in sized] + unknown
@@ -0,0 +1,148 @@
+###############################################################################
+#                                                                             #
+#                              output_paths.py                                #
+#                                                                             #
+#   Description:                                                              #
+#   ------------------------------------------------------------------------  #
+#   Allocation of unique output file names (videos, metadata JSON) shared by  #
+#   downloader5, teton_utils, fb_utils and utilities1. Names are reserved     #
+#   atomically, so concurrent downloads into the same directory never get     #
+#   the same name, and a per-name counter means allocating the n-th           #
+#   "<uploader>_<date>" file costs O(1) file-system calls instead of n stats. #
+#                                                                             #
+#   Functions Included:                                                       #
+#   ------------------------------------------------------------------------  #
+#   - unique_output_path(path: str, filename: str) -> str                     #
+#     --> Reserve and return a free path: filename, then <base>_1<ext>, ...   #
+#                                                                             #
+#   - reservation_dir(path: str, metadata_dir=None) -> str                    #
+#     --> Where the reservations for one output directory are kept            #
+#                                                                             #
+#   Reservations live under the metadata directory (app_config                #
+#   "metadata_dir"), in .names/<hash of the output directory>/, so output     #
+#   and download directories only ever hold the outputs themselves: an        #
+#   empty marker per allocated name (created with O_EXCL) and a               #
+#   "<filename>.next" counter holding the next suffix to try. The output      #
+#   file itself is not created, so tools such as yt-dlp that skip existing    #
+#   files still write to the returned path.                                   #
+#                                                                             #
+###############################################################################
+
+
+import os
+import hashlib
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+try:
+    from .config_store import load_app_config
+except ImportError:
+    from config_store import load_app_config
+
+RESERVATION_DIR = ".names"
+LOCK_NAME = ".lock"
+
+
+class _ReservationLock:
+    """Exclusive advisory lock on a directory's reservations."""
+
+    def __init__(self, reservation_dir: str):
+        self.path = os.path.join(reservation_dir, LOCK_NAME)
+        self._fh = None
+
+    def __enter__(self):
+        self._fh = open(self.path, "a")
+        if fcntl is not None:
+            fcntl.flock(self._fh, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self._fh, fcntl.LOCK_UN)
+        self._fh.close()
+        self._fh = None
+
+
+def _read_counter(counter_path: str) -> int:
+    try:
+        with open(counter_path, "r", encoding="ascii") as f:
+            return max(0, int(f.read().strip() or 0))
+    except (OSError, ValueError):
+        return 0
+
+
+def _write_counter(counter_path: str, value: int) -> None:
+    tmp_path = f"{counter_path}.tmp"
+    with open(tmp_path, "w", encoding="ascii") as f:
+        f.write(str(value))
+    os.replace(tmp_path, counter_path)
+
+
+def _reserve(marker_path: str) -> bool:
+    """Creates marker_path if it does not exist yet; True if we created it."""
+    try:
+        fd = os.open(marker_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except FileExistsError:
+        return False
+    os.close(fd)
+    return True
+
+
+def reservation_dir(path: str, metadata_dir: Optional[str] = None) -> str:
+    """
+    Returns the directory holding the reservations for output directory path.
+
+    Args:
+        path (str): The output directory.
+        metadata_dir (str): Where reservations are kept; defaults to
+            app_config "metadata_dir".
+    """
+    if metadata_dir is None:
+        try:
+            metadata_dir = load_app_config().get("metadata_dir", "./metadata")
+        except (OSError, ValueError):
+            metadata_dir = "./metadata"
+    digest = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(metadata_dir, RESERVATION_DIR, digest)
+
+
+def unique_output_path(path, filename, metadata_dir=None):
+    """
+    Reserves a unique output file path, appending a counter to the filename
+    when it is already taken.
+
+    A name is taken if the file exists or another caller reserved it. The
+    counter continues from the last reserved suffix, so names are never
+    handed out twice even if an earlier file is later removed.
+
+    Args:
+        path (str): Directory path.
+        filename (str): Original filename.
+        metadata_dir (str): Where reservations are kept (see
+            reservation_dir); defaults to app_config "metadata_dir".
+
+    Returns:
+        str: A unique file path.
+    """
+    reserved_dir = reservation_dir(path, metadata_dir)
+    os.makedirs(reserved_dir, exist_ok=True)
+    base, ext = os.path.splitext(filename)
+    counter_path = os.path.join(reserved_dir, f"{filename}.next")
+
+    with _ReservationLock(reserved_dir):
+        counter = _read_counter(counter_path)
+        while True:
+            candidate = filename if counter == 0 else f"{base}_{counter}{ext}"
+            counter += 1
+            # Files written before reservations existed still count as taken.
+            if os.path.exists(os.path.join(path, candidate)):
+                continue
+            if _reserve(os.path.join(reserved_dir, candidate)):
+                break
+        _write_counter(counter_path, counter)
+
+    return os.path.join(path, candidate)
@@ -0,0 +1,248 @@
+###############################################################################
+#                                                                             #
+#                             render_cache.py                                 #
+#                                                                             #
+#   Description:                                                              #
+#   ------------------------------------------------------------------------  #
+#   Content-addressed cache for rendered task outputs (watermarked and        #
+#   captioned videos, extracted clips). The key is a sampled hash of the      #
+#   input file plus the task name and its normalized parameters, so a task    #
+#   re-run on unchanged input with an unchanged config reuses the earlier     #
+#   output (copied, never hardlinked) instead of encoding.                    #
+#                                                                             #
+#   Functions Included:                                                       #
+#   ------------------------------------------------------------------------  #
+#   - sampled_file_hash(path: str) -> str                                     #
+#     --> Fast hash of a file's size and evenly spaced samples                #
+#                                                                             #
+#   - render_key(task: str, input_path: str, params: dict) -> str             #
+#     --> Cache key for one task run                                          #
+#                                                                             #
+#   - open_render_cache(config: dict) -> RenderCache | None                   #
+#     --> Cache described by app_config["render_cache"], or None if disabled  #
+#                                                                             #
+#   - cached_render(task, input_path, params, output_path, render)            #
+#     --> Reuse a cached output or call render() and store its output         #
+#                                                                             #
+#   Entries live in cache_dir as <key><ext>; their mtime is bumped on every   #
+#   hit and the least recently used entries are evicted once the directory   #
+#   grows past max_bytes.                                                     #
+#                                                                             #
+###############################################################################
+
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_SIZE = 1024 * 1024
+SAMPLE_COUNT = 8
+DEFAULT_MAX_BYTES = 20 * 1024 ** 3
+
+# Parameters that locate files or tune caching but don't change the render
+VOLATILE_PARAMS = {
+    "input_video_path",
+    "download_path",
+    "render_cache",
+    "raster_cache_dir",
+    "video_w",
+    "clip_jobs",
+    "encoder_threads",
+}
+
+
+def sampled_file_hash(path: str, sample_size: int = SAMPLE_SIZE, samples: int = SAMPLE_COUNT) -> str:
+    """
+    Hashes a file's size plus `samples` evenly spaced chunks (including the
+    first and last), or the whole file when it is smaller than the samples.
+
+    Args:
+        path (str): File to hash.
+        sample_size (int): Bytes read per sample.
+        samples (int): Number of samples.
+
+    Returns:
+        str: A hex digest.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.blake2b(str(size).encode("ascii"), digest_size=20)
+    with open(path, "rb") as f:
+        if size <= sample_size * samples:
+            for chunk in iter(lambda: f.read(sample_size), b""):
+                digest.update(chunk)
+        else:
+            step = (size - sample_size) // (samples - 1)
+            for n in range(samples):
+                f.seek(n * step)
+                digest.update(f.read(sample_size))
+    return digest.hexdigest()
+
+
+def normalize_params(params: dict) -> str:
+    """Canonical JSON of the parameters that affect a render."""
+    relevant = {k: v for k, v in params.items() if k not in VOLATILE_PARAMS}
+    return json.dumps(relevant, sort_keys=True, default=str)
+
+
+def render_key(task: str, input_path: str, params: dict) -> str:
+    """
+    Returns the cache key for running task on input_path with params.
+
+    Args:
+        task (str): Task name, e.g. "add_watermark".
+        input_path (str): The task's input file.
+        params (dict): Task parameters; VOLATILE_PARAMS are ignored.
+
+    Returns:
+        str: A hex digest.
+    """
+    payload = "\n".join([task, sampled_file_hash(input_path), normalize_params(params)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _copy_atomic(src: str, dst: str) -> None:
+    # Not a hardlink: producers reuse output names and overwrite them in place
+    # (ffmpeg -y, write_videofile), which would rewrite a shared cache entry.
+    tmp = f"{dst}.tmp{os.getpid()}.{threading.get_ident()}"
+    try:
+        shutil.copy2(src, tmp)
+        os.replace(tmp, dst)
+    except OSError:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class RenderCache:
+    """Size-bounded LRU store of rendered outputs in one directory."""
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _entry_path(self, key: str, ext: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}{ext}")
+
+    def fetch(self, key: str, output_path: str) -> bool:
+        """
+        Places the cached output for key at output_path.
+
+        Returns:
+            bool: True on a hit, False if nothing is cached for key.
+        """
+        entry = self._entry_path(key, os.path.splitext(output_path)[1])
+        if not os.path.isfile(entry):
+            return False
+        try:
+            _copy_atomic(entry, output_path)
+            os.utime(entry)
+        except OSError as e:
+            logger.warning(f"⚠️ Render cache hit for {key} could not be reused: {e}")
+            return False
+        return True
+
+    def store(self, key: str, output_path: str) -> None:
+        """Adds output_path to the cache under key and evicts old entries."""
+        entry = self._entry_path(key, os.path.splitext(output_path)[1])
+        try:
+            _copy_atomic(output_path, entry)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not add {output_path} to the render cache: {e}")
+            return
+        self.evict()
+
+    def evict(self) -> int:
+        """
+        Removes least recently used entries until the cache fits max_bytes.
+
+        Returns:
+            int: Number of entries removed.
+        """
+        with self._lock:
+            entries = []
+            for name in os.listdir(self.cache_dir):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                removed += 1
+            if removed:
+                logger.info(f"🧹 Evicted {removed} render cache entries from {self.cache_dir}")
+            return removed
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def open_render_cache(config: Optional[dict]) -> Optional[RenderCache]:
+    """
+    Returns the (per-process) cache for an app_config["render_cache"] section.
+
+    Args:
+        config (dict): {"enabled": bool, "cache_dir": str, "max_bytes": int}.
+
+    Returns:
+        RenderCache: The cache, or None when caching is disabled.
+    """
+    if not config or not config.get("enabled"):
+        return None
+    cache_dir = os.path.abspath(config.get("cache_dir", "./cache/render"))
+    with _caches_lock:
+        cache = _caches.get(cache_dir)
+        if cache is None:
+            cache = _caches[cache_dir] = RenderCache(
+                cache_dir, int(config.get("max_bytes", DEFAULT_MAX_BYTES))
+            )
+        return cache
+
+
+def cached_render(task: str, input_path: str, params: dict, output_path: str, render: Callable):
+    """
+    Reuses a cached output for this task run, or renders and caches it.
+
+    Args:
+        task (str): Task name used in the key.
+        input_path (str): The task's input file.
+        params (dict): Task parameters; params["render_cache"] holds the
+            app_config["render_cache"] section.
+        output_path (str): Where the task writes its output.
+        render (callable): Runs the task; a falsy return means it failed.
+
+    Returns:
+        The render() result, or True when output_path came from the cache.
+    """
+    cache = open_render_cache(params.get("render_cache"))
+    if cache is None:
+        return render()
+
+    key = render_key(task, input_path, params)
+    if cache.fetch(key, output_path):
+        logger.info(f"♻️ Reused cached {task} output: {output_path}")
+        return True
+
+    result = render()
+    if result and os.path.isfile(output_path):
+        cache.store(key, output_path)
+    return result
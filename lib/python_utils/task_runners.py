@@ -0,0 +1,124 @@
+###############################################################################
+#                                                                             #
+#                             task_runners.py                                 #
+#                                                                             #
+#   Description:                                                              #
+#   ------------------------------------------------------------------------  #
+#   In-process equivalents of bin/call_download.py and bin/call_watermark.py  #
+#   (the scripts run the same download chain and watermark runner), used by   #
+#   call_router when tasks run inside the router process instead of one       #
+#   Python subprocess per task.                                               #
+#   Heavy dependencies (yt_dlp, moviepy) are imported on first use and then   #
+#   stay loaded for the rest of the process.                                  #
+#                                                                             #
+#   Every runner has the signature                                            #
+#       run_<task>(task_input: str, context: dict) -> str | list | None       #
+#   where task_input is the URL (download) or the file to process, and        #
+#   context holds "app_config", "config" (platform config) and "logger".      #
+#   The return value is the task output path(s), or None on failure.          #
+#                                                                             #
+#   This module expects lib/python_utils on sys.path, like the bin scripts.   #
+#                                                                             #
+###############################################################################
+
+
+import os
+import logging
+import traceback
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+
+def download_chain() -> list:
+    """Return the ordered list of functions that make up a download."""
+    import downloader5
+    import utilities1
+    import tasks_lib
+
+    return [
+        downloader5.mask_metadata,
+        downloader5.create_original_filename,
+        downloader5.download_video,
+        utilities1.store_params_as_json,
+        tasks_lib.write_masked_metadata_with_tasks,
+    ]
+
+
+def run_download_chain(params: dict, log=None) -> dict:
+    """
+    Runs the download chain, merging each step's result into params.
+
+    Args:
+        params (dict): Download parameters (url, download_path, cookie_path, ...).
+        log (logging.Logger): Logger to report progress to.
+
+    Returns:
+        dict: The updated params.
+    """
+    log = log or logger
+    for func in download_chain():
+        log.info(f"Entering function: {func.__name__}")
+        try:
+            result = func(params)
+            if result:
+                params.update(result)
+        except Exception as e:
+            log.error(f"Error executing {func.__name__}: {e}")
+            log.debug(traceback.format_exc())
+    return params
+
+
+def run_perform_download(url: str, context: dict):
+    """In-process equivalent of bin/call_download.py."""
+    log = context.get("logger") or logger
+    platform_config = context.get("config", {})
+
+    output_dir = platform_config.get("output_dir") or platform_config.get("target_usb")
+    if not output_dir:
+        log.error("No output directory configured. Set 'output_dir' in conf/config.json.")
+        return None
+
+    download_path = os.path.join(output_dir, datetime.now().strftime("%Y-%m-%d"))
+    os.makedirs(download_path, exist_ok=True)
+
+    params = {
+        "download_path": download_path,
+        "cookie_path": platform_config.get("cookie_path"),
+        "url": url.strip(),
+        "video_download": context.get("app_config", {}).get("video_download", {}),
+        **platform_config.get("watermark_config", {}),
+    }
+    params = run_download_chain(params, log)
+    return params.get("original_filename") or None
+
+
+def run_apply_watermark(input_video_path: str, context: dict):
+    """Watermarks a video; bin/call_watermark.py is a thin wrapper around this."""
+    from watermarker2 import add_watermark, looks_like_filename
+    from tasks_lib import load_metadata_json
+
+    log = context.get("logger") or logger
+    watermark_config = context.get("app_config", {}).get("watermark_config", {})
+
+    json_path = f"{os.path.splitext(input_video_path)[0]}.json"
+    if not os.path.isfile(json_path):
+        log.error(f"Metadata file not found: {json_path}")
+        return None
+
+    data = load_metadata_json(json_path, shared=True)
+    username = data.get("uploader", "")
+    if looks_like_filename(username):
+        log.warning("Metadata uploader looks like a filename; skipping username watermark.")
+        username = ""
+
+    params = {
+        **watermark_config,
+        "input_video_path": input_video_path,
+        "download_path": os.path.dirname(input_video_path),
+        "username": username,
+        "video_date": data.get("video_date", datetime.now().strftime("%Y-%m-%d")),
+        "render_cache": context.get("app_config", {}).get("render_cache"),
+    }
+    result = add_watermark(params)
+    return result.get("to_process") if result else None
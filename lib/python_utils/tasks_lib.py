@@ -9,6 +9,18 @@
 #                                                                             #
 #   Functions Included:                                                       #
 #   ------------------------------------------------------------------------  #
+#   - load_metadata_json(path: str, shared: bool = False)                     #
+#     --> Read metadata JSON through the mtime/size-validated LRU cache       #
+#                                                                             #
+#   - save_metadata_json(path: str, data: dict)                               #
+#     --> Atomically write metadata JSON, folding in journaled task states    #
+#                                                                             #
+#   - record_task_states(metadata_path: str, states: dict, ...)               #
+#     --> Append task state transitions to the metadata file's journal        #
+#                                                                             #
+#   - fold_task_journal(metadata_path: str)                                   #
+#     --> Apply the journal to the metadata JSON and clear it                 #
+#                                                                             #
 #   - load_default_tasks(config_path="conf/default_tasks.json")              #
 #     --> Load default task flags from JSON config                            #
 #                                                                             #
@@ -36,6 +48,18 @@
 #   - get_task_states(url, metadata_dir="./metadata")                         #
 #     --> Return all task states from metadata for a given URL                #
 #                                                                             #
+#   - upsert_metadata_index(metadata_path: str, metadata: dict)               #
+#     --> Record a metadata file in index.sqlite and index.jsonl              #
+#                                                                             #
+#   - query_task_states(metadata_dir, task=None, state=None, urls=None)       #
+#     --> Indexed task-state query across the whole catalogue                 #
+#                                                                             #
+#   - sync_task_states(metadata_dir="./metadata")                             #
+#     --> Backfill the task_states table from existing metadata files         #
+#                                                                             #
+#   - filter_pending_urls(urls, metadata_dir="./metadata")                    #
+#     --> Drop fully completed URLs with an indexed query                     #
+#                                                                             #
 #   Author:        Aldebaran                                                  #
 #   Created:       2025-03-18                                                 #
 #   Last Modified: 2025-03-25                                                 #
@@ -44,15 +68,302 @@
 
 
 import os
+import copy
 import json
 import logging
 import shutil
+import sqlite3
+import tempfile
+import threading
 import traceback
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+try:
+    from .config_store import load_default_task_flags
+    from .metadata_index import INDEX_DB_NAME, append_index_record, open_metadata_index
+except ImportError:
+    from config_store import load_default_task_flags
+    from metadata_index import INDEX_DB_NAME, append_index_record, open_metadata_index
 
 # Initialize the logger
 logger = logging.getLogger(__name__)
 logger.info(f"📦 {__name__} imported into {__file__}")
 
+# Parsed metadata JSON keyed by absolute path and validated by (mtime, size),
+# so repeated reads of an unchanged file within one process cost a stat.
+METADATA_CACHE_SIZE = 256
+_metadata_cache = OrderedDict()
+_metadata_cache_lock = threading.Lock()
+_metadata_cache_stats = {"hits": 0, "misses": 0}
+
+
+# Task state transitions are appended to "<metadata>.json.journal" and folded
+# into the JSON once the journal holds JOURNAL_FOLD_ENTRIES entries (or on the
+# next full save). Writers serialise on "<metadata>.json.lock".
+JOURNAL_SUFFIX = ".journal"
+LOCK_SUFFIX = ".lock"
+JOURNAL_FOLD_ENTRIES = 32
+
+
+class _MetadataLock:
+    """Advisory lock on one metadata file: shared for reads, exclusive for writes."""
+
+    def __init__(self, path: str, shared: bool = False):
+        self.path = f"{path}{LOCK_SUFFIX}"
+        self.shared = shared
+        self._fh = None
+
+    def __enter__(self):
+        try:
+            self._fh = open(self.path, "a")
+        except OSError:
+            if not self.shared:
+                raise
+            # Read-only directories can still be read without the lock.
+            return self
+        if fcntl is not None:
+            fcntl.flock(self._fh, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._fh is None:
+            return
+        if fcntl is not None:
+            fcntl.flock(self._fh, fcntl.LOCK_UN)
+        self._fh.close()
+        self._fh = None
+
+
+def _file_signature(path: str):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _read_journal(path: str) -> list:
+    entries = []
+    try:
+        with open(f"{path}{JOURNAL_SUFFIX}", "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn final line from an interrupted append.
+                    continue
+                if isinstance(entry, dict) and entry.get("task"):
+                    entries.append(entry)
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def _apply_journal(data: dict, entries: list) -> dict:
+    """Applies journaled task transitions to metadata, in journal order."""
+    if not entries or not isinstance(data, dict):
+        return data
+    tasks = data.setdefault("default_tasks", {})
+    for entry in entries:
+        if entry.get("default") and entry["task"] in tasks:
+            continue
+        tasks[entry["task"]] = entry.get("state")
+    return data
+
+
+def _write_json_atomic(path: str, data: dict) -> None:
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=4)
+        # mkstemp creates 0600; keep the existing file's mode.
+        mode = os.stat(path).st_mode & 0o777 if os.path.exists(path) else 0o644
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_metadata_json(path: str, shared: bool = False) -> dict:
+    """
+    Loads a metadata JSON file through the in-process LRU cache.
+
+    Task states still in the file's journal are applied to the result, so
+    callers always see the latest state.
+
+    Args:
+        path (str): Path to the metadata JSON file.
+        shared (bool): Return the cached object itself instead of a private
+            deep copy. Saves the copy for read-only callers; the result
+            must not be modified.
+
+    Returns:
+        dict: Parsed metadata.
+
+    Raises:
+        OSError: If the file cannot be read.
+        json.JSONDecodeError: If the file is not valid JSON.
+    """
+    key = os.path.abspath(path)
+    st = os.stat(key)
+    signature = ((st.st_mtime_ns, st.st_size), _file_signature(f"{key}{JOURNAL_SUFFIX}"))
+
+    with _metadata_cache_lock:
+        entry = _metadata_cache.get(key)
+        if entry is not None and entry[0] == signature:
+            _metadata_cache.move_to_end(key)
+            _metadata_cache_stats["hits"] += 1
+            data = entry[1]
+        else:
+            data = None
+
+    if data is None:
+        # The shared lock keeps a concurrent fold from pairing an old file
+        # with an already cleared journal.
+        with _MetadataLock(key, shared=True):
+            signature = (_file_signature(key), _file_signature(f"{key}{JOURNAL_SUFFIX}"))
+            with open(key, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            data = _apply_journal(data, _read_journal(key))
+        _cache_metadata(key, signature, data)
+        with _metadata_cache_lock:
+            _metadata_cache_stats["misses"] += 1
+
+    return data if shared else copy.deepcopy(data)
+
+
+def _save_locked(key: str, data: dict) -> None:
+    data = _apply_journal(copy.deepcopy(data), _read_journal(key))
+    _write_json_atomic(key, data)
+    try:
+        os.remove(f"{key}{JOURNAL_SUFFIX}")
+    except FileNotFoundError:
+        pass
+    _cache_metadata(key, (_file_signature(key), None), data)
+    if isinstance(data, dict):
+        _mirror_task_states(key, data.get("url"), data.get("default_tasks"))
+
+
+def _mirror_task_states(key: str, url, states, only_missing: bool = False) -> None:
+    """Copies task states into the metadata directory's task_states table."""
+    if not url or not states:
+        return
+    try:
+        open_metadata_index(os.path.dirname(key)).set_task_states(url, states, only_missing)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"⚠️ Could not update task_states for {url}: {e}")
+
+
+def _metadata_url(key: str):
+    """The URL of a metadata file, read without taking its lock."""
+    with _metadata_cache_lock:
+        entry = _metadata_cache.get(key)
+    if entry is not None and isinstance(entry[1], dict):
+        return entry[1].get("url")
+    try:
+        with open(key, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    return data.get("url") if isinstance(data, dict) else None
+
+
+def save_metadata_json(path: str, data: dict) -> None:
+    """
+    Atomically writes a metadata JSON file (temp file + rename under the
+    file's lock) and stores the written data in the cache, so the next load
+    of the same file does not re-parse it.
+
+    Task states journaled by record_task_states() are folded into the
+    written data, so a concurrent worker's state change is not lost;
+    change task states through record_task_states() rather than here.
+    """
+    key = os.path.abspath(path)
+    with _MetadataLock(key):
+        _save_locked(key, data)
+
+
+def record_task_states(metadata_path: str, states: dict, only_missing: bool = False) -> None:
+    """
+    Records task state transitions for one metadata file in a single
+    journal append, folding the journal into the JSON once it is long.
+
+    Args:
+        metadata_path (str): Path to the metadata JSON file.
+        states (dict): task -> state (True/False or an output path).
+        only_missing (bool): Only set tasks that have no state yet.
+    """
+    if not states:
+        return
+    key = os.path.abspath(metadata_path)
+    journal_path = f"{key}{JOURNAL_SUFFIX}"
+    entries = [
+        {"task": task, "state": state, **({"default": True} if only_missing else {})}
+        for task, state in states.items()
+    ]
+    with _MetadataLock(key):
+        before = (_file_signature(key), _file_signature(journal_path))
+        with open(journal_path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+        if len(_read_journal(key)) >= JOURNAL_FOLD_ENTRIES:
+            _fold_locked(key)
+        else:
+            _refresh_cached(key, before, entries)
+            _mirror_task_states(key, _metadata_url(key), states, only_missing)
+
+
+def _refresh_cached(key: str, before: tuple, entries: list) -> None:
+    """Applies just-journaled entries to an up-to-date cache entry."""
+    with _metadata_cache_lock:
+        entry = _metadata_cache.get(key)
+        if entry is None or entry[0] != before:
+            return
+        data = _apply_journal(copy.deepcopy(entry[1]), entries)
+    _cache_metadata(key, (before[0], _file_signature(f"{key}{JOURNAL_SUFFIX}")), data)
+
+
+def _fold_locked(key: str) -> None:
+    with open(key, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    _save_locked(key, data)
+
+
+def fold_task_journal(metadata_path: str) -> None:
+    """Applies a metadata file's journaled task states to the JSON and clears the journal."""
+    key = os.path.abspath(metadata_path)
+    with _MetadataLock(key):
+        if os.path.exists(f"{key}{JOURNAL_SUFFIX}"):
+            _fold_locked(key)
+
+
+def _cache_metadata(key: str, signature: tuple, data: dict) -> None:
+    with _metadata_cache_lock:
+        _metadata_cache[key] = (signature, data)
+        _metadata_cache.move_to_end(key)
+        while len(_metadata_cache) > METADATA_CACHE_SIZE:
+            _metadata_cache.popitem(last=False)
+
+
+def clear_metadata_cache() -> None:
+    """Drop all cached metadata and reset the hit/miss counters."""
+    with _metadata_cache_lock:
+        _metadata_cache.clear()
+        _metadata_cache_stats.update(hits=0, misses=0)
+
+
+def metadata_cache_info() -> dict:
+    """Return cache hit/miss counters and the current number of entries."""
+    with _metadata_cache_lock:
+        return dict(_metadata_cache_stats, size=len(_metadata_cache))
+
 
 def load_default_tasks(config_path="conf/default_tasks.json"):
     """
@@ -63,10 +374,8 @@ def load_default_tasks(config_path="conf/default_tasks.json"):
     if not os.path.exists(config_path):
         raise FileNotFoundError(f"Task config file not found: {config_path}")
 
-    with open(config_path, "r") as f:
-        config = json.load(f)
-
-    return config.get("default_tasks", {})
+    # Parsed once and re-read only when the file changes (see config_store).
+    return load_default_task_flags(config_path)
 
 
 def should_perform_task(task: str, task_config: dict) -> bool:
@@ -116,48 +425,10 @@ def copy_metadata_to_backup(params: dict) -> dict:
     return {"full_metadata_json": target_path}
 
 
-def extend_metadata_with_task_output(params: dict) -> dict:
-    """
-    Updates the metadata JSON to mark the task as completed with the final output path.
-    """
-    logger.info("🟠 Entering extend_metadata_with_task_output routine... ✅")
-
-    task = params.get("task")
-    json_path = params.get("full_metadata_json")
-    output_path = (
-        params.get(f"{task}_output_path")
-        or params.get("original_filename")
-        or params.get("to_process")
-    )
-
-    if not json_path or not os.path.exists(json_path):
-        logger.warning("Metadata file not found for extension.")
-        return {"updated_metadata": None}
-
-    try:
-        with open(json_path, "r") as f:
-            data = json.load(f)
-
-        if "default_tasks" in data and task in data["default_tasks"] and output_path:
-            data["default_tasks"][task] = output_path
-            logger.info(f"Marked task '{task}' as completed: {output_path}")
-        else:
-            logger.warning(f"Task '{task}' not found or no output to record.")
-
-        # Save the updated data back to the JSON file
-        with open(json_path, "w") as f:
-            json.dump(data, f, indent=4)
-
-        return {"updated_metadata": json_path}
-    except Exception as e:
-        logger.error(f"Failed to extend metadata for task '{task}': {e}")
-        logger.debug(traceback.format_exc())
-        return {"updated_metadata": None}
-
-
 def find_url_json(url, metadata_dir="./metadata"):
     """
-    Find metadata for a URL using the metadata index for O(1)-ish lookup.
+    Find metadata for a URL using the SQLite metadata index (keyed on the
+    normalized URL), so the lookup cost does not grow with the catalogue.
     """
     logger.info(f"🔍 Searching for URL '{url}' in {metadata_dir}")
 
@@ -165,36 +436,19 @@ def find_url_json(url, metadata_dir="./metadata"):
         logger.warning(f"Metadata directory not found: {metadata_dir}")
         return None, None
 
-    index_path = os.path.join(metadata_dir, "index.jsonl")
-    if not os.path.exists(index_path):
-        logger.warning(f"Metadata index not found: {index_path}")
-        return None, None
-
-    metadata_file = None
     try:
-        with open(index_path, "r", encoding="utf-8") as index_file:
-            for line in index_file:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    record = json.loads(line)
-                except json.JSONDecodeError:
-                    logger.warning("Skipping malformed index record.")
-                    continue
-
-                if record.get("url") == url:
-                    metadata_file = record.get("metadata_file")
-    except OSError as e:
+        record = open_metadata_index(metadata_dir).lookup_url(url)
+    except (sqlite3.Error, OSError) as e:
         logger.error(f"Error reading metadata index: {e}")
         return None, None
 
+    metadata_file = record.get("metadata_file") if record else None
+
     if metadata_file:
         json_path = os.path.join(metadata_dir, metadata_file)
         if os.path.exists(json_path):
             try:
-                with open(json_path, "r", encoding="utf-8") as file:
-                    data = json.load(file)
+                data = load_metadata_json(json_path)
                 logger.info(f"✅ URL found in: {json_path}")
                 return json_path, data
             except (json.JSONDecodeError, OSError) as e:
@@ -205,46 +459,32 @@ def find_url_json(url, metadata_dir="./metadata"):
 
 
 def upsert_metadata_index(metadata_path: str, metadata: dict) -> None:
-    """Keep index.jsonl updated without scanning all metadata files."""
+    """
+    Records a metadata file in the index without scanning or rewriting it.
+
+    The record is appended to the index.jsonl log (last record per URL wins)
+    and applied to index.sqlite; the log is compacted automatically once it
+    grows well past the number of indexed URLs.
+    """
     metadata_dir = os.path.dirname(metadata_path)
     if not metadata_dir:
         return
 
-    os.makedirs(metadata_dir, exist_ok=True)
-    index_path = os.path.join(metadata_dir, "index.jsonl")
     url = metadata.get("url")
     if not url:
         return
 
-    filename = os.path.basename(metadata_path)
     new_record = {
         "url": url,
-        "metadata_file": filename,
+        "metadata_file": os.path.basename(metadata_path),
         "id": metadata.get("id"),
         "shortcode": metadata.get("shortcode") or metadata.get("display_id"),
     }
 
-    records = []
-    if os.path.exists(index_path):
-        try:
-            with open(index_path, "r", encoding="utf-8") as index_file:
-                for line in index_file:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        record = json.loads(line)
-                    except json.JSONDecodeError:
-                        continue
-                    if record.get("url") != url:
-                        records.append(record)
-        except OSError as e:
-            logger.warning(f"Could not read existing index file: {e}")
-
-    records.append(new_record)
-    with open(index_path, "w", encoding="utf-8") as index_file:
-        for record in records:
-            index_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    try:
+        append_index_record(metadata_dir, new_record)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"Could not update metadata index: {e}")
 
 
 # def get_existing_task_output(task: str, task_config: dict) -> str | None:
@@ -304,8 +544,7 @@ def extend_metadata_with_task_output(params: dict) -> dict:
         return {"updated_metadata": None}
 
     try:
-        with open(json_path, "r") as f:
-            data = json.load(f)
+        data = load_metadata_json(json_path, shared=True)
 
         # DEBUG: Show what's in default_tasks
         logger.debug(
@@ -313,7 +552,7 @@ def extend_metadata_with_task_output(params: dict) -> dict:
         )
 
         if "default_tasks" in data and task and output_path:
-            data["default_tasks"][task] = output_path
+            record_task_states(json_path, {task: output_path})
             logger.info(f"✅ Marked task '{task}' as completed: {output_path}")
         else:
             logger.warning(
@@ -322,12 +561,6 @@ def extend_metadata_with_task_output(params: dict) -> dict:
                 f"  output_path: {output_path}"
             )
 
-        # DEBUG: Show what's going to be saved
-        logger.debug(f"📝 Final metadata before save:\n{json.dumps(data, indent=2)}")
-
-        with open(json_path, "w") as f:
-            json.dump(data, f, indent=4)
-
         return {"updated_metadata": json_path}
     except Exception as e:
         logger.error(f"❌ Failed to extend metadata for task '{task}': {e}")
@@ -367,25 +600,20 @@ def add_default_tasks_to_metadata(
         return {"updated_metadata": None}
 
     try:
-        with open(metadata_path, "r") as f:
-            metadata = json.load(f)
+        metadata = load_metadata_json(metadata_path, shared=True)
     except json.JSONDecodeError as e:
         logger.error(f"❌ Error parsing {metadata_path}: {e}")
         return {"updated_metadata": None}
 
     # Add the default tasks to the metadata if they're not already there
-    if "default_tasks" not in metadata:
-        metadata["default_tasks"] = {}
-
-    for task, status in default_tasks.items():
-        if task not in metadata["default_tasks"]:
-            metadata["default_tasks"][task] = status
-            logger.info(f"➕ Added task '{task}' to metadata with status: {status}")
+    existing_tasks = metadata.get("default_tasks", {})
+    missing = {task: status for task, status in default_tasks.items() if task not in existing_tasks}
+    for task, status in missing.items():
+        logger.info(f"➕ Added task '{task}' to metadata with status: {status}")
 
-    # Save the updated metadata back to the file
+    # Journal the additions; a task set concurrently keeps its state
     try:
-        with open(metadata_path, "w") as f:
-            json.dump(metadata, f, indent=4)
+        record_task_states(metadata_path, missing, only_missing=True)
         logger.info(f"✅ Metadata updated with default tasks. Saved to: {metadata_path}")
         return {"updated_metadata": metadata_path}
     except Exception as e:
@@ -418,8 +646,7 @@ def write_masked_metadata_with_tasks(
     existing_metadata = {}
     try:
         if os.path.exists(metadata_path):
-            with open(metadata_path, "r", encoding="utf-8") as f:
-                existing_metadata = json.load(f)
+            existing_metadata = load_metadata_json(metadata_path)
     except (json.JSONDecodeError, OSError) as e:
         logger.error(f"❌ Failed to read metadata file: {e}")
 
@@ -430,6 +657,8 @@ def write_masked_metadata_with_tasks(
             metadata["default_tasks"] = existing_metadata["default_tasks"]
         if "url" in existing_metadata:
             metadata["url"] = existing_metadata["url"]
+        if "download_progress" in existing_metadata:
+            metadata["download_progress"] = existing_metadata["download_progress"]
 
     masked_keys = [
         "video_title",
@@ -452,6 +681,9 @@ def write_masked_metadata_with_tasks(
         "acodec",
         "abr",
         "asr",
+        "download_stats",
+        "download_progress",
+        "raw_metadata_path",
     ]
 
     for key in masked_keys:
@@ -473,13 +705,14 @@ def write_masked_metadata_with_tasks(
     for task, status in default_tasks.items():
         metadata["default_tasks"].setdefault(task, status)
 
+    # Only a finished download is recorded; until then perform_download stays
+    # pending and "download_progress" lets a rerun resume it.
     output_path = params.get("to_process") or params.get("original_filename")
-    if output_path:
-        metadata["default_tasks"]["perform_download"] = output_path
 
     try:
-        with open(metadata_path, "w", encoding="utf-8") as f:
-            json.dump(metadata, f, indent=4)
+        save_metadata_json(metadata_path, metadata)
+        if output_path and os.path.exists(output_path):
+            record_task_states(metadata_path, {"perform_download": output_path})
         upsert_metadata_index(metadata_path, metadata)
         logger.info(f"✅ Masked metadata updated at: {metadata_path}")
         return {"updated_metadata": metadata_path}
@@ -513,18 +746,14 @@ def update_task_output_path(metadata_path: str, task: str, output_path: str) ->
         return {"updated_metadata": None}
 
     try:
-        with open(metadata_path, "r") as f:
-            metadata = json.load(f)
+        metadata = load_metadata_json(metadata_path, shared=True)
 
         if "default_tasks" in metadata:
-            metadata["default_tasks"][task] = output_path
+            record_task_states(metadata_path, {task: output_path})
             logger.info(f"✅ Task '{task}' updated to: {output_path}")
         else:
             logger.warning(f"⚠️ No 'default_tasks' section found in metadata.")
 
-        with open(metadata_path, "w") as f:
-            json.dump(metadata, f, indent=4)
-
         return {"updated_metadata": metadata_path}
     except Exception as e:
         logger.error(f"❌ Failed to update task output path: {e}")
@@ -560,3 +789,70 @@ def get_task_states(url, metadata_dir="./metadata"):
     # Return the task states
     logger.info(f"🛠 Task states for {url}: {default_tasks}")
     return default_tasks
+
+
+def query_task_states(metadata_dir="./metadata", task=None, state=None, urls=None):
+    """
+    Selects task states across the catalogue with one indexed query on the
+    task_states table (see metadata_index).
+
+    Args:
+        metadata_dir (str): The metadata directory.
+        task (str): Only this task (e.g. "apply_watermark").
+        state (str): Only this state: "pending", "done" or "off".
+        urls (list): Only these URLs.
+
+    Returns:
+        list: {"url", "task", "state", "output_path", "updated"} dicts.
+    """
+    return open_metadata_index(metadata_dir).query_tasks(task=task, state=state, urls=urls)
+
+
+def sync_task_states(metadata_dir="./metadata") -> int:
+    """
+    Loads the default_tasks of every indexed metadata file into the
+    task_states table, for catalogues written before the table existed.
+
+    Returns:
+        int: Number of metadata files synced.
+    """
+    index = open_metadata_index(metadata_dir)
+    synced = 0
+    for record in index.iter_records():
+        path = os.path.join(metadata_dir, record["metadata_file"])
+        if not os.path.exists(path):
+            continue
+        try:
+            data = load_metadata_json(path, shared=True)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"⚠️ Skipping unreadable metadata {path}: {e}")
+            continue
+        if index.set_task_states(record["url"], data.get("default_tasks") or {}):
+            synced += 1
+    logger.info(f"🗂 Synced task states for {synced} metadata file(s)")
+    return synced
+
+
+def filter_pending_urls(urls, metadata_dir="./metadata") -> list:
+    """
+    Drops URLs whose download and every task are already done, with one
+    indexed task_states query per few hundred URLs and without opening any
+    metadata file.
+
+    Args:
+        urls (list): URLs in run order.
+        metadata_dir (str): The metadata directory.
+
+    Returns:
+        list: The URLs that still have work, in their original order. If
+        the index can't be read, every URL is returned.
+    """
+    if not urls or not os.path.exists(os.path.join(metadata_dir, INDEX_DB_NAME)):
+        return list(urls)
+    try:
+        completed = open_metadata_index(metadata_dir).completed_urls(urls)
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"⚠️ Could not query task states; keeping every URL: {e}")
+        return list(urls)
+    return [url for url in urls if url not in completed]
+
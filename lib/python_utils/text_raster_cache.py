@@ -0,0 +1,184 @@
+###############################################################################
+#                                                                             #
+#                           text_raster_cache.py                              #
+#                                                                             #
+#   Description:                                                              #
+#   ------------------------------------------------------------------------  #
+#   Content-addressed cache for rendered text rasters, shared by the          #
+#   watermark (watermarker2) and caption (basic_captions3) code. A raster is  #
+#   the (rgb, alpha) array pair for one string rendered with one font, size,  #
+#   colour and padding, so repeated strings (uploader names, dates, shadow    #
+#   copies of caption lines) are rendered by ImageMagick/PIL only once.       #
+#                                                                             #
+#   Functions Included:                                                       #
+#   ------------------------------------------------------------------------  #
+#   - raster_key(text, font, font_size, color, pad=0) -> str                  #
+#     --> Stable content hash used as the cache key                           #
+#                                                                             #
+#   - shared_text_raster_cache(disk_dir=None) -> TextRasterCache              #
+#     --> The per-process cache, optionally backed by an on-disk store        #
+#                                                                             #
+#   The in-memory tier is an LRU of RASTER_CACHE_SIZE entries. The optional   #
+#   disk tier keeps one <key>.npz per raster and survives across runs.        #
+#                                                                             #
+###############################################################################
+
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+RASTER_CACHE_SIZE = 512
+
+
+def raster_key(text, font, font_size, color, pad=0) -> str:
+    """
+    Returns the content hash for a text raster.
+
+    The font file's size and mtime are part of the key when the font is a
+    path, so replacing a font invalidates its on-disk rasters.
+
+    Args:
+        text (str): The rendered string.
+        font (str): Font name or font file path.
+        font_size (int): Font size in points.
+        color: Text colour (name, hex string or RGB sequence).
+        pad (int): Transparent padding around the text, in pixels.
+
+    Returns:
+        str: A hex digest.
+    """
+    font_stamp = None
+    if font and os.path.isfile(font):
+        st = os.stat(font)
+        font_stamp = [st.st_size, st.st_mtime_ns]
+    payload = json.dumps(
+        [text, font, font_stamp, int(font_size), color, int(pad)],
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class TextRasterCache:
+    """In-memory LRU of text rasters with an optional on-disk store."""
+
+    def __init__(self, max_entries: int = RASTER_CACHE_SIZE, disk_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get_or_render(self, key: str, render: Callable):
+        """
+        Returns the cached raster for key, calling render() on a miss.
+
+        Args:
+            key (str): Key from raster_key().
+            render (callable): Returns the (rgb, alpha) arrays for the text.
+
+        Returns:
+            tuple: (rgb, alpha). Arrays are shared between callers; treat
+            them as read-only.
+        """
+        with self._lock:
+            raster = self._entries.get(key)
+            if raster is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return raster
+
+        raster = self._load_disk(key)
+        if raster is not None:
+            with self._lock:
+                self.disk_hits += 1
+        else:
+            raster = tuple(render())
+            with self._lock:
+                self.misses += 1
+            self._store_disk(key, raster)
+
+        with self._lock:
+            self._entries[key] = raster
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return raster
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.npz")
+
+    def _load_disk(self, key: str):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        if not os.path.isfile(path):
+            return None
+        try:
+            import numpy as np
+
+            with np.load(path) as data:
+                return data["rgb"], data["alpha"]
+        except Exception as e:
+            logger.warning(f"⚠️ Ignoring unreadable raster cache entry {path}: {e}")
+            return None
+
+    def _store_disk(self, key: str, raster) -> None:
+        if not self.disk_dir:
+            return
+        try:
+            import numpy as np
+
+            os.makedirs(self.disk_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix=".npz.tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, rgb=raster[0], alpha=raster[1])
+            os.replace(tmp_path, self._disk_path(key))
+        except Exception as e:
+            logger.warning(f"⚠️ Could not write raster cache entry for {key}: {e}")
+
+    def clear(self) -> None:
+        """Drops the in-memory tier and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self) -> dict:
+        """Returns hit/miss counters, the in-memory size and the hit rate."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+
+_shared_cache = TextRasterCache()
+
+
+def shared_text_raster_cache(disk_dir: Optional[str] = None) -> TextRasterCache:
+    """
+    Returns the per-process raster cache.
+
+    Args:
+        disk_dir (str): When given, enables (or moves) the on-disk store.
+
+    Returns:
+        TextRasterCache: The shared cache.
+    """
+    if disk_dir and disk_dir != _shared_cache.disk_dir:
+        _shared_cache.disk_dir = disk_dir
+    return _shared_cache
@@ -6,6 +6,11 @@ import traceback
 import logging
 import json
 
+try:
+    from .output_paths import unique_output_path
+except ImportError:
+    from output_paths import unique_output_path
+
 
 ####################
 # Logger setup
@@ -36,8 +41,10 @@ def store_params_as_json(params):
         original_filename = params.get("original_filename")
         if original_filename:
             json_filename = os.path.splitext(original_filename)[0] + ".json"
+            # The raw yt-dlp info_dict is saved separately by extract_metadata
+            stored = {k: v for k, v in params.items() if k != "info_dict"}
             with open(json_filename, "w") as json_file:
-                json.dump(params, json_file, indent=4)
+                json.dump(stored, json_file, indent=4)
             logger.info(f"Params saved to JSON file: {json_filename}")
             return {"config_json": json_filename}
         else:
@@ -49,25 +56,6 @@ def store_params_as_json(params):
         return {"config_json": None}
 
 
-def unique_output_path(path, filename):
-    """
-    Generates a unique output file path by appending a counter to the filename if it already exists.
-
-    Args:
-        path (str): Directory path.
-        filename (str): Original filename.
-
-    Returns:
-        str: A unique file path.
-    """
-    base, ext = os.path.splitext(filename)
-    counter = 1
-    unique_filename = filename
-    while os.path.exists(os.path.join(path, unique_filename)):
-        unique_filename = f"{base}_{counter}{ext}"
-        counter += 1
-    return os.path.join(path, unique_filename)
-
 
 def print_params(params):
     """
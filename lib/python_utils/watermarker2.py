@@ -1,13 +1,28 @@
 import os
+import json
+import shutil
+import functools
 import logging
 import traceback
+import subprocess
+
+import numpy as np
 
 try:
     # MoviePy v2 style imports
-    from moviepy import VideoFileClip, TextClip, CompositeVideoClip, ColorClip
+    from moviepy import VideoFileClip, VideoClip, ImageClip, TextClip, CompositeVideoClip
 except ImportError:
     # MoviePy v1 style fallback
-    from moviepy.editor import VideoFileClip, TextClip, CompositeVideoClip, ColorClip
+    from moviepy.editor import VideoFileClip, VideoClip, ImageClip, TextClip, CompositeVideoClip
+
+try:
+    from .ffmpeg_filters import build_filter
+    from .text_raster_cache import raster_key, shared_text_raster_cache
+    from .render_cache import cached_render
+except ImportError:
+    from ffmpeg_filters import build_filter
+    from text_raster_cache import raster_key, shared_text_raster_cache
+    from render_cache import cached_render
 
 # Use the logger configured in the caller
 logger = logging.getLogger(__name__)
@@ -22,39 +37,140 @@ def get_codecs_by_extension(extension):
     }
     return codecs.get(extension, {"video_codec": "libx264", "audio_codec": "aac"})
 
-def _build_text_clip(text, params, color):
+def _make_text_clip(text, params, color, font_size):
     common_kwargs = {"color": color, "font": params["font"]}
 
     try:
         # MoviePy v2 API
-        clip = TextClip(text=text, font_size=params["font_size"], **common_kwargs)
+        return TextClip(text=text, font_size=font_size, **common_kwargs)
     except TypeError:
         # Older MoviePy API
-        clip = TextClip(text, fontsize=params["font_size"], **common_kwargs)
+        return TextClip(text, fontsize=font_size, **common_kwargs)
+
+
+def _render_text_raster(text, params, color, font_size, pad):
+    clip = _make_text_clip(text, params, color, font_size)
+    rgb = np.asarray(clip.get_frame(0), dtype=np.uint8)
+    if clip.mask is not None:
+        alpha = np.asarray(clip.mask.get_frame(0), dtype=np.float32)
+    else:
+        alpha = np.ones(rgb.shape[:2], dtype=np.float32)
+    if pad > 0:
+        rgb = np.pad(rgb, ((pad, pad), (pad, pad), (0, 0)))
+        alpha = np.pad(alpha, pad)
+    return rgb, alpha
 
+
+def _rasterize_text(text, params, color, font_size, pad=0):
+    """Return the (rgb uint8, alpha float) arrays for text, via the shared raster cache."""
+    cache = shared_text_raster_cache(params.get("raster_cache_dir"))
+    key = raster_key(text, params["font"], font_size, color, pad)
+    return cache.get_or_render(
+        key, lambda: _render_text_raster(text, params, color, font_size, pad)
+    )
+
+
+def _fitted_font_size(text_w, font_size, params):
+    """Shrink font_size so text_w fits the watermark target width, if a video width is known."""
     video_w = int(params.get("video_w", 0) or 0)
     if video_w > 0:
         quarter = video_w * 0.25
         half = video_w * 0.50
         target = int((quarter + half) / 2)
         target = int(params.get("watermark_target_width", target) or target)
-        if clip.w > target and clip.w > 0:
-            factor = target / clip.w
-            clip = mp_resized(clip, factor=factor)
+        if text_w > target and text_w > 0:
+            return max(1, int(font_size * target / text_w))
+    return font_size
 
+
+def _text_raster(text, params, color):
+    """Padded (rgb, alpha) raster for a watermark text, shrunk to the target width."""
+    font_size = int(params["font_size"])
     pad = int(params.get("text_pad", 8))
-    if pad > 0:
-        width, height = clip.size
-        canvas = ColorClip(size=(width + 2 * pad, height + 2 * pad), color=(0, 0, 0))
-        if hasattr(canvas, "with_opacity"):
-            canvas = canvas.with_opacity(0)
+
+    rgb, alpha = _rasterize_text(text, params, color, font_size, pad)
+    fitted = _fitted_font_size(rgb.shape[1] - 2 * pad, font_size, params)
+    if fitted != font_size:
+        rgb, alpha = _rasterize_text(text, params, color, fitted, pad)
+    return rgb, alpha
+
+
+def _build_text_clip(text, params, color):
+    return mp_raster_clip(*_text_raster(text, params, color))
+
+
+def _place(position, size, frame_size):
+    """Resolve a MoviePy-style position to the top-left pixel of a box in a frame."""
+    coords = []
+    for value, extent, frame_extent in zip(position, size, frame_size):
+        if value in ("left", "top"):
+            coords.append(0)
+        elif value in ("right", "bottom"):
+            coords.append(frame_extent - extent)
+        elif value == "center":
+            coords.append((frame_extent - extent) // 2)
         else:
-            canvas = canvas.set_opacity(0)
+            coords.append(int(value))
+    return tuple(coords)
+
 
-        centered = mp_with_position(clip, ("center", "center"))
-        clip = CompositeVideoClip([canvas, centered], size=canvas.size)
+class StaticOverlay:
+    """
+    All static watermark text pre-blended into one RGBA layer.
+
+    The layers are composited once ("over", in placement order) into a
+    premultiplied colour image and an inverse alpha covering only their
+    joint bounding box, so each frame needs a single vectorized blend of
+    that region instead of one blend per layer over the full frame.
+    """
 
-    return clip
+    def __init__(self, layers, frame_size):
+        """
+        Args:
+            layers (list): (rgb, alpha, position) tuples, bottom to top.
+            frame_size (tuple): (width, height) of the video.
+        """
+        frame_w, frame_h = frame_size
+        boxes = []
+        for rgb, alpha, position in layers:
+            h, w = alpha.shape
+            x, y = _place(position, (w, h), frame_size)
+            boxes.append((x, y, x + w, y + h))
+
+        x0 = max(0, min((b[0] for b in boxes), default=0))
+        y0 = max(0, min((b[1] for b in boxes), default=0))
+        x1 = min(frame_w, max((b[2] for b in boxes), default=0))
+        y1 = min(frame_h, max((b[3] for b in boxes), default=0))
+        self.bbox = (x0, y0, max(x0, x1), max(y0, y1))
+
+        roi_h, roi_w = self.bbox[3] - y0, self.bbox[2] - x0
+        premult = np.zeros((roi_h, roi_w, 3), dtype=np.float32)
+        coverage = np.zeros((roi_h, roi_w, 1), dtype=np.float32)
+        for (rgb, alpha, _), (bx0, by0, bx1, by1) in zip(layers, boxes):
+            # Clip the layer box to the ROI (and so to the frame).
+            cx0, cy0 = max(bx0, x0), max(by0, y0)
+            cx1, cy1 = min(bx1, self.bbox[2]), min(by1, self.bbox[3])
+            if cx0 >= cx1 or cy0 >= cy1:
+                continue
+            src = (slice(cy0 - by0, cy1 - by0), slice(cx0 - bx0, cx1 - bx0))
+            dst = (slice(cy0 - y0, cy1 - y0), slice(cx0 - x0, cx1 - x0))
+            a = alpha[src][..., None].astype(np.float32)
+            premult[dst] = rgb[src].astype(np.float32) * a + premult[dst] * (1.0 - a)
+            coverage[dst] = a + coverage[dst] * (1.0 - a)
+
+        self.premult = premult
+        self.inverse_alpha = 1.0 - coverage
+
+    def apply(self, frame):
+        """Blend the overlay onto one RGB frame and return the new frame."""
+        x0, y0, x1, y1 = self.bbox
+        if x0 >= x1 or y0 >= y1:
+            return frame
+        out = np.array(frame, dtype=np.uint8, copy=True)
+        roi = out[y0:y1, x0:x1]
+        blended = roi.astype(np.float32) * self.inverse_alpha + self.premult
+        roi[...] = np.clip(blended + 0.5, 0, 255).astype(np.uint8)
+        return out
 
 
 def mp_call(obj, old, new, *args, **kwargs):
@@ -76,27 +192,117 @@ def mp_with_duration(clip, duration):
     return mp_call(clip, "set_duration", "with_duration", duration)
 
 
-def mp_with_start(clip, start):
-    return mp_call(clip, "set_start", "with_start", start)
-
-
 def mp_with_audio(clip, audio):
     return mp_call(clip, "set_audio", "with_audio", audio)
 
 
-def mp_resized(clip, factor=None, width=None, height=None):
-    """Resize clips across MoviePy v1/v2 naming differences."""
-    if hasattr(clip, "resized"):
-        return clip.resized(factor=factor, width=width, height=height)
-    if hasattr(clip, "resize"):
-        if factor is not None:
-            return clip.resize(factor)
-        if width is not None and height is None:
-            return clip.resize(width=width)
-        if height is not None and width is None:
-            return clip.resize(height=height)
-        return clip.resize(newsize=(width, height))
-    raise AttributeError(f"{type(clip).__name__} has neither resized nor resize")
+def mp_image_transform(clip, func):
+    return mp_call(clip, "fl_image", "image_transform", func)
+
+
+def mp_with_mask(clip, mask):
+    return mp_call(clip, "set_mask", "with_mask", mask)
+
+
+def mp_video_clip(frame_function, duration, is_mask=False):
+    """Build a VideoClip from a frame function across MoviePy v1/v2."""
+    try:
+        return VideoClip(frame_function, is_mask=is_mask, duration=duration)
+    except TypeError:
+        return VideoClip(frame_function, ismask=is_mask, duration=duration)
+
+
+def mp_raster_clip(rgb, alpha):
+    """Build an ImageClip with an alpha mask across MoviePy v1/v2."""
+    try:
+        mask = ImageClip(alpha, is_mask=True)
+    except TypeError:
+        mask = ImageClip(alpha, ismask=True)
+    return mp_with_mask(ImageClip(rgb), mask)
+
+
+def format_timestamp(seconds):
+    """Format whole seconds as HH:MM:SS."""
+    return f"{seconds // 3600:02}:{(seconds % 3600) // 60:02}:{seconds % 60:02}"
+
+
+TIMESTAMP_GLYPHS = "0123456789:"
+
+
+class TimestampAtlas:
+    """
+    Running HH:MM:SS timestamp drawn from a pre-rasterized glyph atlas.
+
+    Each character in TIMESTAMP_GLYPHS is rendered once. Digits share one
+    cell width so the layer has a fixed size (and position) for the whole
+    video, and only the most recent second is kept, so memory and per-frame
+    cost do not grow with the video length.
+    """
+
+    def __init__(self, params, color, duration):
+        font_size = int(params["font_size"])
+        longest = format_timestamp(int(duration))
+
+        # Apply the same target-width shrink as _build_text_clip, once.
+        sample_w = _rasterize_text(longest, params, color, font_size)[1].shape[1]
+        font_size = _fitted_font_size(sample_w, font_size, params)
+
+        self.glyphs = {
+            char: _rasterize_text(char, params, color, font_size)
+            for char in TIMESTAMP_GLYPHS
+        }
+        self.pad = int(params.get("text_pad", 8))
+        self.cell_w = max(self.glyphs[d][1].shape[1] for d in "0123456789")
+        self.glyph_h = max(alpha.shape[0] for _, alpha in self.glyphs.values())
+
+        text_w = sum(self._advance(char) for char in longest)
+        self.size = (text_w + 2 * self.pad, self.glyph_h + 2 * self.pad)
+        self._second = None
+        self._rendered = None
+
+    def _advance(self, char):
+        return self.cell_w if char.isdigit() else self.glyphs[char][1].shape[1]
+
+    def render(self, t):
+        """Return (rgb, alpha) for time t, re-composing only when the second changes."""
+        second = int(t)
+        if second != self._second:
+            self._rendered = self._compose(format_timestamp(second))
+            self._second = second
+        return self._rendered
+
+    def _compose(self, text):
+        width, height = self.size
+        rgb = np.zeros((height, width, 3), dtype=np.uint8)
+        alpha = np.zeros((height, width), dtype=np.float32)
+
+        x = self.pad
+        for char in text:
+            glyph_rgb, glyph_alpha = self.glyphs[char]
+            glyph_h, glyph_w = glyph_alpha.shape
+            advance = self._advance(char)
+            x0 = x + (advance - glyph_w) // 2
+            y0 = self.pad + (self.glyph_h - glyph_h) // 2
+            if x0 + glyph_w > width:
+                break
+            rgb[y0:y0 + glyph_h, x0:x0 + glyph_w] = glyph_rgb
+            alpha[y0:y0 + glyph_h, x0:x0 + glyph_w] = glyph_alpha
+            x += advance
+        return rgb, alpha
+
+    def frame(self, t):
+        return self.render(t)[0]
+
+    def mask(self, t):
+        return self.render(t)[1]
+
+
+def _build_timestamp_clip(params, duration):
+    """One clip for the whole running timestamp, backed by a TimestampAtlas."""
+    atlas = TimestampAtlas(params, params["timestamp_color"], duration)
+    clip = mp_video_clip(atlas.frame, duration)
+    clip = mp_with_mask(clip, mp_video_clip(atlas.mask, duration, is_mask=True))
+    return mp_with_position(clip, params["timestamp_position"])
 
 
 def looks_like_filename(value):
@@ -110,6 +316,207 @@ def looks_like_filename(value):
     )
 
 
+def ffmpeg_binary(name="ffmpeg"):
+    """Locate ffmpeg/ffprobe on PATH, falling back to imageio-ffmpeg's bundled ffmpeg."""
+    path = shutil.which(name)
+    if path or name != "ffmpeg":
+        return path
+    try:
+        import imageio_ffmpeg
+
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return None
+
+
+def probe_video_size(input_video_path):
+    """Return (width, height) of the first video stream via ffprobe, or (0, 0)."""
+    ffprobe = ffmpeg_binary("ffprobe")
+    if not ffprobe:
+        return 0, 0
+    result = subprocess.run(
+        [
+            ffprobe, "-v", "error", "-select_streams", "v:0",
+            "-show_entries", "stream=width,height", "-of", "json", input_video_path,
+        ],
+        capture_output=True,
+        text=True,
+    )
+    try:
+        stream = json.loads(result.stdout)["streams"][0]
+        return int(stream["width"]), int(stream["height"])
+    except (ValueError, KeyError, IndexError):
+        return 0, 0
+
+
+def _drawtext_xy(position, pad):
+    """Map a MoviePy-style (x, y) position onto drawtext x/y expressions."""
+    horizontal, vertical = position
+    x = {
+        "left": str(pad),
+        "center": "(w-text_w)/2",
+        "right": f"w-text_w-{pad}",
+    }.get(horizontal, f"{horizontal}+{pad}")
+    y = {
+        "top": str(pad),
+        "center": "(h-text_h)/2",
+        "bottom": f"h-text_h-{pad}",
+    }.get(vertical, f"{vertical}+{pad}")
+    return x, y
+
+
+@functools.lru_cache(maxsize=64)
+def resolve_font_file(font):
+    """
+    Return the font file for a font path or fontconfig name (e.g. "Arial"),
+    or None if it cannot be found. Names are resolved with fc-match, the
+    same lookup drawtext's font= option uses.
+    """
+    if os.path.isfile(font):
+        return font
+    fc_match = shutil.which("fc-match")
+    if not fc_match:
+        return None
+    try:
+        result = subprocess.run(
+            [fc_match, "--format=%{file}", font], capture_output=True, text=True, timeout=10
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    path = result.stdout.strip()
+    return path if result.returncode == 0 and os.path.isfile(path) else None
+
+
+def _fit_font_size(text, params):
+    """
+    Shrink font_size the way _build_text_clip does when the rendered text is
+    wider than the watermark target width. Needs Pillow, and a font file or
+    a font name fc-match can resolve; otherwise font_size is used as is.
+    """
+    font_size = int(params["font_size"])
+    if int(params.get("video_w", 0) or 0) <= 0:
+        return font_size
+    font_file = resolve_font_file(params["font"])
+    if not font_file:
+        logger.debug(f"Font {params['font']!r} not found; not fitting the watermark text.")
+        return font_size
+    try:
+        from PIL import ImageFont
+
+        width = ImageFont.truetype(font_file, font_size).getlength(text)
+    except Exception:
+        return font_size
+    return _fitted_font_size(width, font_size, params)
+
+
+def build_drawtext_filter(text, params, color, position, timestamp=False):
+    """
+    Build one drawtext filter for a watermark layer.
+
+    Static layers use expansion=none so the text is drawn literally; the
+    running timestamp uses the %{pts} expansion to print HH:MM:SS.
+    """
+    pad = int(params.get("text_pad", 8))
+    x, y = _drawtext_xy(position, pad)
+    font = params["font"]
+
+    options = []
+    if os.path.isfile(font):
+        options.append(("fontfile", font))
+    else:
+        options.append(("font", font))
+
+    if timestamp:
+        options.append(("text", "%{pts:gmtime:0:%H\\:%M\\:%S}"))
+        options.append(("expansion", "normal"))
+        font_size = _fit_font_size("00:00:00", params)
+    else:
+        options.append(("text", text))
+        options.append(("expansion", "none"))
+        font_size = _fit_font_size(text, params)
+
+    options.extend(
+        [
+            ("fontsize", font_size),
+            ("fontcolor", color),
+            ("x", x),
+            ("y", y),
+        ]
+    )
+    return build_filter("drawtext", options)
+
+
+def build_watermark_filtergraph(params):
+    """Return the -vf filtergraph drawing username, date and timestamp in one pass."""
+    filters = []
+    username_text = params.get("username", "")
+    if username_text and not looks_like_filename(username_text):
+        filters.append(
+            build_drawtext_filter(
+                username_text, params, params["username_color"], params["username_position"]
+            )
+        )
+    filters.append(
+        build_drawtext_filter(
+            params["video_date"], params, params["date_color"], params["date_position"]
+        )
+    )
+    filters.append(
+        build_drawtext_filter(
+            None, params, params["timestamp_color"], params["timestamp_position"], timestamp=True
+        )
+    )
+    return ",".join(filters)
+
+
+def add_watermark_ffmpeg(params):
+    """
+    Adds the watermark with a single ffmpeg drawtext filtergraph.
+
+    Frames never pass through Python: ffmpeg decodes, draws the username,
+    date and running timestamp, and encodes in one pass. Audio is copied.
+
+    Args:
+        params (dict): Same parameters as add_watermark.
+
+    Returns:
+        dict: {'to_process': <watermarked path>}, or None if an error occurs.
+    """
+    input_video_path = params["input_video_path"]
+    ffmpeg = ffmpeg_binary()
+    if not ffmpeg:
+        logger.error("ffmpeg not found; cannot use the ffmpeg watermark backend.")
+        return None
+
+    try:
+        logger.info(f"Processing video with ffmpeg: {input_video_path}")
+        params["video_w"] = probe_video_size(input_video_path)[0]
+
+        filename, ext = os.path.splitext(os.path.basename(input_video_path))
+        watermarked_video_path = os.path.join(
+            params["download_path"], f"{filename}_watermarked{ext}"
+        )
+        codecs = get_codecs_by_extension(ext)
+        command = [
+            ffmpeg, "-y", "-i", input_video_path,
+            "-vf", build_watermark_filtergraph(params),
+            "-c:v", codecs["video_codec"],
+            "-c:a", "copy",
+            watermarked_video_path,
+        ]
+        logger.debug(f"ffmpeg command: {command}")
+        logger.info(f"Exporting watermarked video to: {watermarked_video_path}")
+        subprocess.run(command, check=True)
+
+        logger.info(f"Watermarked video saved to: {watermarked_video_path}")
+        return {"to_process": watermarked_video_path}
+
+    except Exception as e:
+        logger.error(f"Error in add_watermark_ffmpeg: {e}")
+        logger.debug(traceback.format_exc())
+        return None
+
+
 def add_watermark(params):
     """
     Adds watermark text overlays to a video file.
@@ -128,6 +535,12 @@ def add_watermark(params):
             - username_position (tuple): Position for username watermark.
             - date_position (tuple): Position for date watermark.
             - timestamp_position (tuple): Position for timestamp watermark.
+            - backend (str): "moviepy" (default) or "ffmpeg" for a single-pass
+              drawtext filtergraph.
+            - prebake_overlays (bool): MoviePy backend only; blend the static
+              username/date text as one pre-composited layer.
+            - render_cache (dict): app_config["render_cache"]; when enabled an
+              unchanged input/config reuses the earlier output.
 
     Returns:
         dict: A dictionary with the path to the watermarked video under 'to_process',
@@ -141,47 +554,63 @@ def add_watermark(params):
     if not input_video_path:
         raise ValueError("Missing required parameter: 'input_video_path'")
 
+    filename, ext = os.path.splitext(os.path.basename(input_video_path))
+    watermarked_video_path = os.path.join(
+        params["download_path"], f"{filename}_watermarked{ext}"
+    )
+    if params.get("backend", "moviepy") == "ffmpeg":
+        render = add_watermark_ffmpeg
+    else:
+        render = _add_watermark_moviepy
+
+    result = cached_render(
+        "add_watermark", input_video_path, params, watermarked_video_path,
+        lambda: render(params),
+    )
+    if result is True:
+        return {"to_process": watermarked_video_path}
+    return result
+
+
+def _add_watermark_moviepy(params):
+    """MoviePy backend for add_watermark; see add_watermark for params."""
+    input_video_path = params["input_video_path"]
     try:
         logger.info(f"Processing video: {input_video_path}")
         video = VideoFileClip(input_video_path)
         params["video_w"] = int(getattr(video, "w", 0) or 0)
 
-        # Create watermark text clips
+        # Static watermark texts (username, date)
+        static_texts = []
         username_text = params.get("username", "")
         if username_text and not looks_like_filename(username_text):
-            username_clip = _build_text_clip(
-                username_text, params, params["username_color"]
+            static_texts.append(
+                (username_text, params["username_color"], params["username_position"])
             )
-            username_clip = mp_with_position(username_clip, params["username_position"])
-            username_clip = mp_with_duration(username_clip, video.duration)
-        else:
-            username_clip = None
-
-        date_clip = _build_text_clip(
-            params["video_date"], params, params["date_color"]
+        static_texts.append(
+            (params["video_date"], params["date_color"], params["date_position"])
         )
-        date_clip = mp_with_position(date_clip, params["date_position"])
-        date_clip = mp_with_duration(date_clip, video.duration)
-
-        # Generate timestamp clips
-        timestamp_clips = []
-        for t in range(int(video.duration)):
-            timestamp = f"{t // 3600:02}:{(t % 3600) // 60:02}:{t % 60:02}"
-            timestamp_clip = _build_text_clip(
-                timestamp, params, params["timestamp_color"]
-            )
-            timestamp_clip = mp_with_position(
-                timestamp_clip, params["timestamp_position"]
+
+        layers = []
+        if params.get("prebake_overlays"):
+            # Blend all static text into the frames as one pre-composited ROI
+            overlay = StaticOverlay(
+                [(*_text_raster(text, params, color), position)
+                 for text, color, position in static_texts],
+                video.size,
             )
-            timestamp_clip = mp_with_start(timestamp_clip, t)
-            timestamp_clip = mp_with_duration(timestamp_clip, 1)
-            timestamp_clips.append(timestamp_clip)
-
-        layers = [video]
-        if username_clip is not None:
-            layers.append(username_clip)
-        layers.append(date_clip)
-        layers.extend(timestamp_clips)
+            logger.debug(f"Static overlay bbox: {overlay.bbox}")
+            layers.append(mp_image_transform(video, overlay.apply))
+        else:
+            layers.append(video)
+            for text, color, position in static_texts:
+                clip = _build_text_clip(text, params, color)
+                clip = mp_with_position(clip, position)
+                layers.append(mp_with_duration(clip, video.duration))
+
+        # A single timestamp layer rendered from a glyph atlas per frame
+        layers.append(_build_timestamp_clip(params, video.duration))
+        logger.debug(f"Text raster cache: {shared_text_raster_cache().stats()}")
 
         final = CompositeVideoClip(layers)
         final = mp_with_audio(final, video.audio)
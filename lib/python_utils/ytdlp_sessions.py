@@ -0,0 +1,217 @@
+###############################################################################
+#                                                                             #
+#                            ytdlp_sessions.py                                #
+#                                                                             #
+#   Description:                                                              #
+#   ------------------------------------------------------------------------  #
+#   Pool of long-lived yt_dlp.YoutubeDL instances shared by the metadata and  #
+#   download paths (downloader5, teton_utils, fb_utils). Building a           #
+#   YoutubeDL loads the cookie file, initialises extractors and opens HTTP    #
+#   sessions; reusing one per option set keeps cookies, extractor state and   #
+#   keep-alive connections across URLs in the same process.                   #
+#                                                                             #
+#   Functions Included:                                                       #
+#   ------------------------------------------------------------------------  #
+#   - ytdl_session(ydl_opts: dict) -> context manager yielding a YoutubeDL    #
+#     --> Check out a pooled instance for these options                       #
+#                                                                             #
+#   - default_pool() -> YoutubeDLSessionPool                                  #
+#     --> The per-process pool (closed at interpreter exit)                   #
+#                                                                             #
+#   Instances are keyed on their options minus per-call ones (outtmpl,        #
+#   progress_hooks), plus the cookie file's mtime so a refreshed cookie       #
+#   file gets a new instance.                                                 #
+#   A YoutubeDL is not thread-safe, so each checkout is exclusive; parallel   #
+#   callers get separate instances for the same key.                          #
+#                                                                             #
+###############################################################################
+
+
+import os
+import json
+import atexit
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Options applied per checkout rather than baked into a pooled instance
+PER_CALL_OPTIONS = ("outtmpl", "progress_hooks")
+
+MAX_IDLE_PER_KEY = 2
+
+
+def _cookie_stamp(cookiefile: Optional[str]):
+    try:
+        return os.stat(cookiefile).st_mtime_ns if cookiefile else None
+    except OSError:
+        return None
+
+
+def session_key(ydl_opts: dict) -> str:
+    """Pool key for a set of YoutubeDL options."""
+    base = {k: v for k, v in ydl_opts.items() if k not in PER_CALL_OPTIONS}
+    base["__cookie_mtime"] = _cookie_stamp(base.get("cookiefile"))
+    return json.dumps(base, sort_keys=True, default=str)
+
+
+def _set_output_template(ydl, outtmpl: Optional[str]) -> None:
+    """Point a pooled instance at this call's output template."""
+    if not outtmpl:
+        return
+    current = ydl.params.get("outtmpl")
+    if isinstance(current, dict):
+        ydl.params["outtmpl"] = {**current, "default": outtmpl}
+    else:
+        ydl.params["outtmpl"] = outtmpl
+
+
+class _ProgressRelay:
+    """
+    The single progress hook registered on a pooled instance; forwards to
+    the hooks of whichever call currently holds the instance.
+    """
+
+    def __init__(self):
+        self.hooks = []
+
+    def __call__(self, d: dict) -> None:
+        for hook in list(self.hooks):
+            hook(d)
+
+
+def _new_youtube_dl(ydl_opts: dict):
+    import yt_dlp
+
+    return yt_dlp.YoutubeDL(ydl_opts)
+
+
+class YoutubeDLSessionPool:
+    """Idle YoutubeDL instances keyed by their (non per-call) options."""
+
+    def __init__(self, factory: Callable = _new_youtube_dl, max_idle_per_key: int = MAX_IDLE_PER_KEY):
+        self.factory = factory
+        self.max_idle_per_key = max_idle_per_key
+        self._idle = {}
+        self._relays = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    def acquire(self, ydl_opts: dict):
+        """
+        Returns (key, instance) for ydl_opts, reusing an idle instance if any.
+        """
+        key = session_key(ydl_opts)
+        stale = []
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                self.reused += 1
+                ydl = idle.pop()
+            else:
+                ydl = None
+                cookiefile = ydl_opts.get("cookiefile")
+                if cookiefile:
+                    # Retire instances built from older contents of this
+                    # cookie file; other option sets sharing the current
+                    # contents stay pooled.
+                    stamp = _cookie_stamp(cookiefile)
+                    for other in list(self._idle):
+                        other_opts = json.loads(other)
+                        if (
+                            other_opts.get("cookiefile") == cookiefile
+                            and other_opts.get("__cookie_mtime") != stamp
+                        ):
+                            stale.extend(self._idle.pop(other))
+
+        for old in stale:
+            self._close(old)
+        if ydl is None:
+            base = {k: v for k, v in ydl_opts.items() if k not in PER_CALL_OPTIONS}
+            ydl = self.factory(base)
+            relay = _ProgressRelay()
+            ydl.add_progress_hook(relay)
+            with self._lock:
+                self._relays[id(ydl)] = relay
+                self.created += 1
+            logger.debug(f"Created YoutubeDL session for {key}")
+        _set_output_template(ydl, ydl_opts.get("outtmpl"))
+        with self._lock:
+            relay = self._relays.get(id(ydl))
+        if relay is not None:
+            relay.hooks = list(ydl_opts.get("progress_hooks") or [])
+        return key, ydl
+
+    def release(self, key: str, ydl) -> None:
+        """Returns an instance to the pool, closing it if the pool is full."""
+        with self._lock:
+            relay = self._relays.get(id(ydl))
+            if relay is not None:
+                # Don't keep the last caller's hooks (and their state) alive.
+                relay.hooks = []
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle_per_key:
+                idle.append(ydl)
+                return
+        self._close(ydl)
+
+    @contextmanager
+    def session(self, ydl_opts: dict):
+        """Context manager yielding an exclusive YoutubeDL for ydl_opts."""
+        key, ydl = self.acquire(ydl_opts)
+        try:
+            yield ydl
+        except Exception:
+            # Don't return an instance in an unknown state to the pool.
+            self._close(ydl)
+            raise
+        else:
+            self.release(key, ydl)
+
+    def _close(self, ydl) -> None:
+        with self._lock:
+            self._relays.pop(id(ydl), None)
+        try:
+            ydl.close()
+        except Exception as e:
+            logger.debug(f"Error closing YoutubeDL session: {e}")
+
+    def close(self) -> None:
+        """Closes every idle instance (saving cookies, closing connections)."""
+        with self._lock:
+            idle = [ydl for instances in self._idle.values() for ydl in instances]
+            self._idle.clear()
+        for ydl in idle:
+            self._close(ydl)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "created": self.created,
+                "reused": self.reused,
+                "idle": sum(len(v) for v in self._idle.values()),
+            }
+
+
+_default_pool = YoutubeDLSessionPool()
+atexit.register(_default_pool.close)
+
+
+def default_pool() -> YoutubeDLSessionPool:
+    """Returns the per-process session pool."""
+    return _default_pool
+
+
+def ytdl_session(ydl_opts: dict):
+    """
+    Checks out a pooled YoutubeDL configured with ydl_opts.
+
+    Use in place of ``yt_dlp.YoutubeDL(ydl_opts)``::
+
+        with ytdl_session(ydl_opts) as ydl:
+            ydl.download([url])
+    """
+    return _default_pool.session(ydl_opts)
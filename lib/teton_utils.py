@@ -1,24 +1,20 @@
 import os
-import json
 import logging
-import platform
 
+try:
+    import config_store
+except ImportError:  # lib/python_utils is not on sys.path
+    from python_utils import config_store
 
-def load_config():
-    """Load OS specific configuration from conf/config.json."""
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    config_path = os.path.join(base_dir, "../conf/config.json")
-    with open(config_path, "r") as fh:
-        config = json.load(fh)
-    return config.get(platform.system(), {})
+
+def load_config(required=False):
+    """Load OS specific configuration from conf/config.json ({} if this OS has no section)."""
+    return config_store.load_config(required)
 
 
 def load_app_config():
     """Load application configuration from conf/app_config.json."""
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    app_config_path = os.path.join(base_dir, "../conf/app_config.json")
-    with open(app_config_path, "r") as fh:
-        return json.load(fh)
+    return config_store.load_app_config()
 
 
 def initialize_logging(log_filename="router.log"):
@@ -0,0 +1,161 @@
+import io
+import os
+import subprocess
+import sys
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.append(os.path.join(root_dir, 'bin'))
+
+import batch_call_router
+
+
+class FakeRouter:
+    """Stands in for subprocess.run, tracking concurrency per phase."""
+
+    def __init__(self, fail_urls=(), delays=None):
+        self.fail_urls = set(fail_urls)
+        self.delays = delays or {}
+        self.lock = threading.Lock()
+        self.active = {'download': 0, 'encode': 0}
+        self.peak = {'download': 0, 'encode': 0}
+        self.calls = []
+
+    def __call__(self, cmd, **kwargs):
+        url = cmd[2]
+        phase = 'download' if '--download-only' in cmd else 'encode'
+        for arg in cmd:
+            if arg.startswith('--only-task='):
+                phase = arg.split('=', 1)[1]
+        with self.lock:
+            self.active.setdefault(phase, 0)
+            self.peak.setdefault(phase, 0)
+            self.calls.append((url, phase))
+            self.active[phase] += 1
+            self.peak[phase] = max(self.peak[phase], self.active[phase])
+        time.sleep(self.delays.get(url, 0.01))
+        with self.lock:
+            self.active[phase] -= 1
+        returncode = 3 if url in self.fail_urls and phase == 'download' else 0
+        return subprocess.CompletedProcess(cmd, returncode, stdout=f'{phase} {url}\n')
+
+
+class TestParallelBatch(unittest.TestCase):
+    def run_batch(self, router, urls, **kwargs):
+        out = io.StringIO()
+        with mock.patch.object(batch_call_router.subprocess, 'run', router), redirect_stdout(out):
+            code = batch_call_router.run_batch(urls, dry_run=True, **kwargs)
+        return code, out.getvalue()
+
+    def test_phase_limits_and_ordered_report(self):
+        urls = [f'https://example.com/{n}' for n in range(6)]
+        # Earlier URLs finish last, so completion order differs from input order.
+        router = FakeRouter(delays={url: 0.05 - n * 0.008 for n, url in enumerate(urls)})
+        code, out = self.run_batch(
+            router, urls, stop_on_error=False, jobs=4, download_jobs=3, encode_jobs=1
+        )
+        self.assertEqual(code, 0)
+        self.assertLessEqual(router.peak['download'], 3)
+        self.assertEqual(router.peak['encode'], 1)
+        positions = [out.index(f'[{n + 1}/6] {url}') for n, url in enumerate(urls)]
+        self.assertEqual(positions, sorted(positions))
+        for url in urls:
+            self.assertLess(router.calls.index((url, 'download')), router.calls.index((url, 'encode')))
+
+    def test_stop_on_error_skips_remaining_work(self):
+        urls = [f'https://example.com/{n}' for n in range(8)]
+        router = FakeRouter(fail_urls={urls[0]})
+        code, out = self.run_batch(
+            router, urls, stop_on_error=True, jobs=2, download_jobs=1, encode_jobs=1
+        )
+        self.assertEqual(code, 3)
+        self.assertNotIn((urls[0], 'encode'), router.calls)
+        self.assertIn('Skipped after earlier failure', out)
+        self.assertLess(len(router.calls), 2 * len(urls))
+
+
+class TestPipelineBatch(unittest.TestCase):
+    def run_pipeline(self, router, urls, pending, **kwargs):
+        out = io.StringIO()
+        with mock.patch.object(batch_call_router.subprocess, 'run', router), \
+                mock.patch.object(batch_call_router, 'pipeline_stages', return_value=['apply_watermark', 'make_clips']), \
+                mock.patch.object(batch_call_router, 'pending_tasks', side_effect=lambda url, _: pending[url]), \
+                redirect_stdout(out):
+            code = batch_call_router.run_batch_pipeline(urls, dry_run=True, **kwargs)
+        return code, out.getvalue()
+
+    def test_downloads_overlap_processing_in_order(self):
+        urls = [f'https://example.com/{n}' for n in range(5)]
+        pending = {url: {'apply_watermark'} for url in urls}
+        pending[urls[2]] = {'apply_watermark', 'make_clips'}
+        router = FakeRouter(delays={url: 0.03 for url in urls})
+        code, out = self.run_pipeline(router, urls, pending, stop_on_error=False, queue_size=1)
+
+        self.assertEqual(code, 0)
+        self.assertEqual(router.peak['download'], 1)
+        self.assertEqual(router.peak['apply_watermark'], 1)
+        # Only URL 2 has make_clips enabled.
+        self.assertEqual([url for url, phase in router.calls if phase == 'make_clips'], [urls[2]])
+        # Download of the next URL starts before watermarking of the previous one ends.
+        self.assertLess(router.calls.index((urls[1], 'download')), router.calls.index((urls[1], 'apply_watermark')))
+        self.assertLess(router.calls.index((urls[1], 'download')), router.calls.index((urls[0], 'apply_watermark')) + 2)
+        positions = [out.index(f'[{n + 1}/5] {url}') for n, url in enumerate(urls)]
+        self.assertEqual(positions, sorted(positions))
+
+    def test_stop_on_error(self):
+        urls = [f'https://example.com/{n}' for n in range(4)]
+        pending = {url: {'apply_watermark'} for url in urls}
+        router = FakeRouter(fail_urls={urls[1]})
+        code, out = self.run_pipeline(router, urls, pending, stop_on_error=True)
+        self.assertEqual(code, 3)
+        self.assertNotIn((urls[3], 'download'), router.calls)
+        self.assertIn('Skipped after earlier failure', out)
+
+    def test_stage_errors_fail_the_url_without_hanging(self):
+        import sqlite3
+
+        urls = [f'https://example.com/{n}' for n in range(3)]
+        pending = {url: {'apply_watermark'} for url in urls}
+        fake = FakeRouter()
+
+        def router(cmd, **kwargs):
+            if cmd[2] == urls[2] and '--only-task=apply_watermark' in cmd:
+                raise OSError('fork failed')
+            return fake(cmd, **kwargs)
+
+        def pending_tasks(url, _):
+            if url == urls[0]:
+                raise sqlite3.OperationalError('database is locked')
+            return pending[url]
+
+        result = {}
+
+        def run():
+            out = io.StringIO()
+            with mock.patch.object(batch_call_router.subprocess, 'run', router), \
+                    mock.patch.object(batch_call_router, 'pipeline_stages', return_value=['apply_watermark', 'make_clips']), \
+                    mock.patch.object(batch_call_router, 'pending_tasks', side_effect=pending_tasks), \
+                    redirect_stdout(out):
+                result['code'] = batch_call_router.run_batch_pipeline(urls, dry_run=True, stop_on_error=False)
+            result['out'] = out.getvalue()
+
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(timeout=10)
+
+        self.assertFalse(thread.is_alive(), 'pipeline hung after a stage error')
+        self.assertEqual(result['code'], 1)
+        self.assertIn('database is locked', result['out'])
+        self.assertIn('fork failed', result['out'])
+        self.assertIn(f'Failed for URL: {urls[0]}', result['out'])
+        self.assertIn(f'Completed for URL: {urls[1]}', result['out'])
+        self.assertIn(f'Failed for URL: {urls[2]}', result['out'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,226 @@
+import os
+import sys
+import types
+import unittest
+from unittest import mock
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.append(os.path.join(root_dir, 'bin'))
+
+import call_router
+
+
+class TestInProcessDispatch(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        fake = types.ModuleType('fake_runners')
+        fake.run_watermark = lambda task_input, context: self.calls.append((task_input, context)) or 'out.mp4'
+        sys.modules['fake_runners'] = fake
+        self.dispatch = {
+            'apply_watermark': {'script': 'bin/call_watermark.py', 'callable': 'fake_runners:run_watermark'},
+            'extract_audio': {'script': 'bin/call_extract_audio.py'},
+        }
+
+    def tearDown(self):
+        sys.modules.pop('fake_runners', None)
+
+    def test_in_process_uses_callable(self):
+        with mock.patch.dict(call_router.TASK_DISPATCH, self.dispatch, clear=True), \
+                mock.patch.object(call_router.subprocess, 'run', return_value=mock.Mock(returncode=0, stdout='')) as run:
+            timings, failures = call_router.execute_tasks(
+                {'apply_watermark': True, 'extract_audio': False},
+                'https://example.com/v', '/tmp/video.mp4',
+                in_process=True, context={'app_config': {}},
+            )
+        run.assert_not_called()
+        self.assertEqual(self.calls, [('/tmp/video.mp4', {'app_config': {}})])
+        self.assertEqual([(task, mode) for task, mode, _ in timings], [('apply_watermark', 'in-process')])
+        self.assertEqual(failures, [])
+
+    def test_tasks_without_callable_fall_back_to_subprocess(self):
+        with mock.patch.dict(call_router.TASK_DISPATCH, self.dispatch, clear=True), \
+                mock.patch.object(call_router.subprocess, 'run', return_value=mock.Mock(returncode=0, stdout='')) as run:
+            timings, failures = call_router.execute_tasks(
+                {'apply_watermark': '/done.mp4', 'extract_audio': True},
+                'https://example.com/v', '/tmp/video.mp4', in_process=True,
+            )
+        self.assertEqual(run.call_count, 1)
+        self.assertTrue(run.call_args[0][0][1].endswith('call_extract_audio.py'))
+        self.assertEqual([mode for _, mode, _ in timings], ['subprocess'])
+        self.assertEqual(self.calls, [])
+
+    def test_tasks_run_in_dispatch_order(self):
+        with mock.patch.dict(call_router.TASK_DISPATCH, self.dispatch, clear=True), \
+                mock.patch.object(call_router.subprocess, 'run', return_value=mock.Mock(returncode=0, stdout='')):
+            timings, failures = call_router.execute_tasks(
+                {'unknown_task': True, 'extract_audio': True, 'apply_watermark': True},
+                'https://example.com/v', '/tmp/video.mp4', in_process=True,
+            )
+        self.assertEqual([task for task, _, _ in timings], ['apply_watermark', 'extract_audio'])
+
+    def test_failed_tasks_are_reported(self):
+        sys.modules['fake_runners'].run_watermark = mock.Mock(side_effect=RuntimeError('boom'))
+        with mock.patch.dict(call_router.TASK_DISPATCH, self.dispatch, clear=True), \
+                mock.patch.object(call_router.subprocess, 'run', return_value=mock.Mock(returncode=1, stdout='')):
+            _, failures = call_router.execute_tasks(
+                {'apply_watermark': True, 'extract_audio': True},
+                'https://example.com/v', '/tmp/video.mp4', in_process=True,
+            )
+        self.assertEqual(failures, ['apply_watermark', 'extract_audio'])
+
+    def test_runner_without_output_is_a_failure(self):
+        sys.modules['fake_runners'].run_watermark = lambda task_input, context: None
+        with mock.patch.dict(call_router.TASK_DISPATCH, self.dispatch, clear=True):
+            _, failures = call_router.execute_tasks(
+                {'apply_watermark': True}, 'https://example.com/v', '/tmp/video.mp4', in_process=True,
+            )
+        self.assertEqual(failures, ['apply_watermark'])
+
+    def test_in_process_outputs_are_recorded_in_metadata(self):
+        import json
+        import tempfile
+        import tasks_lib
+
+        with tempfile.TemporaryDirectory() as tmp:
+            metadata_path = os.path.join(tmp, 'video.json')
+            with open(metadata_path, 'w', encoding='utf-8') as f:
+                json.dump({'default_tasks': {'apply_watermark': True, 'extract_audio': False}}, f)
+            with mock.patch.dict(call_router.TASK_DISPATCH, self.dispatch, clear=True):
+                call_router.execute_tasks(
+                    {'apply_watermark': True, 'extract_audio': False},
+                    'https://example.com/v', '/tmp/video.mp4',
+                    in_process=True, metadata_path=metadata_path,
+                )
+            tasks = tasks_lib.load_metadata_json(metadata_path)['default_tasks']
+        self.assertEqual(tasks, {'apply_watermark': 'out.mp4', 'extract_audio': False})
+
+    def test_script_outputs_are_recorded_like_runner_outputs(self):
+        import json
+        import tempfile
+        import tasks_lib
+
+        with tempfile.TemporaryDirectory() as tmp:
+            metadata_path = os.path.join(tmp, 'video.json')
+            audio_path = os.path.join(tmp, 'video.wav')
+            open(audio_path, 'wb').close()
+            with open(metadata_path, 'w', encoding='utf-8') as f:
+                json.dump({'default_tasks': {'apply_watermark': True, 'extract_audio': True}}, f)
+            script = mock.Mock(returncode=0, stdout=f'Extracting audio...\n{audio_path}\n')
+            with mock.patch.dict(call_router.TASK_DISPATCH, self.dispatch, clear=True), \
+                    mock.patch.object(call_router.subprocess, 'run', return_value=script), \
+                    mock.patch.object(call_router.sys, 'stdout'):
+                call_router.execute_tasks(
+                    {'apply_watermark': True, 'extract_audio': True},
+                    'https://example.com/v', '/tmp/video.mp4',
+                    in_process=True, metadata_path=metadata_path,
+                )
+            tasks = tasks_lib.load_metadata_json(metadata_path)['default_tasks']
+        self.assertEqual(tasks, {'apply_watermark': 'out.mp4', 'extract_audio': audio_path})
+
+    def test_dispatched_runners_match_their_scripts(self):
+        # Only tasks whose script shares the runner's code may run in-process.
+        with_runner = {task for task, spec in call_router.TASK_DISPATCH.items() if spec.get('callable')}
+        self.assertEqual(with_runner, {'perform_download', 'apply_watermark'})
+        with open(os.path.join(root_dir, 'bin', 'call_watermark.py'), encoding='utf-8') as f:
+            self.assertIn('run_apply_watermark(', f.read())
+
+
+class TestRouterDownload(unittest.TestCase):
+    def run_main(self, found, argv=(), failures=(), downloaded=True):
+        """Runs call_router.main() with find_url_json returning `found` in turn."""
+        logger = mock.Mock()
+        with mock.patch.object(sys, 'argv', ['call_router.py', 'https://example.com/v', *argv]), \
+                mock.patch.object(call_router, 'load_config', return_value={}), \
+                mock.patch.object(call_router, 'load_app_config', return_value={'metadata_dir': '/tmp/md'}), \
+                mock.patch.object(call_router, 'initialize_logging', return_value=logger), \
+                mock.patch.object(call_router.os, 'makedirs'), \
+                mock.patch.object(call_router, 'find_url_json', side_effect=found), \
+                mock.patch.object(call_router, 'wait_for_running_download', return_value=None), \
+                mock.patch.object(call_router, 'wait_for_download_file', return_value=True), \
+                mock.patch.object(call_router, 'execute_tasks', return_value=([], list(failures))) as execute, \
+                mock.patch.object(call_router, 'run_my_existing_downloader', return_value=downloaded) as download:
+            code = call_router.main()
+        return code, download, execute
+
+    def test_pending_download_after_failure_is_retried(self):
+        pending = ('/tmp/md/v.json', {'default_tasks': {'perform_download': True, 'apply_watermark': True}})
+        done = ('/tmp/md/v.json', {'default_tasks': {'perform_download': '/out/v.mp4', 'apply_watermark': True}})
+
+        code, download, execute = self.run_main([pending, done])
+
+        self.assertEqual(code, 0)
+        download.assert_called_once()
+        self.assertEqual(execute.call_args[0][2], '/out/v.mp4')
+
+    def test_failed_download_exits_nonzero(self):
+        pending = ('/tmp/md/v.json', {'default_tasks': {'perform_download': True}})
+
+        code, download, execute = self.run_main([pending], downloaded=False)
+
+        self.assertEqual(code, 1)
+        download.assert_called_once()
+        execute.assert_not_called()
+
+    def test_failed_task_exits_nonzero(self):
+        done = ('/tmp/md/v.json', {'default_tasks': {'perform_download': '/out/v.mp4', 'apply_watermark': True}})
+
+        code, _, _ = self.run_main([done], failures=['apply_watermark'])
+
+        self.assertEqual(code, 1)
+
+    def test_completed_download_is_not_repeated(self):
+        done = ('/tmp/md/v.json', {'default_tasks': {'perform_download': '/out/v.mp4'}})
+
+        code, download, _ = self.run_main([done], argv=['--download-only'])
+
+        self.assertEqual(code, 0)
+        download.assert_not_called()
+
+
+class TestPrefetchThenRoute(unittest.TestCase):
+    def test_prefetched_url_is_downloaded_by_the_router(self):
+        import tempfile
+        import tasks_lib
+        import metadata_prefetch
+        from metadata_index import open_metadata_index
+
+        url = 'https://example.com/v/prefetched'
+        config_path = os.path.join(root_dir, 'conf', 'default_tasks.json')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            metadata_dir = os.path.join(tmp, 'metadata')
+            metadata_path = os.path.join(metadata_dir, 'uploader_2024-01-01.json')
+            video_path = os.path.join(tmp, 'uploader_2024-01-01.mp4')
+
+            def fake_mask(params):
+                params['metadata_path'] = metadata_path
+                return {'url': url, 'uploader': 'uploader', 'video_date': '2024-01-01', 'duration': 12}
+
+            def fake_download(url, logger, in_process=False, context=None):
+                with open(video_path, 'wb') as f:
+                    f.write(b'video')
+                tasks_lib.record_task_states(metadata_path, {'perform_download': video_path})
+                return True
+
+            with mock.patch('downloader5.mask_metadata', side_effect=fake_mask):
+                metadata_prefetch.prefetch_url(url, metadata_dir=metadata_dir, config_path=config_path)
+            self.assertIs(tasks_lib.find_url_json(url, metadata_dir)[1]['default_tasks']['perform_download'], True)
+
+            with mock.patch.object(sys, 'argv', ['call_router.py', url, '--download-only']), \
+                    mock.patch.object(call_router, 'load_config', return_value={}), \
+                    mock.patch.object(call_router, 'load_app_config', return_value={'metadata_dir': metadata_dir}), \
+                    mock.patch.object(call_router, 'initialize_logging', return_value=mock.Mock()), \
+                    mock.patch.object(call_router, 'run_my_existing_downloader', side_effect=fake_download) as download:
+                code = call_router.main()
+
+            recorded = tasks_lib.load_metadata_json(metadata_path)['default_tasks']['perform_download']
+            open_metadata_index(metadata_dir).close()
+
+        self.assertEqual(code, 0)
+        download.assert_called_once()
+        self.assertEqual(recorded, video_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
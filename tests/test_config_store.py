@@ -0,0 +1,89 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import sys
+from unittest import mock
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.append(os.path.join(root_dir, 'lib', 'python_utils'))
+
+import config_store
+from config_store import ConfigStore
+
+
+class TestConfigStore(unittest.TestCase):
+    def setUp(self):
+        self.conf_dir = tempfile.mkdtemp()
+        self.store = ConfigStore(self.conf_dir)
+        self.write('app_config.json', {'metadata_dir': './metadata', 'render_cache': {'enabled': False}})
+
+    def tearDown(self):
+        shutil.rmtree(self.conf_dir)
+
+    def write(self, name, data, bump=0):
+        path = os.path.join(self.conf_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        if bump:
+            # Make sure the change is visible even on coarse mtime clocks.
+            st = os.stat(path)
+            os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + bump))
+        return path
+
+    def test_parsed_once_and_copied(self):
+        first = self.store.app_config()
+        first['render_cache']['enabled'] = True
+        second = self.store.app_config()
+
+        self.assertFalse(second['render_cache']['enabled'])
+        self.assertEqual(self.store.stats(), {'loads': 1, 'hits': 1, 'files': 1})
+
+    def test_reloads_on_change(self):
+        self.assertEqual(self.store.app_config()['metadata_dir'], './metadata')
+        self.write('app_config.json', {'metadata_dir': '/srv/metadata'}, bump=10**9)
+
+        self.assertEqual(self.store.app_config()['metadata_dir'], '/srv/metadata')
+        self.assertEqual(self.store.stats()['loads'], 2)
+
+    def test_validation(self):
+        self.write('app_config.json', {'metadata_dir': ['not', 'a', 'path']}, bump=10**9)
+        with self.assertRaisesRegex(ValueError, 'metadata_dir'):
+            self.store.app_config()
+
+        self.write('default_tasks.json', {'default_tasks': {'apply_watermark': 1}})
+        with self.assertRaisesRegex(ValueError, 'apply_watermark'):
+            self.store.default_task_flags()
+
+        with open(os.path.join(self.conf_dir, 'config.json'), 'w', encoding='utf-8') as f:
+            f.write('{not json')
+        with self.assertRaisesRegex(ValueError, 'Failed to parse'):
+            self.store.platform_config()
+
+        with self.assertRaises(FileNotFoundError):
+            self.store.load('untar_config.json')
+
+    def test_platform_section(self):
+        self.write('config.json', {'_comment': 'paths', 'Plan9': {'output_dir': './outputs/'}})
+        with mock_platform('Plan9'):
+            self.assertEqual(self.store.platform_config(), {'output_dir': './outputs/'})
+        with mock_platform('Haiku'):
+            self.assertEqual(self.store.platform_config(required=False), {})
+            with self.assertRaisesRegex(ValueError, 'Unsupported platform'):
+                self.store.platform_config()
+
+    def test_repo_conf_files_are_valid(self):
+        store = ConfigStore()
+        store.app_config()
+        store.default_task_flags()
+        store.load('config.json')
+
+
+def mock_platform(name):
+    return mock.patch.object(config_store.platform, 'system', return_value=name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.append(os.path.join(root_dir, 'lib', 'python_utils'))
+
+import download_progress
+
+
+class TestDownloadProgress(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.output = os.path.join(self.tmp.name, 'someone_20240501.mp4')
+        self.metadata_path = os.path.join(self.tmp.name, 'abc123.json')
+        with open(self.metadata_path, 'w', encoding='utf-8') as f:
+            json.dump({'url': 'https://example.com/v/abc123', 'default_tasks': {}}, f)
+
+    def read_metadata(self):
+        with open(self.metadata_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_hook_records_progress_for_resume(self):
+        progress = download_progress.DownloadProgress(self.output, self.metadata_path, interval=0)
+        progress.start()
+        progress({'status': 'downloading', 'downloaded_bytes': 4096,
+                  'total_bytes': 10000, 'fragment_index': 3, 'fragment_count': 9})
+
+        status = download_progress.read_status(self.output)
+        self.assertEqual(status['fragment_index'], 3)
+        self.assertEqual(status['downloaded_bytes'], 4096)
+        # The metadata JSON is only written at start and end.
+        recorded = self.read_metadata()['download_progress']
+        self.assertEqual(recorded['downloaded_bytes'], 0)
+        self.assertEqual(recorded['status'], 'downloading')
+        self.assertEqual(download_progress.latest_progress(recorded)['downloaded_bytes'], 4096)
+        # Our own process is not "another" downloader.
+        self.assertFalse(download_progress.download_in_progress(recorded))
+
+        progress.finish('error')
+        recorded = self.read_metadata()['download_progress']
+        self.assertEqual(recorded['downloaded_bytes'], 4096)
+        self.assertEqual(download_progress.resume_path(recorded), self.output)
+
+        progress.finish('finished')
+        self.assertIsNone(download_progress.read_status(self.output))
+        self.assertIsNone(download_progress.resume_path(self.read_metadata()['download_progress']))
+
+    def test_progress_updates_do_not_rewrite_the_metadata(self):
+        progress = download_progress.DownloadProgress(self.output, self.metadata_path, interval=0)
+        with mock.patch('tasks_lib.save_metadata_json') as save:
+            progress.start()
+            for done in range(1, 50):
+                progress({'status': 'downloading', 'downloaded_bytes': done * 1024, 'total_bytes': 50 * 1024})
+            progress({'status': 'finished', 'total_bytes': 50 * 1024})
+            self.assertEqual(save.call_count, 1)
+            progress.finish('finished')
+        self.assertEqual(save.call_count, 2)
+        self.assertEqual(save.call_args[0][1]['download_progress']['downloaded_bytes'], 50 * 1024)
+
+    def test_running_download_is_judged_by_its_status_file(self):
+        record = {'path': self.output, 'status': 'downloading', 'pid': os.getppid(),
+                  'host': download_progress.socket.gethostname(),
+                  'updated': time.time() - download_progress.STALE_SECONDS - 1}
+        self.assertFalse(download_progress.download_in_progress(record))
+        with open(download_progress.status_path(self.output), 'w', encoding='utf-8') as f:
+            json.dump(dict(record, updated=time.time()), f)
+        self.assertTrue(download_progress.download_in_progress(record))
+
+    def test_dead_or_stale_owner_is_not_in_progress(self):
+        record = {'status': 'downloading', 'pid': 2 ** 22 + 1,
+                  'host': download_progress.socket.gethostname(), 'updated': time.time()}
+        self.assertFalse(download_progress.download_in_progress(record))
+        record.update(pid=os.getppid(), updated=time.time() - download_progress.STALE_SECONDS - 1)
+        self.assertFalse(download_progress.download_in_progress(record))
+        record['updated'] = time.time()
+        self.assertTrue(download_progress.download_in_progress(record))
+
+    def test_wait_returns_when_the_file_appears(self):
+        with open(download_progress.status_path(self.output), 'w', encoding='utf-8') as f:
+            json.dump({'status': 'downloading', 'pid': os.getppid(),
+                       'host': download_progress.socket.gethostname(),
+                       'updated': time.time()}, f)
+
+        def finish():
+            time.sleep(0.2)
+            with open(self.output, 'wb') as f:
+                f.write(b'video')
+
+        writer = threading.Thread(target=finish)
+        writer.start()
+        start = time.time()
+        self.assertTrue(download_progress.wait_for_download(self.output, timeout=10))
+        writer.join()
+        self.assertLess(time.time() - start, 5)
+
+    def test_wait_gives_up_on_a_failed_download(self):
+        with open(download_progress.status_path(self.output), 'w', encoding='utf-8') as f:
+            json.dump({'status': 'error', 'pid': os.getppid()}, f)
+        start = time.time()
+        self.assertFalse(download_progress.wait_for_download(self.output, timeout=10))
+        self.assertLess(time.time() - start, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
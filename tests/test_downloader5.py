@@ -0,0 +1,265 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.append(os.path.join(root_dir, 'lib', 'python_utils'))
+
+import ytdlp_sessions
+
+try:
+    import downloader5
+except Exception:
+    downloader5 = None
+
+
+class FakeYoutubeDL:
+    """Stands in for yt_dlp.YoutubeDL, recording extract/download calls."""
+
+    calls = []
+    interrupt = False
+
+    def __init__(self, opts):
+        self.opts = opts
+        self.params = dict(opts)
+        self._progress_hooks = list(opts.get('progress_hooks', []))
+
+    def add_progress_hook(self, hook):
+        self._progress_hooks.append(hook)
+
+    def close(self):
+        pass
+
+    def extract_info(self, url, download=False):
+        self.calls.append(('extract_info', url))
+        return {'id': 'abc123', 'title': 'A title', 'uploader': 'someone', 'upload_date': '20240501'}
+
+    def process_ie_result(self, info, download=True):
+        self.calls.append(('process_ie_result', info['id']))
+        for hook in self._progress_hooks:
+            hook({'status': 'downloading', 'downloaded_bytes': 2048, 'fragment_index': 2})
+        if self.interrupt:
+            raise KeyboardInterrupt
+        return info
+
+    def download(self, urls):
+        self.calls.append(('download', urls[0]))
+
+
+class TestSharedExtraction(unittest.TestCase):
+    def setUp(self):
+        if downloader5 is None:
+            self.skipTest('yt_dlp or dependencies not available')
+        FakeYoutubeDL.calls = []
+
+    def test_download_reuses_the_metadata_extraction(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            # extract_metadata writes under the relative metadata_dir
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            self.addCleanup(os.chdir, cwd)
+            params = {
+                'url': 'https://example.com/v/abc123',
+                'metadata_path': os.path.join(tmp, 'abc123.json'),
+                'download_path': tmp,
+            }
+            pool = ytdlp_sessions.YoutubeDLSessionPool(factory=FakeYoutubeDL)
+            with mock.patch.object(downloader5, 'ytdl_session', pool.session), \
+                    mock.patch.object(downloader5, 'append_index_record'):
+                params.update(downloader5.mask_metadata(params))
+                params.update(downloader5.create_original_filename(params))
+                result = downloader5.download_video(params)
+
+        self.assertEqual(
+            FakeYoutubeDL.calls,
+            [('extract_info', 'https://example.com/v/abc123'), ('process_ie_result', 'abc123')],
+        )
+        self.assertNotIn('info_dict', params)
+        self.assertIn('extraction_saved_seconds', result)
+        self.assertEqual(result['download_stats']['mode'], 'default')
+        self.assertIn('bytes_per_sec', result['download_stats'])
+
+    def test_download_after_prefetch_reuses_the_saved_extraction(self):
+        import metadata_prefetch
+
+        with tempfile.TemporaryDirectory() as tmp:
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            self.addCleanup(os.chdir, cwd)
+            url = 'https://example.com/v/abc123'
+            config_path = os.path.join(root_dir, 'conf', 'default_tasks.json')
+            pool = ytdlp_sessions.YoutubeDLSessionPool(factory=FakeYoutubeDL)
+            with mock.patch.object(downloader5, 'ytdl_session', pool.session), \
+                    mock.patch.object(downloader5, 'load_app_config', return_value={'metadata_dir': 'metadata'}):
+                prefetched = metadata_prefetch.prefetch_url(url, metadata_dir='metadata', config_path=config_path)
+                prefetched['uploader'] = 'changed by the caller'
+                params = {'url': url, 'download_path': tmp}
+                params.update(downloader5.mask_metadata(params))
+                params.update(downloader5.create_original_filename(params))
+                downloader5.download_video(params)
+
+        self.assertEqual(
+            FakeYoutubeDL.calls,
+            [('extract_info', url), ('process_ie_result', 'abc123')],
+        )
+        self.assertEqual(params['uploader'], 'someone')
+
+    def test_metadata_is_saved_atomically(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            self.addCleanup(os.chdir, cwd)
+            metadata_path = os.path.join(tmp, 'abc123.json')
+            params = {'url': 'https://example.com/v/abc123', 'metadata_path': metadata_path}
+            pool = ytdlp_sessions.YoutubeDLSessionPool(factory=FakeYoutubeDL)
+            with mock.patch.object(downloader5, 'ytdl_session', pool.session), \
+                    mock.patch.object(downloader5, 'append_index_record'), \
+                    mock.patch.object(downloader5, 'save_metadata_json',
+                                      wraps=downloader5.save_metadata_json) as save:
+                downloader5.extract_metadata(params)
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+
+        save.assert_called_once()
+        self.assertEqual(save.call_args[0][0], metadata_path)
+        self.assertEqual(saved['id'], 'abc123')
+
+    def test_interrupted_download_resumes_into_the_same_file(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cwd = os.getcwd()
+            os.chdir(tmp)
+            self.addCleanup(os.chdir, cwd)
+            metadata_path = os.path.join(tmp, 'abc123.json')
+            pool = ytdlp_sessions.YoutubeDLSessionPool(factory=FakeYoutubeDL)
+
+            def run_chain(day, interrupt):
+                FakeYoutubeDL.interrupt = interrupt
+                # The download directory is dated, so a rerun the next day
+                # would otherwise start a fresh file elsewhere.
+                download_path = os.path.join(tmp, day)
+                os.makedirs(download_path, exist_ok=True)
+                params = {'url': 'https://example.com/v/abc123',
+                          'metadata_path': metadata_path, 'download_path': download_path}
+                params.update(downloader5.mask_metadata(params))
+                params.update(downloader5.create_original_filename(params))
+                try:
+                    downloader5.download_video(params)
+                except KeyboardInterrupt:
+                    pass
+                return params['original_filename']
+
+            with mock.patch.object(downloader5, 'ytdl_session', pool.session), \
+                    mock.patch.object(downloader5, 'append_index_record'):
+                first = run_chain('2024-05-01', interrupt=True)
+                with open(metadata_path, 'r', encoding='utf-8') as f:
+                    recorded = json.load(f)['download_progress']
+                second = run_chain('2024-05-02', interrupt=False)
+            FakeYoutubeDL.interrupt = False
+
+        self.assertEqual(recorded['status'], 'error')
+        self.assertEqual(recorded['downloaded_bytes'], 2048)
+        self.assertEqual(second, first)
+
+    def test_throughput_options(self):
+        config = {
+            'throughput': {
+                'enabled': True,
+                'concurrent_fragments': 8,
+                'http_chunk_size': 1048576,
+                'external_downloader': 'no-such-downloader',
+                'vendors': {'youtube': {'concurrent_fragments': 16}, 'instagram': {'enabled': False}},
+            }
+        }
+        self.assertEqual(
+            downloader5.throughput_options(config),
+            {'concurrent_fragment_downloads': 8, 'http_chunk_size': 1048576},
+        )
+        self.assertEqual(
+            downloader5.throughput_options(config, 'Youtube')['concurrent_fragment_downloads'], 16
+        )
+        self.assertEqual(downloader5.throughput_options(config, 'Instagram'), {})
+        self.assertEqual(downloader5.throughput_options({}), {})
+
+
+class TestSessionPool(unittest.TestCase):
+    def setUp(self):
+        self.created = []
+
+    def factory(self, opts):
+        ydl = FakeYoutubeDL(opts)
+        self.created.append(ydl)
+        return ydl
+
+    def test_instances_are_reused_per_option_set(self):
+        pool = ytdlp_sessions.YoutubeDLSessionPool(factory=self.factory)
+        opts = {'format': 'best', 'noplaylist': True}
+        with pool.session(dict(opts, outtmpl='/tmp/a.mp4')) as first:
+            self.assertEqual(first.params['outtmpl'], '/tmp/a.mp4')
+        with pool.session(dict(opts, outtmpl='/tmp/b.mp4')) as second:
+            self.assertIs(second, first)
+            self.assertEqual(second.params['outtmpl'], '/tmp/b.mp4')
+        with pool.session(dict(opts, format='worst')):
+            pass
+        self.assertEqual(len(self.created), 2)
+        self.assertEqual(pool.stats()['reused'], 1)
+
+    def test_concurrent_checkouts_get_separate_instances(self):
+        pool = ytdlp_sessions.YoutubeDLSessionPool(factory=self.factory)
+        with pool.session({}) as a, pool.session({}) as b:
+            self.assertIsNot(a, b)
+        self.assertEqual(pool.stats()['idle'], 2)
+
+    def test_failed_session_is_not_returned(self):
+        pool = ytdlp_sessions.YoutubeDLSessionPool(factory=self.factory)
+        with self.assertRaises(RuntimeError):
+            with pool.session({}):
+                raise RuntimeError('boom')
+        self.assertEqual(pool.stats()['idle'], 0)
+
+    def test_refreshed_cookie_file_gets_a_new_instance(self):
+        pool = ytdlp_sessions.YoutubeDLSessionPool(factory=self.factory)
+        with tempfile.NamedTemporaryFile('w', delete=False) as f:
+            f.write('# cookies')
+        self.addCleanup(os.remove, f.name)
+        with pool.session({'cookiefile': f.name}):
+            pass
+        os.utime(f.name, ns=(1, 1))
+        with pool.session({'cookiefile': f.name}):
+            pass
+        self.assertEqual(len(self.created), 2)
+        self.assertEqual(pool.stats()['idle'], 1)
+
+    def test_option_sets_sharing_a_cookie_file_are_reused(self):
+        pool = ytdlp_sessions.YoutubeDLSessionPool(factory=self.factory)
+        with tempfile.NamedTemporaryFile('w', delete=False) as f:
+            f.write('# cookies')
+        self.addCleanup(os.remove, f.name)
+        metadata_opts = {'cookiefile': f.name, 'skip_download': True}
+        download_opts = {'cookiefile': f.name, 'format': 'best'}
+        for n in range(5):
+            with pool.session(metadata_opts):
+                pass
+            with pool.session(dict(download_opts, outtmpl=f'/tmp/{n}.mp4')):
+                pass
+        self.assertEqual(pool.stats(), {'created': 2, 'reused': 8, 'idle': 2})
+
+    def test_progress_hooks_are_per_lease(self):
+        pool = ytdlp_sessions.YoutubeDLSessionPool(factory=self.factory)
+        first, second = [], []
+        with pool.session({'progress_hooks': [first.append]}) as ydl:
+            ydl.process_ie_result({'id': 'a'})
+        with pool.session({'progress_hooks': [second.append]}) as again:
+            self.assertIs(again, ydl)
+            again.process_ie_result({'id': 'b'})
+        with pool.session({}) as third:
+            third.process_ie_result({'id': 'c'})
+        self.assertEqual((len(first), len(second)), (1, 1))
+        self.assertEqual(len(ydl._progress_hooks), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,33 @@
+import os
+import sys
+import unittest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.append(os.path.join(root_dir, 'lib', 'python_utils'))
+
+import ffmpeg_filters
+import make_clips
+
+
+class TestFilterQuoting(unittest.TestCase):
+    def test_values_are_quoted_then_escaped(self):
+        self.assertEqual(ffmpeg_filters.quote_option("it's"), "'it'\\''s'")
+        self.assertEqual(
+            ffmpeg_filters.build_filter('drawtext', [('text', 'a:b, c'), ('x', 10)]),
+            "drawtext=text=\\'a:b\\, c\\':x=\\'10\\'",
+        )
+
+    def test_make_clips_uses_the_shared_builder(self):
+        self.assertEqual(
+            make_clips.drawtext_filter('[1;2]', {'text_x': 5}),
+            ffmpeg_filters.build_filter(
+                'drawtext',
+                [('text', '[1;2]'), ('expansion', 'none'), ('x', 5), ('y', 10),
+                 ('fontsize', 24), ('fontcolor', 'yellow')],
+            ),
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
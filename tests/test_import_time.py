@@ -0,0 +1,98 @@
+import os
+import re
+import subprocess
+import sys
+import unittest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+bin_dir = os.path.join(root_dir, 'bin')
+
+# Dependencies that take hundreds of milliseconds (or seconds) to import and
+# must only be loaded by the functions that use them.
+HEAVY_MODULES = (
+    'bs4',
+    'cv2',
+    'moviepy',
+    'numpy',
+    'PIL',
+    'requests',
+    'selenium',
+    'speech_recognition',
+    'yt_dlp',
+)
+
+# Import-time budget per bin/ script, on top of interpreter start-up
+IMPORT_BUDGET_MS = 250
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$')
+
+# Loads a script's module-level code without running its __main__ block.
+HARNESS = "import runpy, sys; sys.argv = sys.argv[1:]; runpy.run_path(sys.argv[0], run_name='__importtime__')"
+
+
+def bin_scripts() -> list:
+    return sorted(name for name in os.listdir(bin_dir) if name.endswith('.py'))
+
+
+def import_profile(script_path: str) -> tuple:
+    """
+    Loads a script under ``python -X importtime``.
+
+    Returns:
+        tuple: (returncode, total cumulative microseconds, set of imported
+        top-level package names, stderr).
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', HARNESS, script_path],
+        cwd=root_dir,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    total = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        modules.add(name.split('.')[0])
+        if not indent:
+            total += int(cumulative)
+    return result.returncode, total, modules, result.stderr
+
+
+class TestImportTime(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        _, cls.baseline_us, _, _ = import_profile(os.devnull)
+
+    def test_bin_scripts_import_quickly(self):
+        for name in bin_scripts():
+            with self.subTest(script=name):
+                returncode, total, modules, stderr = import_profile(os.path.join(bin_dir, name))
+                self.assertEqual(returncode, 0, stderr[-2000:])
+
+                heavy = sorted(modules.intersection(HEAVY_MODULES))
+                self.assertEqual(heavy, [], f'{name} imports {heavy} at module load')
+
+                elapsed_ms = (total - self.baseline_us) / 1000
+                self.assertLess(elapsed_ms, IMPORT_BUDGET_MS, f'{name} took {elapsed_ms:.0f} ms to import')
+
+
+def report() -> None:
+    """Prints each bin/ script's import time (``python tests/test_import_time.py --report``)."""
+    _, baseline, _, _ = import_profile(os.devnull)
+    for name in bin_scripts():
+        returncode, total, modules, _ = import_profile(os.path.join(bin_dir, name))
+        heavy = ', '.join(sorted(modules.intersection(HEAVY_MODULES))) or '-'
+        status = 'ok' if returncode == 0 else f'exit {returncode}'
+        print(f'{name:28} {(total - baseline) / 1000:8.1f} ms  {status:8} heavy: {heavy}')
+
+
+if __name__ == '__main__':
+    if '--report' in sys.argv:
+        report()
+    else:
+        unittest.main()
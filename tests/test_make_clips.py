@@ -0,0 +1,224 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.append(os.path.join(root_dir, 'lib', 'python_utils'))
+
+import make_clips
+
+
+class FakeFFmpeg:
+    """Stands in for subprocess.run, answering ffprobe and recording ffmpeg calls."""
+
+    def __init__(self, codec='h264', keyframes=(0.0, 2.0, 4.0, 6.0, 8.0), fail_outputs=()):
+        self.codec = codec
+        self.keyframes = keyframes
+        self.fail_outputs = set(fail_outputs)
+        self.commands = []
+
+    def __call__(self, cmd, **kwargs):
+        self.commands.append(cmd)
+        if cmd[0] == 'ffprobe':
+            if 'stream=codec_name,profile,level,pix_fmt' in cmd:
+                out = json.dumps({'streams': [{
+                    'codec_name': self.codec, 'profile': 'High', 'level': 40, 'pix_fmt': 'yuv420p',
+                }]})
+            else:
+                out = '\n'.join(f'{t:.6f},K__' for t in self.keyframes)
+            return subprocess.CompletedProcess(cmd, 0, stdout=out, stderr='')
+        if os.path.basename(cmd[-1]) in self.fail_outputs:
+            raise subprocess.CalledProcessError(1, cmd)
+        return subprocess.CompletedProcess(cmd, 0)
+
+    def ffmpeg_calls(self):
+        return [cmd for cmd in self.commands if cmd[0] == 'ffmpeg']
+
+
+class TestStreamCopyPlan(unittest.TestCase):
+    def test_plan(self):
+        keyframes = [0.0, 2.0, 4.0]
+        self.assertEqual(make_clips.plan_stream_copy(2.0, 7.0, keyframes), [('copy', 2.0, 7.0)])
+        self.assertEqual(
+            make_clips.plan_stream_copy(1.0, 7.0, keyframes),
+            [('encode', 1.0, 2.0), ('copy', 2.0, 7.0)],
+        )
+        self.assertEqual(make_clips.plan_stream_copy(4.5, 5.0, keyframes), [('encode', 4.5, 5.0)])
+
+    def test_to_seconds(self):
+        self.assertEqual(make_clips.to_seconds(27), 27.0)
+        self.assertEqual(make_clips.to_seconds('00:01:30.5'), 90.5)
+
+
+class TestProcessClipsFFmpeg(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.video = os.path.join(self.tmp.name, 'source.mp4')
+        open(self.video, 'wb').close()
+        self.params = {'input_video_path': self.video, 'download_path': self.tmp.name}
+
+    def run_clips(self, fake, clips):
+        with mock.patch.object(make_clips.subprocess, 'run', side_effect=fake):
+            return make_clips.process_clips_ffmpeg(self.params, clips)
+
+    def test_empty_text_uses_partial_gop_encode_and_copy(self):
+        fake = FakeFFmpeg()
+        result = self.run_clips(fake, [(1, 7, '')])
+
+        self.assertEqual(result['output_video_paths'], [os.path.join(self.tmp.name, 'clip_1.mp4')])
+        head, tail, concat = fake.ffmpeg_calls()
+        self.assertLess(head.index('-ss'), head.index('-i'))
+        self.assertEqual(head[head.index('-c:v') + 1], 'libx264')
+        self.assertEqual(head[head.index('-profile:v') + 1], 'high')
+        self.assertEqual(head[head.index('-level:v') + 1], '4.0')
+        self.assertEqual(head[head.index('-x264-params') + 1], f'sps-id={make_clips.HEAD_SPS_ID}')
+        self.assertEqual(tail[tail.index('-ss') + 1], '2.000000')
+        self.assertEqual(tail[tail.index('-c:v') + 1], 'copy')
+        for part in (head, tail):
+            self.assertTrue(part[-1].endswith('.ts'))
+            self.assertEqual(part[part.index('-bsf:v') + 1], 'h264_mp4toannexb')
+        self.assertIn('concat', concat)
+        self.assertEqual(concat[-1], result['output_video_paths'][0])
+
+    def test_text_and_unknown_codec_reencode_with_input_seek(self):
+        fake = FakeFFmpeg(codec='vp9')
+        self.run_clips(fake, [(27, 30, ''), (40, 45, 'hello')])
+
+        calls = fake.ffmpeg_calls()
+        self.assertEqual(len(calls), 2)
+        for cmd in calls:
+            self.assertLess(cmd.index('-ss'), cmd.index('-i'))
+            self.assertEqual(cmd[cmd.index('-c:v') + 1], 'libx264')
+        self.assertIn('-vf', calls[1])
+
+    def test_single_pass_decodes_once_with_named_outputs(self):
+        fake = FakeFFmpeg()
+        params = dict(self.params, single_pass=True)
+        clips = [(60, 120, '', 'minute_1'), (0, 60, "it's: here", 'minute_0'), (120, 180, '')]
+        with mock.patch.object(make_clips.subprocess, 'run', side_effect=fake):
+            result = make_clips.process_clips_ffmpeg(params, clips)
+
+        names = [os.path.basename(p) for p in result['output_video_paths']]
+        self.assertEqual(names, ['minute_1.mp4', 'minute_0.mp4', 'clip_3.mp4'])
+        (cmd,) = fake.ffmpeg_calls()
+        self.assertEqual(cmd.count('-i'), 1)
+        self.assertEqual(cmd[cmd.index('-ss') + 1], '0.000000')
+        self.assertEqual(cmd[cmd.index('-t') + 1], '180.000000')
+        # -t is an input option, so the demuxer stops at the last clip end.
+        self.assertLess(cmd.index('-t'), cmd.index('-i'))
+        graph = cmd[cmd.index('-filter_complex') + 1]
+        self.assertIn('[0:v]split=3[v0][v1][v2]', graph)
+        self.assertIn('[v0]trim=start=60.000000:end=120.000000,setpts=PTS-STARTPTS[vo0]', graph)
+        self.assertEqual(graph.count('drawtext='), 1)
+        self.assertEqual(cmd[-1], result['output_video_paths'][-1])
+
+    def test_single_pass_skips_cached_clips(self):
+        fake = FakeFFmpeg()
+
+        def render(cmd, **kwargs):
+            result = fake(cmd, **kwargs)
+            for arg in cmd:
+                if cmd[0] == 'ffmpeg' and arg.endswith('.mp4') and arg != self.video:
+                    with open(arg, 'wb') as f:
+                        f.write(arg.encode())
+            return result
+
+        cache = {'enabled': True, 'cache_dir': os.path.join(self.tmp.name, 'cache')}
+        params = dict(self.params, single_pass=True, render_cache=cache)
+        with mock.patch.object(make_clips.subprocess, 'run', side_effect=render):
+            make_clips.process_clips_ffmpeg(params, [(0, 5, ''), (5, 10, '')])
+            fake.commands.clear()
+            result = make_clips.process_clips_ffmpeg(params, [(0, 5, ''), (5, 10, ''), (10, 15, 'new')])
+
+        (cmd,) = fake.ffmpeg_calls()
+        self.assertEqual(cmd.count('-map'), 2)
+        self.assertEqual(cmd[-1], os.path.join(self.tmp.name, 'clip_3.mp4'))
+        self.assertEqual(len(result['output_video_paths']), 3)
+
+    def test_failed_single_pass_falls_back_to_per_clip_cuts(self):
+        # The combined command ends with clip_3's output, so it fails too.
+        fake = FakeFFmpeg(codec='vp9', fail_outputs={'clip_3.mp4'})
+        params = dict(self.params, single_pass=True)
+        with mock.patch.object(make_clips.subprocess, 'run', side_effect=fake):
+            result = make_clips.process_clips_ffmpeg(params, [(0, 5, ''), (5, 10, 'x'), (10, 15, '')])
+
+        self.assertNotIn('-filter_complex', fake.ffmpeg_calls()[1])
+        names = [os.path.basename(p) for p in result['output_video_paths']]
+        self.assertEqual(names, ['clip_1.mp4', 'clip_2.mp4'])
+        self.assertEqual(
+            [(f['index'], f['name']) for f in result['failed_clips']], [(3, 'clip_3')]
+        )
+
+    def test_failed_clip_does_not_discard_the_others(self):
+        fake = FakeFFmpeg(codec='vp9', fail_outputs={'clip_2.mp4'})
+        params = dict(self.params, clip_jobs=3)
+        with mock.patch.object(make_clips.subprocess, 'run', side_effect=fake):
+            result = make_clips.process_clips_ffmpeg(params, [(0, 5, ''), (5, 10, ''), (10, 15, '')])
+
+        names = [os.path.basename(p) for p in result['output_video_paths']]
+        self.assertEqual(names, ['clip_1.mp4', 'clip_3.mp4'])
+        self.assertEqual([f['name'] for f in result['failed_clips']], ['clip_2'])
+
+    def test_schedule_respects_cores_and_encoder_threads(self):
+        with mock.patch.object(make_clips.os, 'cpu_count', return_value=8):
+            self.assertEqual(make_clips.clip_schedule({}, 10), (4, 2))
+            self.assertEqual(make_clips.clip_schedule({'encoder_threads': 4}, 10), (2, 4))
+            self.assertEqual(make_clips.clip_schedule({'clip_jobs': 3}, 10), (3, 2))
+            self.assertEqual(make_clips.clip_schedule({}, 1), (1, 2))
+            self.assertEqual(make_clips.clip_schedule({'encoder_threads': 16}, 10), (1, 8))
+
+
+def libx264_available():
+    if not (shutil.which('ffmpeg') and shutil.which('ffprobe')):
+        return False
+    encoders = subprocess.run(['ffmpeg', '-hide_banner', '-encoders'],
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    return 'libx264' in encoders.stdout
+
+
+@unittest.skipUnless(libx264_available(), 'needs ffmpeg, ffprobe and libx264')
+class TestStreamCopyWithFFmpeg(unittest.TestCase):
+    def test_joined_clip_decodes_cleanly(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            source = os.path.join(tmp, 'source.mp4')
+            subprocess.run([
+                'ffmpeg', '-y', '-v', 'error',
+                '-f', 'lavfi', '-i', 'testsrc=duration=8:size=320x240:rate=25',
+                '-f', 'lavfi', '-i', 'sine=duration=8',
+                '-c:v', 'libx264', '-g', '50', '-pix_fmt', 'yuv420p', '-c:a', 'aac', source,
+            ], check=True)
+            output = os.path.join(tmp, 'clip.mp4')
+
+            self.assertTrue(make_clips.cut_clip_stream_copy(source, 1.0, 5.0, output))
+
+            check = subprocess.run(['ffmpeg', '-v', 'error', '-xerror', '-i', output, '-f', 'null', '-'],
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+            self.assertEqual((check.returncode, check.stderr), (0, ''))
+            duration = subprocess.run(
+                ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', output],
+                stdout=subprocess.PIPE, text=True, check=True,
+            ).stdout
+            self.assertAlmostEqual(float(duration), 4.0, delta=0.2)
+
+
+class TestLoadClipsYaml(unittest.TestCase):
+    def test_names_come_from_yaml_keys(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False) as f:
+            f.write("intro:\n- {start: 0, end: 7, text: ''}\n"
+                    "part:\n- {start: 10, end: 20, text: Hi}\n- {start: 30, end: 40}\n")
+        self.addCleanup(os.remove, f.name)
+        self.assertEqual(
+            make_clips.load_clips_yaml(f.name),
+            [(0, 7, '', 'intro'), (10, 20, 'Hi', 'part_1'), (30, 40, '', 'part_2')],
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
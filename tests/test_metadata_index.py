@@ -0,0 +1,301 @@
+import os
+import json
+import shutil
+import tempfile
+import time
+import unittest
+import sys
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.append(os.path.join(root_dir, 'lib', 'python_utils'))
+
+import tasks_lib
+import metadata_index
+from metadata_index import (
+    append_index_record,
+    compact_index,
+    migrate_jsonl_index,
+    normalize_url,
+    open_metadata_index,
+    read_jsonl_log,
+)
+
+
+class TestMetadataIndex(unittest.TestCase):
+    def setUp(self):
+        self.metadata_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        open_metadata_index(self.metadata_dir).close()
+        shutil.rmtree(self.metadata_dir)
+
+    def write_metadata(self, name, data):
+        path = os.path.join(self.metadata_dir, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        return path
+
+    def test_normalize_url(self):
+        self.assertEqual(
+            normalize_url('https://WWW.YouTube.com/watch?v=abc&si=xyz#t=10'),
+            normalize_url('https://youtube.com/watch?v=abc'),
+        )
+        self.assertNotEqual(
+            normalize_url('https://youtube.com/watch?v=abc'),
+            normalize_url('https://youtube.com/watch?v=abd'),
+        )
+
+    def test_upsert_and_find(self):
+        url = 'https://www.instagram.com/reel/ABC123/?igsh=foo'
+        data = {'url': url, 'id': '42', 'shortcode': 'ABC123', 'default_tasks': {'perform_download': True}}
+        path = self.write_metadata('ABC123.json', data)
+        tasks_lib.upsert_metadata_index(path, data)
+
+        found_path, found_data = tasks_lib.find_url_json(url, self.metadata_dir)
+        self.assertEqual(found_path, path)
+        self.assertEqual(found_data['id'], '42')
+
+        index = open_metadata_index(self.metadata_dir)
+        self.assertEqual(index.lookup_id('42')['metadata_file'], 'ABC123.json')
+        self.assertEqual(index.lookup_shortcode('ABC123')['metadata_file'], 'ABC123.json')
+        self.assertEqual(tasks_lib.get_task_states(url, self.metadata_dir), {'perform_download': True})
+
+    def test_migrate_jsonl_last_record_wins(self):
+        self.write_metadata('old.json', {'url': 'https://example.com/v/1'})
+        self.write_metadata('new.json', {'url': 'https://example.com/v/1', 'id': 'new'})
+        with open(os.path.join(self.metadata_dir, 'index.jsonl'), 'w', encoding='utf-8') as f:
+            f.write(json.dumps({'url': 'https://example.com/v/1', 'metadata_file': 'old.json'}) + '\n')
+            f.write('not json\n')
+            f.write(json.dumps({'url': 'https://example.com/v/1', 'metadata_file': 'new.json'}) + '\n')
+
+        self.assertEqual(migrate_jsonl_index(self.metadata_dir), 2)
+        found_path, found_data = tasks_lib.find_url_json('https://example.com/v/1/', self.metadata_dir)
+        self.assertEqual(os.path.basename(found_path), 'new.json')
+        self.assertEqual(found_data['id'], 'new')
+
+    def test_append_only_log_dedupes_and_compacts(self):
+        jsonl_path = os.path.join(self.metadata_dir, 'index.jsonl')
+        record = {'url': 'https://example.com/v/2', 'metadata_file': 'a.json', 'id': '2', 'shortcode': 'v2'}
+
+        self.assertTrue(append_index_record(self.metadata_dir, record))
+        # An identical record, or one that only lacks optional fields, is not re-appended.
+        self.assertFalse(append_index_record(self.metadata_dir, dict(record)))
+        self.assertFalse(append_index_record(self.metadata_dir, dict(record, shortcode=None)))
+
+        self.assertTrue(append_index_record(self.metadata_dir, dict(record, metadata_file='b.json')))
+        self.assertEqual(len(read_jsonl_log(jsonl_path)), 2)
+        index = open_metadata_index(self.metadata_dir)
+        self.assertEqual(index.lookup_url(record['url'])['metadata_file'], 'b.json')
+        self.assertEqual(index.lookup_url(record['url'])['shortcode'], 'v2')
+
+        self.assertEqual(compact_index(self.metadata_dir), 1)
+        self.assertEqual(read_jsonl_log(jsonl_path)[0]['metadata_file'], 'b.json')
+
+    def test_automatic_compaction_bounds_log(self):
+        jsonl_path = os.path.join(self.metadata_dir, 'index.jsonl')
+        original = metadata_index.COMPACT_MIN_LINES
+        metadata_index.COMPACT_MIN_LINES = 5
+        try:
+            for n in range(20):
+                append_index_record(
+                    self.metadata_dir,
+                    {'url': 'https://example.com/v/3', 'metadata_file': f'{n}.json'},
+                )
+        finally:
+            metadata_index.COMPACT_MIN_LINES = original
+
+        self.assertLessEqual(len(read_jsonl_log(jsonl_path)), 5)
+        found_path, _ = tasks_lib.find_url_json('https://example.com/v/3', self.metadata_dir)
+        self.assertIsNone(found_path)  # metadata file was never written
+        self.assertEqual(
+            open_metadata_index(self.metadata_dir).lookup_url('https://example.com/v/3')['metadata_file'],
+            '19.json',
+        )
+
+
+class TestMetadataCache(unittest.TestCase):
+    def setUp(self):
+        self.metadata_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.metadata_dir, 'video.json')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'url': 'https://example.com/v/4', 'default_tasks': {'apply_watermark': True}}, f)
+        tasks_lib.clear_metadata_cache()
+
+    def tearDown(self):
+        tasks_lib.clear_metadata_cache()
+        shutil.rmtree(self.metadata_dir)
+
+    def test_repeated_reads_hit_cache(self):
+        first = tasks_lib.load_metadata_json(self.path, shared=True)
+        second = tasks_lib.load_metadata_json(self.path, shared=True)
+        self.assertIs(first, second)
+        self.assertEqual(tasks_lib.metadata_cache_info()['hits'], 1)
+        self.assertIsNot(tasks_lib.load_metadata_json(self.path), first)
+
+    def test_default_load_is_a_private_copy(self):
+        data = tasks_lib.load_metadata_json(self.path)
+        data['default_tasks']['apply_watermark'] = '/tmp/changed.mp4'
+        data['x'] = 1
+        again = tasks_lib.load_metadata_json(self.path)
+        self.assertEqual(again['default_tasks'], {'apply_watermark': True})
+        self.assertNotIn('x', again)
+
+    def test_external_change_invalidates_entry(self):
+        tasks_lib.load_metadata_json(self.path)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'url': 'https://example.com/v/4', 'default_tasks': {'apply_watermark': '/tmp/out.mp4'}, 'x': 1}, f)
+        data = tasks_lib.load_metadata_json(self.path)
+        self.assertEqual(data['default_tasks']['apply_watermark'], '/tmp/out.mp4')
+
+    def test_writers_refresh_cache(self):
+        tasks_lib.update_task_output_path(self.path, 'apply_watermark', '/tmp/out.mp4')
+        misses = tasks_lib.metadata_cache_info()['misses']
+        data = tasks_lib.load_metadata_json(self.path)
+        self.assertEqual(data['default_tasks']['apply_watermark'], '/tmp/out.mp4')
+        self.assertEqual(tasks_lib.metadata_cache_info()['misses'], misses)
+
+    def test_lru_bound(self):
+        original = tasks_lib.METADATA_CACHE_SIZE
+        tasks_lib.METADATA_CACHE_SIZE = 2
+        try:
+            for n in range(4):
+                path = os.path.join(self.metadata_dir, f'{n}.json')
+                tasks_lib.save_metadata_json(path, {'n': n})
+            self.assertEqual(tasks_lib.metadata_cache_info()['size'], 2)
+        finally:
+            tasks_lib.METADATA_CACHE_SIZE = original
+
+
+class TestTaskJournal(unittest.TestCase):
+    def setUp(self):
+        self.metadata_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.metadata_dir, 'video.json')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump({'url': 'https://example.com/v/5',
+                       'default_tasks': {'apply_watermark': True, 'make_clips': True}}, f)
+        tasks_lib.clear_metadata_cache()
+
+    def tearDown(self):
+        tasks_lib.clear_metadata_cache()
+        shutil.rmtree(self.metadata_dir)
+
+    def read_file(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_states_are_journaled_then_folded(self):
+        tasks_lib.update_task_output_path(self.path, 'apply_watermark', '/tmp/wm.mp4')
+        # The JSON itself is untouched until the journal is folded.
+        self.assertIs(self.read_file()['default_tasks']['apply_watermark'], True)
+        self.assertTrue(os.path.exists(self.path + tasks_lib.JOURNAL_SUFFIX))
+        tasks_lib.clear_metadata_cache()
+        self.assertEqual(
+            tasks_lib.load_metadata_json(self.path)['default_tasks']['apply_watermark'], '/tmp/wm.mp4'
+        )
+
+        tasks_lib.fold_task_journal(self.path)
+        self.assertEqual(self.read_file()['default_tasks']['apply_watermark'], '/tmp/wm.mp4')
+        self.assertFalse(os.path.exists(self.path + tasks_lib.JOURNAL_SUFFIX))
+
+    def test_full_save_keeps_concurrent_task_states(self):
+        stale = tasks_lib.load_metadata_json(self.path)
+        tasks_lib.record_task_states(self.path, {'make_clips': ['/tmp/a.mp4']})
+        stale['video_title'] = 'Title'
+        tasks_lib.save_metadata_json(self.path, stale)
+        data = self.read_file()
+        self.assertEqual(data['default_tasks']['make_clips'], ['/tmp/a.mp4'])
+        self.assertEqual(data['video_title'], 'Title')
+
+    def test_defaults_do_not_override_existing_states(self):
+        tasks_lib.record_task_states(self.path, {'generate_captions': '/tmp/c.mp4'})
+        tasks_lib.record_task_states(
+            self.path, {'generate_captions': False, 'extract_audio': False}, only_missing=True
+        )
+        tasks = tasks_lib.load_metadata_json(self.path)['default_tasks']
+        self.assertEqual(tasks['generate_captions'], '/tmp/c.mp4')
+        self.assertIs(tasks['extract_audio'], False)
+
+    def test_concurrent_writers_lose_no_updates(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        tasks = [f'task_{n}' for n in range(80)]
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda task: tasks_lib.record_task_states(self.path, {task: f'/tmp/{task}'}), tasks))
+        tasks_lib.fold_task_journal(self.path)
+        recorded = self.read_file()['default_tasks']
+        for task in tasks:
+            self.assertEqual(recorded[task], f'/tmp/{task}')
+
+
+class TestTaskStatesTable(unittest.TestCase):
+    def setUp(self):
+        self.metadata_dir = tempfile.mkdtemp()
+        tasks_lib.clear_metadata_cache()
+        for n in range(3):
+            path = os.path.join(self.metadata_dir, f'{n}.json')
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'url': f'https://example.com/v/{n}',
+                           'default_tasks': {'apply_watermark': True, 'make_clips': False}}, f)
+            tasks_lib.upsert_metadata_index(path, {'url': f'https://example.com/v/{n}'})
+
+    def tearDown(self):
+        tasks_lib.clear_metadata_cache()
+        open_metadata_index(self.metadata_dir).close()
+        shutil.rmtree(self.metadata_dir)
+
+    def test_sync_then_writes_keep_the_table_current(self):
+        self.assertEqual(tasks_lib.sync_task_states(self.metadata_dir), 3)
+        tasks_lib.update_task_output_path(
+            os.path.join(self.metadata_dir, '1.json'), 'apply_watermark', '/tmp/wm.mp4'
+        )
+        tasks_lib.record_task_states(
+            os.path.join(self.metadata_dir, '2.json'), {'make_clips': ['/tmp/a.mp4', '/tmp/b.mp4']}
+        )
+
+        pending = tasks_lib.query_task_states(self.metadata_dir, task='apply_watermark', state='pending')
+        self.assertEqual([row['url'] for row in pending], ['https://example.com/v/0', 'https://example.com/v/2'])
+
+        index = open_metadata_index(self.metadata_dir)
+        self.assertEqual(
+            index.get_task_states('https://www.example.com/v/1'),
+            {'apply_watermark': '/tmp/wm.mp4', 'make_clips': False},
+        )
+        self.assertEqual(index.get_task_states('https://example.com/v/2')['make_clips'],
+                         ['/tmp/a.mp4', '/tmp/b.mp4'])
+        self.assertEqual(index.task_counts()['apply_watermark'], {'pending': 2, 'done': 1})
+
+    def test_filter_pending_urls(self):
+        tasks_lib.sync_task_states(self.metadata_dir)
+        index = open_metadata_index(self.metadata_dir)
+        index.set_task_states('https://example.com/v/0', {'perform_download': '/tmp/0.mp4',
+                                                          'apply_watermark': '/tmp/wm0.mp4'})
+        index.set_task_states('https://example.com/v/1', {'perform_download': '/tmp/1.mp4'})
+        urls = ['https://example.com/v/0', 'https://example.com/v/1',
+                'https://example.com/v/2', 'https://example.com/v/unknown']
+
+        # v/1 still has apply_watermark pending, v/2 has no download, and
+        # URLs without recorded states always count as pending.
+        self.assertEqual(tasks_lib.filter_pending_urls(urls, self.metadata_dir), urls[1:])
+
+    def test_filter_pending_urls_scales(self):
+        index = open_metadata_index(self.metadata_dir)
+        urls = [f'https://example.com/done/{n}' for n in range(10000)]
+        rows = []
+        for url in urls:
+            key = normalize_url(url)
+            rows.append((key, url, 'perform_download', 'done', f'/tmp/{key}.mp4', 0))
+            rows.append((key, url, 'apply_watermark', 'done', f'/tmp/{key}_wm.mp4', 0))
+            rows.append((key, url, 'make_clips', 'off', None, 0))
+        conn = index.connect()
+        with conn:
+            conn.executemany('INSERT INTO task_states VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+        started = time.perf_counter()
+        pending = tasks_lib.filter_pending_urls(urls + ['https://example.com/v/0'], self.metadata_dir)
+        self.assertLess(time.perf_counter() - started, 1.0)
+        self.assertEqual(pending, ['https://example.com/v/0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.append(os.path.join(root_dir, 'lib', 'python_utils'))
+
+import metadata_prefetch
+
+
+class TestOrderUrls(unittest.TestCase):
+    def setUp(self):
+        self.metadata = {
+            'a': {'filesize': 300},
+            'b': {'duration': 10, 'tbr': 8},  # 10 s at 8 kbit/s = 10000 bytes
+            'c': {},
+            'd': {'filesize': 100},
+            'e': {'filesize': 100},
+        }
+        self.urls = ['a', 'b', 'c', 'd', 'e']
+
+    def test_shortest_first_keeps_unknown_last(self):
+        order = metadata_prefetch.order_urls(self.urls, self.metadata, 'sjf')
+        self.assertEqual(order, ['d', 'e', 'a', 'b', 'c'])
+
+    def test_largest_first_is_stable_for_ties(self):
+        order = metadata_prefetch.order_urls(self.urls, self.metadata, 'ljf')
+        self.assertEqual(order, ['b', 'a', 'd', 'e', 'c'])
+
+    def test_input_order_and_unknown_order(self):
+        self.assertEqual(metadata_prefetch.order_urls(self.urls, self.metadata), self.urls)
+        with self.assertRaises(ValueError):
+            metadata_prefetch.order_urls(self.urls, self.metadata, 'random')
+
+
+class TestPrefetchMetadata(unittest.TestCase):
+    def test_extracts_concurrently_and_isolates_failures(self):
+        lock = threading.Lock()
+        state = {'active': 0, 'peak': 0}
+
+        def fake_prefetch(url, cookie_path, metadata_dir, config_path):
+            with lock:
+                state['active'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+            time.sleep(0.05)
+            with lock:
+                state['active'] -= 1
+            if url == 'bad':
+                raise RuntimeError('extractor error')
+            return {'id': url}
+
+        urls = ['u1', 'bad', 'u2', 'u3', 'u1']
+        with mock.patch.object(metadata_prefetch, 'prefetch_url', side_effect=fake_prefetch):
+            results = metadata_prefetch.prefetch_metadata(urls, jobs=3)
+
+        self.assertEqual(list(results), ['u1', 'bad', 'u2', 'u3'])
+        self.assertEqual(results['bad'], {})
+        self.assertEqual(results['u3'], {'id': 'u3'})
+        self.assertGreater(state['peak'], 1)
+        self.assertLessEqual(state['peak'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.append(os.path.join(root_dir, 'lib', 'python_utils'))
+
+import output_paths
+
+
+class TestUniqueOutputPath(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.dir = os.path.join(self.tmp.name, 'videos')
+        os.makedirs(self.dir)
+        self.metadata_dir = os.path.join(self.tmp.name, 'metadata')
+        patcher = mock.patch.object(
+            output_paths, 'load_app_config', return_value={'metadata_dir': self.metadata_dir}
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sequential_names_skip_existing_files(self):
+        open(os.path.join(self.dir, 'someone_20240501.mp4'), 'w').close()
+        first = output_paths.unique_output_path(self.dir, 'someone_20240501.mp4')
+        second = output_paths.unique_output_path(self.dir, 'someone_20240501.mp4')
+        self.assertEqual(os.path.basename(first), 'someone_20240501_1.mp4')
+        self.assertEqual(os.path.basename(second), 'someone_20240501_2.mp4')
+        # Reserving does not create the output file itself.
+        self.assertFalse(os.path.exists(first))
+
+    def test_reservations_stay_out_of_the_output_directory(self):
+        output_paths.unique_output_path(self.dir, 'someone_20240501.mp4')
+        self.assertEqual(os.listdir(self.dir), [])
+        reserved = output_paths.reservation_dir(self.dir)
+        self.assertTrue(reserved.startswith(self.metadata_dir))
+        self.assertIn('someone_20240501.mp4', os.listdir(reserved))
+        # Relative and absolute spellings of a directory share reservations.
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        self.addCleanup(os.chdir, cwd)
+        self.assertEqual(output_paths.reservation_dir('videos'), reserved)
+
+    def test_counter_avoids_rescanning_taken_names(self):
+        for _ in range(50):
+            output_paths.unique_output_path(self.dir, 'clip.mp4')
+        probed = []
+        real_exists = os.path.exists
+
+        def counting_exists(path):
+            probed.append(path)
+            return real_exists(path)
+
+        with mock.patch.object(output_paths.os.path, 'exists', counting_exists):
+            name = output_paths.unique_output_path(self.dir, 'clip.mp4')
+        self.assertEqual(os.path.basename(name), 'clip_50.mp4')
+        candidates = [path for path in probed if os.path.basename(path).startswith('clip')]
+        self.assertEqual(candidates, [name])
+
+    def test_concurrent_callers_never_collide(self):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            names = list(pool.map(
+                lambda _: output_paths.unique_output_path(self.dir, 'abc123.json'), range(64)
+            ))
+        self.assertEqual(len(set(names)), 64)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.append(os.path.join(root_dir, 'lib', 'python_utils'))
+
+import render_cache
+
+
+class TestRenderCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.input = os.path.join(self.tmp.name, 'in.mp4')
+        with open(self.input, 'wb') as f:
+            f.write(b'x' * 5000)
+        self.config = {'enabled': True, 'cache_dir': os.path.join(self.tmp.name, 'cache')}
+        render_cache._caches.clear()
+
+    def render_to(self, output, calls):
+        def render():
+            calls.append(output)
+            with open(output, 'wb') as f:
+                f.write(b'rendered')
+            return {'to_process': output}
+        return render
+
+    def test_key_ignores_paths_but_not_params(self):
+        params = {'font_size': 32, 'download_path': '/a', 'input_video_path': self.input}
+        key = render_cache.render_key('add_watermark', self.input, params)
+        self.assertEqual(key, render_cache.render_key('add_watermark', self.input, dict(params, download_path='/b')))
+        self.assertNotEqual(key, render_cache.render_key('add_watermark', self.input, dict(params, font_size=30)))
+        self.assertNotEqual(key, render_cache.render_key('add_captions', self.input, params))
+
+    def test_sampled_hash_sees_content_changes(self):
+        big = os.path.join(self.tmp.name, 'big.bin')
+        with open(big, 'wb') as f:
+            f.write(b'\0' * 100000)
+        before = render_cache.sampled_file_hash(big, sample_size=1000, samples=4)
+        with open(big, 'r+b') as f:
+            f.seek(99999)
+            f.write(b'\1')
+        self.assertNotEqual(before, render_cache.sampled_file_hash(big, sample_size=1000, samples=4))
+
+    def test_small_files_hash_whole_content_in_sample_size_reads(self):
+        path = os.path.join(self.tmp.name, 'small.bin')
+        with open(path, 'wb') as f:
+            f.write(b'abc' * 1000)
+        reads = []
+        real_open = open
+
+        class CountingFile:
+            def __init__(self, f):
+                self.f = f
+            def __enter__(self):
+                return self
+            def __exit__(self, *exc):
+                self.f.close()
+            def read(self, n=-1):
+                reads.append(n)
+                return self.f.read(n)
+
+        with mock.patch('builtins.open', lambda p, m='r': CountingFile(real_open(p, m))):
+            digest = render_cache.sampled_file_hash(path, sample_size=1000, samples=4)
+        self.assertEqual(set(reads), {1000})
+        self.assertEqual(digest, render_cache.sampled_file_hash(path))
+
+    def test_second_render_is_reused(self):
+        params = {'render_cache': self.config, 'font_size': 32}
+        calls = []
+        first = os.path.join(self.tmp.name, 'a', 'out.mp4')
+        second = os.path.join(self.tmp.name, 'b', 'out.mp4')
+        os.makedirs(os.path.dirname(first))
+        os.makedirs(os.path.dirname(second))
+
+        result = render_cache.cached_render('add_watermark', self.input, params, first, self.render_to(first, calls))
+        self.assertEqual(result, {'to_process': first})
+        self.assertIs(render_cache.cached_render('add_watermark', self.input, params, second, self.render_to(second, calls)), True)
+        self.assertEqual(calls, [first])
+        with open(second, 'rb') as f:
+            self.assertEqual(f.read(), b'rendered')
+
+    def test_overwriting_an_output_keeps_cached_entries(self):
+        output = os.path.join(self.tmp.name, 'clip_1.mp4')
+        calls = []
+        old_params = {'render_cache': self.config, 'font_size': 32}
+        render_cache.cached_render('make_clips', self.input, old_params, output, self.render_to(output, calls))
+
+        # A render with other params rewrites the same file in place (ffmpeg -y).
+        new_params = dict(old_params, font_size=48)
+        def rerender():
+            with open(output, 'r+b') as f:
+                f.truncate(0)
+                f.write(b'different')
+            return {'to_process': output}
+        render_cache.cached_render('make_clips', self.input, new_params, output, rerender)
+
+        reused = os.path.join(self.tmp.name, 'reused.mp4')
+        self.assertIs(render_cache.cached_render('make_clips', self.input, old_params, reused,
+                                                 self.render_to(reused, calls)), True)
+        with open(reused, 'rb') as f:
+            self.assertEqual(f.read(), b'rendered')
+
+    def test_disabled_cache_always_renders(self):
+        calls = []
+        output = os.path.join(self.tmp.name, 'out.mp4')
+        for _ in range(2):
+            render_cache.cached_render('add_watermark', self.input, {}, output, self.render_to(output, calls))
+        self.assertEqual(len(calls), 2)
+
+    def test_lru_eviction(self):
+        cache = render_cache.RenderCache(self.config['cache_dir'], max_bytes=25)
+        for n, key in enumerate(['old', 'mid', 'new']):
+            src = os.path.join(self.tmp.name, f'{key}.mp4')
+            with open(src, 'wb') as f:
+                f.write(b'0123456789')
+            entry = os.path.join(self.config['cache_dir'], f'{key}.mp4')
+            cache.store(key, src)
+            os.utime(entry, (time.time() - 100 + n, time.time() - 100 + n))
+        cache.evict()
+        self.assertEqual(sorted(os.listdir(self.config['cache_dir'])), ['mid.mp4', 'new.mp4'])
+
+
+if __name__ == '__main__':
+    unittest.main()
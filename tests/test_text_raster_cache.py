@@ -0,0 +1,64 @@
+import os
+import sys
+import tempfile
+import unittest
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.append(os.path.join(root_dir, 'lib', 'python_utils'))
+
+from text_raster_cache import TextRasterCache, raster_key
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class TestTextRasterCache(unittest.TestCase):
+    def test_key_depends_on_every_style_field(self):
+        base = raster_key('abc', 'Arial', 32, 'yellow', 8)
+        self.assertEqual(base, raster_key('abc', 'Arial', 32, 'yellow', 8))
+        self.assertNotEqual(base, raster_key('abd', 'Arial', 32, 'yellow', 8))
+        self.assertNotEqual(base, raster_key('abc', 'Inter', 32, 'yellow', 8))
+        self.assertNotEqual(base, raster_key('abc', 'Arial', 30, 'yellow', 8))
+        self.assertNotEqual(base, raster_key('abc', 'Arial', 32, 'cyan', 8))
+        self.assertNotEqual(base, raster_key('abc', 'Arial', 32, 'yellow', 6))
+
+    def test_lru_hits_and_eviction(self):
+        cache = TextRasterCache(max_entries=2)
+        renders = []
+
+        def render(name):
+            def _render():
+                renders.append(name)
+                return name + '-rgb', name + '-alpha'
+            return _render
+
+        self.assertEqual(cache.get_or_render('a', render('a')), ('a-rgb', 'a-alpha'))
+        cache.get_or_render('a', render('a'))
+        cache.get_or_render('b', render('b'))
+        cache.get_or_render('c', render('c'))  # evicts 'a'
+        cache.get_or_render('a', render('a'))
+
+        self.assertEqual(renders, ['a', 'b', 'c', 'a'])
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (1, 4, 2))
+        self.assertAlmostEqual(stats['hit_rate'], 0.2)
+
+    def test_disk_store_survives_a_new_cache(self):
+        if np is None:
+            self.skipTest('numpy not available')
+        with tempfile.TemporaryDirectory() as tmp:
+            rgb = np.full((2, 3, 3), 7, dtype=np.uint8)
+            alpha = np.ones((2, 3), dtype=np.float32)
+            TextRasterCache(disk_dir=tmp).get_or_render('k', lambda: (rgb, alpha))
+
+            fresh = TextRasterCache(disk_dir=tmp)
+            loaded = fresh.get_or_render('k', lambda: self.fail('re-rendered'))
+            self.assertTrue((loaded[0] == rgb).all())
+            self.assertEqual(fresh.stats()['disk_hits'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,154 @@
+import os
+import subprocess
+import sys
+import tempfile
+import types
+import unittest
+from unittest import mock
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+root_dir = os.path.dirname(current_dir)
+sys.path.append(os.path.join(root_dir, 'lib', 'python_utils'))
+
+try:
+    import watermarker2
+except Exception:
+    watermarker2 = None
+
+
+PARAMS = {
+    'font': 'NoSuchFont',
+    'font_size': 32,
+    'username': "o'brien: live",
+    'video_date': '2024-05-01',
+    'username_color': 'yellow',
+    'date_color': 'cyan',
+    'timestamp_color': 'red',
+    'username_position': ['left', 'top'],
+    'date_position': ['left', 'bottom'],
+    'timestamp_position': ['right', 'bottom'],
+    'text_pad': 10,
+}
+
+
+class TestDrawtextFilter(unittest.TestCase):
+    def setUp(self):
+        if watermarker2 is None:
+            self.skipTest('moviepy or dependencies not available')
+
+    def test_one_drawtext_per_layer(self):
+        graph = watermarker2.build_watermark_filtergraph(dict(PARAMS))
+        self.assertEqual(graph.count('drawtext='), 3)
+        self.assertIn('%{pts:gmtime:0:%H', graph)
+        self.assertIn("x=\\'w-text_w-10\\'", graph)
+
+    def test_static_text_is_escaped(self):
+        text_filter = watermarker2.build_drawtext_filter(
+            "o'brien: live", PARAMS, 'yellow', ['left', 'top']
+        )
+        # Quotes survive both the filtergraph and the option parser.
+        self.assertIn("o\\'\\\\\\'\\'brien: live", text_filter)
+        self.assertIn("expansion=\\'none\\'", text_filter)
+
+    def test_filename_username_is_skipped(self):
+        params = dict(PARAMS, username='clip.mp4')
+        graph = watermarker2.build_watermark_filtergraph(params)
+        self.assertEqual(graph.count('drawtext='), 2)
+
+
+class TestFitFontSize(unittest.TestCase):
+    def setUp(self):
+        if watermarker2 is None:
+            self.skipTest('moviepy or dependencies not available')
+        watermarker2.resolve_font_file.cache_clear()
+        self.addCleanup(watermarker2.resolve_font_file.cache_clear)
+        font = tempfile.NamedTemporaryFile(suffix='.ttf', delete=False)
+        font.close()
+        self.addCleanup(os.remove, font.name)
+        self.font_file = font.name
+
+        # Pillow stand-in: text is 300px wide at any size.
+        image_font = types.SimpleNamespace(
+            truetype=mock.Mock(return_value=mock.Mock(getlength=mock.Mock(return_value=300)))
+        )
+        self.truetype = image_font.truetype
+        pil = types.ModuleType('PIL')
+        pil.ImageFont = image_font
+        patcher = mock.patch.dict(sys.modules, {'PIL': pil, 'PIL.ImageFont': image_font})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fc_match(self, stdout):
+        return mock.patch.multiple(
+            watermarker2,
+            shutil=mock.Mock(which=mock.Mock(return_value='/usr/bin/fc-match')),
+            subprocess=mock.Mock(
+                run=mock.Mock(return_value=subprocess.CompletedProcess([], 0, stdout=stdout)),
+                SubprocessError=subprocess.SubprocessError,
+            ),
+        )
+
+    def test_named_font_is_resolved_with_fc_match(self):
+        params = {'font': 'Arial', 'font_size': 32, 'video_w': 400}
+        with self.fc_match(self.font_file):
+            # Target width is 150px, so 300px text is halved.
+            self.assertEqual(watermarker2._fit_font_size('someone', params), 16)
+        self.truetype.assert_called_once_with(self.font_file, 32)
+
+    def test_unresolvable_font_keeps_its_size(self):
+        params = {'font': 'NoSuchFont', 'font_size': 32, 'video_w': 400}
+        with self.fc_match(''):
+            self.assertEqual(watermarker2._fit_font_size('someone', params), 32)
+        self.truetype.assert_not_called()
+
+
+class TestTimestampAtlas(unittest.TestCase):
+    def setUp(self):
+        if watermarker2 is None:
+            self.skipTest('moviepy or dependencies not available')
+
+    def test_format_timestamp(self):
+        self.assertEqual(watermarker2.format_timestamp(0), '00:00:00')
+        self.assertEqual(watermarker2.format_timestamp(3723), '01:02:03')
+
+    def test_render_reuses_frame_within_a_second(self):
+        params = {'font': PARAMS['font'], 'font_size': 24, 'text_pad': 4}
+        try:
+            atlas = watermarker2.TimestampAtlas(params, 'red', 7200)
+        except Exception as e:
+            self.skipTest(f'text rendering unavailable: {e}')
+        rgb, alpha = atlas.render(61.2)
+        self.assertEqual(rgb.shape[:2], (atlas.size[1], atlas.size[0]))
+        self.assertEqual(alpha.shape, rgb.shape[:2])
+        self.assertIs(atlas.render(61.9), atlas.render(61.0))
+        self.assertIsNot(atlas.render(62.0)[0], rgb)
+
+
+class TestStaticOverlay(unittest.TestCase):
+    def setUp(self):
+        if watermarker2 is None:
+            self.skipTest('moviepy or dependencies not available')
+        import numpy as np
+        self.np = np
+
+    def test_blends_only_the_bounding_box(self):
+        np = self.np
+        white = (np.full((2, 3, 3), 255, np.uint8), np.ones((2, 3), np.float32))
+        grey = (np.full((2, 2, 3), 100, np.uint8), np.full((2, 2), 0.5, np.float32))
+        overlay = watermarker2.StaticOverlay(
+            [(*white, ('left', 'top')), (*grey, (2, 1))], (10, 8)
+        )
+        self.assertEqual(overlay.bbox, (0, 0, 4, 3))
+
+        frame = np.zeros((8, 10, 3), np.uint8)
+        out = overlay.apply(frame)
+        self.assertEqual(out[0, 0].tolist(), [255, 255, 255])
+        # grey at 50% over white, then over black outside the white box
+        self.assertEqual(out[1, 2].tolist(), [178, 178, 178])
+        self.assertEqual(out[2, 3].tolist(), [50, 50, 50])
+        self.assertEqual(int(out[3:, :].sum() + out[:, 4:].sum()), 0)
+        self.assertEqual(int(frame.sum()), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()